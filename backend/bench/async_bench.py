@@ -0,0 +1,173 @@
+# Sync vs async /api/working-scan throughput against a local Mongo stand-in
+# The stand-in keeps songs in memory and sleeps for a fixed round-trip time per
+# query (time.sleep for db.py, asyncio.sleep for db_async.py), so the numbers
+# isolate how each server overlaps its database waits.
+#
+#   python backend/bench/async_bench.py --requests 400 --concurrency 32 --rtt-ms 5
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_DIR, "script"))
+
+os.environ.setdefault("HEALTH_REFRESH_SECONDS", "3600")
+
+import db        # noqa: E402
+import db_async  # noqa: E402
+from working_core import EMOTIONS  # noqa: E402
+
+
+class StandIn:
+    """In-memory songs collection with simulated network latency"""
+
+    def __init__(self, songs_per_emotion, rtt_seconds, seed=0):
+        rng = random.Random(seed)
+        self.rtt = rtt_seconds
+        self.songs = []
+        for emotion in EMOTIONS:
+            for i in range(songs_per_emotion):
+                self.songs.append({
+                    "_id": f"{len(self.songs):024x}",
+                    "title": f"{emotion} song {i}",
+                    "filename": f"{emotion}_{i}.mp3",
+                    "song_emotion": emotion,
+                    "danceability": rng.random(),
+                    "energy": rng.random(),
+                    "valence": rng.random(),
+                    "acousticness": rng.random(),
+                })
+        self.by_id = {s["_id"]: s for s in self.songs}
+        self.queries = 0
+
+    # answers (no latency)
+    def by_emotion(self, emotion, limit=0):
+        rows = [dict(s) for s in self.songs if s["song_emotion"] == emotion]
+        return rows[:limit] if limit else rows
+
+    def by_ids(self, ids):
+        return [dict(self.by_id[i]) for i in ids if i in self.by_id]
+
+    def counts(self, emotions):
+        return {e: sum(1 for s in self.songs if s["song_emotion"] == e) for e in emotions}
+
+    # sync API (db.py contract)
+    def _sync(self, value):
+        self.queries += 1
+        time.sleep(self.rtt)
+        return value
+
+    def install_sync(self):
+        db.songs = lambda: self
+        db.fetch_songs_by_emotion = lambda emotion, projection=None, limit=0: self._sync(self.by_emotion(emotion, limit))
+        db.fetch_songs_by_ids = lambda ids, projection=None: self._sync(self.by_ids(ids))
+        db.fetch_any_songs = lambda limit, projection=None: self._sync([dict(s) for s in self.songs[:limit]])
+        db.estimated_song_count = lambda: self._sync(len(self.songs))
+        db.count_by_emotion = lambda emotions: self._sync(self.counts(emotions))
+
+    # async API (db_async.py contract)
+    async def _async(self, value):
+        self.queries += 1
+        await asyncio.sleep(self.rtt)
+        return value
+
+    def install_async(self):
+        db_async.fetch_songs_by_emotion = lambda emotion, projection=None, limit=0: self._async(self.by_emotion(emotion, limit))
+        db_async.fetch_songs_by_ids = lambda ids, projection=None: self._async(self.by_ids(ids))
+        db_async.fetch_any_songs = lambda limit, projection=None: self._async([dict(s) for s in self.songs[:limit]])
+        db_async.estimated_song_count = lambda: self._async(len(self.songs))
+        db_async.count_by_emotion = lambda emotions: self._async(self.counts(emotions))
+
+
+def summarize(name, latencies, elapsed, queries):
+    latencies = sorted(latencies)
+    return {
+        "server": name,
+        "requests": len(latencies),
+        "elapsed_seconds": round(elapsed, 4),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "latency_ms_p50": round(statistics.median(latencies) * 1000, 2),
+        "latency_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "db_queries": queries,
+    }
+
+
+def bench_sync(stand_in, n_requests, concurrency, sessions):
+    stand_in.install_sync()
+    import working_api
+    working_api.app.logger.disabled = True
+
+    def one(i):
+        with working_api.app.test_client() as client:
+            start = time.perf_counter()
+            resp = client.post("/api/working-scan", json={"session_id": f"s{i % sessions}"})
+            assert resp.status_code == 200, resp.data
+            return time.perf_counter() - start
+
+    stand_in.queries = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(n_requests)))
+    return summarize("sync (Flask + pymongo)", latencies, time.perf_counter() - start, stand_in.queries)
+
+
+def bench_async(stand_in, n_requests, concurrency, sessions):
+    stand_in.install_async()
+    import working_api_async
+    client = working_api_async.app.test_client()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            resp = await client.post("/api/working-scan", json={"session_id": f"s{i % sessions}"})
+            assert resp.status_code == 200, await resp.get_data()
+            return time.perf_counter() - start
+
+    async def run():
+        stand_in.queries = 0
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(n_requests)))
+        return summarize("async (Quart + AsyncMongoClient)", latencies,
+                         time.perf_counter() - start, stand_in.queries)
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async working-scan benchmark")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rtt-ms", type=float, default=5.0, help="simulated Mongo round trip")
+    parser.add_argument("--songs-per-emotion", type=int, default=8,
+                        help="small catalogs make sessions hit the shown-songs lookup")
+    parser.add_argument("--sessions", type=int, default=16)
+    args = parser.parse_args()
+
+    # Silence the per-request prints of both servers
+    devnull = open(os.devnull, "w")
+    real_stdout, sys.stdout = sys.stdout, devnull
+    try:
+        results = []
+        for bench in (bench_sync, bench_async):
+            random.seed(0)
+            stand_in = StandIn(args.songs_per_emotion, args.rtt_ms / 1000)
+            results.append(bench(stand_in, args.requests, args.concurrency, args.sessions))
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+
+    speedup = results[1]["requests_per_second"] / results[0]["requests_per_second"]
+    print(json.dumps({"config": vars(args), "results": results,
+                      "async_speedup": round(speedup, 2)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Single-flight + memo in front of recommend_songs vs computing every request
+# Many threads request seed titles drawn from a Zipf distribution (a few very
+# popular seeds), first straight against the engine, then through
+# recommend_songs with coalescing only (memo off) and with the short-TTL memo.
+#
+#   python backend/bench/coalesce_bench.py --size 200000 --threads 16 --requests 2000
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "ml"))
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np  # noqa: E402
+import recommend    # noqa: E402
+import synthetic    # noqa: E402
+
+
+def hammer(fn, titles, threads):
+    """Run fn(title) for every title across `threads` workers; (seconds, results)"""
+    results = [None] * len(titles)
+    cursor = iter(range(len(titles)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                return
+            results[i] = fn(titles[i])
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - start, results
+
+
+def fresh_layers(memo_ttl):
+    recommend.RECOMMEND_MEMO_TTL = memo_ttl
+    recommend._recommend_memo = recommend.TTLCache("recommend_songs", recommend.RECOMMEND_MEMO_SIZE, memo_ttl)
+    recommend._recommend_flight = recommend.SingleFlight("recommend_songs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="recommend_songs coalescing benchmark")
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seeds", type=int, default=200, help="distinct seed titles")
+    parser.add_argument("--zipf", type=float, default=1.2)
+    parser.add_argument("--memo-ttl", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    df = synthetic.make_catalog(args.size, seed=args.seed)
+    recommend.use_model_dir(tempfile.mkdtemp(prefix="coalesce_bench_"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        package, X_scaled = recommend.build_model_package(df, "synthetic")
+        recommend.save_model_package(package, X_scaled, build_hybrid=False)
+
+    rng = np.random.default_rng(args.seed)
+    ranks = np.minimum(rng.zipf(args.zipf, args.requests), args.seeds) - 1
+    seeds = rng.choice(args.size, args.seeds, replace=False)
+    titles = [f"Song {seeds[r]:07d}" for r in ranks]
+
+    direct_s, direct = hammer(lambda t: recommend._recommend_songs(t, 5), titles, args.threads)
+    runs = {"direct": {"seconds": round(direct_s, 3), "requests_per_s": round(len(titles) / direct_s, 1)}}
+    for name, ttl in (("single_flight", 0.0), ("single_flight_memo", args.memo_ttl)):
+        fresh_layers(ttl)
+        seconds, got = hammer(lambda t: recommend.recommend_songs(t, 5), titles, args.threads)
+        runs[name] = {
+            "seconds": round(seconds, 3),
+            "requests_per_s": round(len(titles) / seconds, 1),
+            "same_answers": all(a == b for a, b in zip(direct, got)),
+            **recommend.recommend_stats(),
+        }
+        del runs[name]["memo"], runs[name]["single_flight"]
+
+    print(json.dumps({"config": vars(args), "distinct_titles_requested": len(set(titles)), "runs": runs}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Exact cosine engine vs the previous similarity paths
+# On synthetic catalogs: sklearn NearestNeighbors(metric="cosine") on float64 (the
+# joblib path), the former float64 brute-force lookup, and cosine.cosine_topk on the
+# pre-normalized float32 matrix, single and batched. Also checks the answers agree.
+#
+#   python backend/bench/cosine_bench.py --sizes 10000 100000 1000000 --queries 64
+
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "ml"))
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np  # noqa: E402
+import synthetic    # noqa: E402
+from cosine import cosine_topk, normalize_rows  # noqa: E402
+
+FEATURES = ["tempo", "energy", "danceability", "acousticness",
+            "instrumentalness", "liveness", "valence", "beats", "rmse"]
+
+
+def per_query_ms(fn, queries):
+    start = time.perf_counter()
+    out = [fn(q) for q in queries]
+    return (time.perf_counter() - start) * 1000 / len(queries), out
+
+
+def legacy_lookup(X, song_idx, k):
+    """The float64 brute-force path recommend_from_lookup used before"""
+    query = X[song_idx]
+    norms = np.linalg.norm(X, axis=1) * np.linalg.norm(query)
+    norms[norms == 0] = 1.0
+    distances = 1.0 - (X @ query) / norms
+    nearest = np.argsort(distances, kind="stable")[:k]
+    return nearest, 1.0 - distances[nearest]
+
+
+def agreement(reference, candidate):
+    """Share of top-k neighbours in common and the largest similarity difference"""
+    overlap, max_diff = [], 0.0
+    for (ref_idx, ref_sim), (idx, sim) in zip(reference, candidate):
+        overlap.append(len(set(ref_idx.tolist()) & set(idx.tolist())) / len(ref_idx))
+        max_diff = max(max_diff, float(np.max(np.abs(np.sort(ref_sim) - np.sort(sim)))))
+    return round(float(np.mean(overlap)), 4), max_diff
+
+
+def run(size, n_queries, k, seed):
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.neighbors import NearestNeighbors
+
+    df = synthetic.make_catalog(size, seed=seed)
+    X = StandardScaler().fit_transform(df[FEATURES])
+    nn = NearestNeighbors(n_neighbors=k, metric="cosine").fit(X)
+    unit = normalize_rows(X)
+    seeds = np.random.default_rng(seed).choice(size, n_queries, replace=False)
+
+    def sklearn_query(i):
+        d, idx = nn.kneighbors(X[i:i + 1], n_neighbors=k)
+        return idx[0], 1.0 - d[0]
+
+    sk_ms, sk_out = per_query_ms(sklearn_query, seeds)
+    legacy_ms, _ = per_query_ms(lambda i: legacy_lookup(X, i, k), seeds)
+    exact_ms, exact_out = per_query_ms(lambda i: cosine_topk(unit, unit[i], k), seeds)
+
+    start = time.perf_counter()
+    batch_idx, batch_sim = cosine_topk(unit, unit[seeds], k)
+    batch_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+    overlap, max_diff = agreement(sk_out, exact_out)
+    batch_overlap, _ = agreement(sk_out, list(zip(batch_idx, batch_sim)))
+    return {
+        "size": size,
+        "queries": n_queries,
+        "k": k,
+        "ms_per_query": {
+            "sklearn_nearest_neighbors": round(sk_ms, 3),
+            "legacy_float64_lookup": round(legacy_ms, 3),
+            "exact_float32": round(exact_ms, 3),
+            "exact_float32_batched": round(batch_ms, 3),
+        },
+        "speedup_vs_sklearn": round(sk_ms / exact_ms, 1),
+        "speedup_batched_vs_sklearn": round(sk_ms / batch_ms, 1),
+        "topk_overlap": overlap,
+        "topk_overlap_batched": batch_overlap,
+        "max_similarity_diff": max_diff,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact cosine engine benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10, help="neighbours per query (recommend_songs uses n + 5)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = [run(size, min(args.queries, size), args.k, args.seed) for size in args.sizes]
+    print(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
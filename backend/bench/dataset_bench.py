@@ -0,0 +1,56 @@
+# Parquet dataset cache vs parsing the CSV fallback
+# Writes a synthetic catalog as CSV, builds the cache once and reports load time
+# and DataFrame memory for pd.read_csv, the cached full table and the cached
+# training columns only. Also checks the cached features match the CSV (float32).
+#
+#   python backend/bench/dataset_bench.py --sizes 10000 100000 1000000
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "ml"))
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np     # noqa: E402
+import dataset_cache   # noqa: E402
+import recommend       # noqa: E402
+import synthetic       # noqa: E402
+
+
+def run(size, seed, repeat, workdir):
+    csv_path = os.path.join(workdir, f"catalog_{size}.csv")
+    synthetic.make_catalog(size, seed=seed).to_csv(csv_path, index=False)
+
+    report = dataset_cache.load_report(csv_path, columns=recommend.DATASET_COLUMNS, repeat=repeat)
+    csv_features = dataset_cache.read_source(csv_path)[recommend.FEATURES].to_numpy()
+    cached = dataset_cache.load_dataset(csv_path, columns=recommend.FEATURES)
+    report["feature_dtypes"] = sorted({str(t) for t in cached.dtypes})
+    report["max_feature_diff"] = float(np.max(np.abs(cached.to_numpy(dtype=np.float64) - csv_features)))
+
+    # Touching the source (new content) must invalidate the cache
+    with open(csv_path, "a", encoding="utf-8") as f:
+        f.write("\n")
+    report["rebuilt_after_source_change"] = not dataset_cache.cache_is_fresh(csv_path)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset cache benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        dataset_cache.DATASET_CACHE_DIR = os.path.join(workdir, "cache")
+        results = [run(size, args.seed, args.repeat, workdir) for size in args.sizes]
+    print(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# Offline benchmark suite for the recommendation and scan hot paths
+# Everything runs on synthetic data: no MongoDB, no Atlas, no dataset downloads.
+#
+#   python backend/bench/run_benchmarks.py                        # 1k, 100k, 1M songs
+#   python backend/bench/run_benchmarks.py --sizes 1000 --json out.json
+#   python backend/bench/run_benchmarks.py --save-baseline        # record new baseline
+#
+# Results are compared against bench/baseline.json; a benchmark whose median is
+# more than --threshold slower than its baseline is a regression (exit code 1).
+# Timings only compare on the same machine, so the baseline is not committed:
+# save one on the machine that runs the check. Without it the run fails (exit
+# code 2) instead of silently skipping the comparison.
+
+import argparse
+import importlib.metadata
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "script"))
+sys.path.insert(0, os.path.join(BACKEND_DIR, "ml"))
+sys.path.insert(0, BENCH_DIR)
+
+# emotion_api must not warm up or start Mongo refreshers on import
+os.environ["EMOTION_API_STARTUP"] = "manual"
+
+import numpy as np  # noqa: E402
+import synthetic    # noqa: E402
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+ALL_BENCHMARKS = [
+    "train_similarity", "train_emotion_recommender", "artifact_load",
+    "recommend_songs", "hybrid_recommend", "get_varied_recommendations", "scan_face",
+]
+
+
+def timed(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def record(results, name, size, times, **extra):
+    entry = {
+        "name": name,
+        "size": size,
+        "repeat": len(times),
+        "seconds_min": round(min(times), 6),
+        "seconds_median": round(statistics.median(times), 6),
+    }
+    entry.update(extra)
+    results.append(entry)
+    print(f"   {name:<28} n={size:<9} median {entry['seconds_median'] * 1000:10.2f} ms", file=sys.stderr)
+
+
+def quiet(fn):
+    """Run fn with the modules' emoji logging sent to /dev/null"""
+    def wrapper(*args, **kwargs):
+        with open(os.devnull, "w") as devnull:
+            real, sys.stdout = sys.stdout, devnull
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                sys.stdout = real
+    return wrapper
+
+
+class StandInEmotionModel:
+    """Used only when models/emotion_cnn.keras is absent: fixed CNN-shaped output"""
+
+    def __init__(self, num_classes):
+        self.output = np.full((1, num_classes), 1.0 / num_classes, dtype=np.float32)
+        self.output[0, 0] += 0.1
+
+    def predict(self, x, verbose=0):
+        return np.repeat(self.output, len(x), axis=0)
+
+
+def setup_emotion_api(model, encoder, docs):
+    """Wire emotion_api to in-memory models and a synthetic catalog"""
+    import db
+    import emotion_api
+
+    db.fetch_scan_catalog = lambda: docs
+    # catalog_snapshot captured db.catalog_fingerprint at import: point it at the stand-in
+    emotion_api.catalog_snapshot._collect = lambda: {"count": len(docs), "last_id": docs[-1]["_id"] if docs else None}
+
+    emotion_api.song_recommender = model
+    emotion_api.song_scorer_kind = type(model).__name__
+    emotion_api.emotion_encoder = encoder
+    cnn_kind = "keras"
+    if emotion_api.face_cascade is None:
+        import cv2
+        emotion_api.face_cascade = cv2.CascadeClassifier(emotion_api.CASCADE_PATH)
+    if emotion_api.emotion_model is None:
+        if os.path.exists(emotion_api.EMOTION_MODEL_PATH):
+            import tensorflow as tf
+            emotion_api.emotion_model = tf.keras.models.load_model(emotion_api.EMOTION_MODEL_PATH)
+        else:
+            emotion_api.emotion_model = StandInEmotionModel(len(emotion_api.emotion_labels))
+    if isinstance(emotion_api.emotion_model, StandInEmotionModel):
+        cnn_kind = "stand-in"
+    emotion_api.catalog_snapshot.refresh()
+    emotion_api.models_ready.set()
+    return emotion_api, cnn_kind
+
+
+def run_size(size, benchmarks, repeat, faces, results):
+    import recommend
+    import train_recommender
+
+    print(f"📦 Catalog of {size} songs", file=sys.stderr)
+    df = synthetic.make_catalog(size, seed=size)
+    docs = synthetic.catalog_docs(df)
+    reps = repeat if size <= 100_000 else 1
+    model_dir = tempfile.mkdtemp(prefix=f"bench_{size}_")
+    recommend.use_model_dir(model_dir)
+
+    # ---- similarity recommender (backend/ml/recommend.py)
+    times, (package, X_scaled) = timed(quiet(lambda: recommend.build_model_package(df, "synthetic")), reps)
+    if "train_similarity" in benchmarks:
+        record(results, "train_similarity", size, times)
+    quiet(recommend.save_model_package)(package, X_scaled, build_hybrid=False)
+
+    if "artifact_load" in benchmarks:
+        import joblib
+        times, _ = timed(lambda: joblib.load(recommend.MODEL_PATH), reps)
+        record(results, "artifact_load", size, times, artifact="joblib",
+               bytes=os.path.getsize(recommend.MODEL_PATH))
+        times, _ = timed(lambda: np.load(recommend.LOOKUP_FEATURES_PATH, mmap_mode="r"), reps)
+        record(results, "artifact_load_lookup", size, times, artifact="lookup",
+               bytes=os.path.getsize(recommend.LOOKUP_FEATURES_PATH) + os.path.getsize(recommend.LOOKUP_META_PATH))
+
+    if "recommend_songs" in benchmarks:
+        # The engine itself: recommend_songs would answer the repeated query from its memo
+        query = f"Song {size // 2:07d}"
+        times, result = timed(lambda: recommend._recommend_songs(query, 5), reps * 3)
+        record(results, "recommend_songs", size, times, ok="error" not in result)
+        times, result = timed(lambda: recommend._recommend_songs(query, 5, {"language": "nepali"}), reps * 3)
+        record(results, "recommend_songs_filtered", size, times, ok="error" not in result)
+        recommend.recommend_songs(query, 5)  # fill the memo
+        times, result = timed(lambda: recommend.recommend_songs(query, 5), reps * 3)
+        record(results, "recommend_songs_memo_hit", size, times, ok="error" not in result,
+               memo_ttl=recommend.RECOMMEND_MEMO_TTL)
+
+    # ---- emotion recommender (backend/script/train_recommender.py)
+    X = df[train_recommender.FEATURES].to_numpy(dtype=np.float64)
+    y = [train_recommender.infer_emotion(*row) for row in X]
+    times, (model, encoder) = timed(quiet(lambda: train_recommender.train_emotion_recommender(X, y)), 1)
+    if "train_emotion_recommender" in benchmarks:
+        record(results, "train_emotion_recommender", size, times)
+    if "artifact_load" in benchmarks:
+        import joblib
+        path = os.path.join(model_dir, "song_recommender_forest.joblib")
+        joblib.dump(model, path)
+        times, _ = timed(lambda: joblib.load(path), reps)
+        record(results, "artifact_load_forest", size, times, artifact="forest", bytes=os.path.getsize(path))
+
+    if "hybrid_recommend" in benchmarks:
+        import hybrid
+        times, _ = timed(quiet(lambda: hybrid.build_hybrid_index(df, X_scaled, model, encoder)), 1)
+        record(results, "build_hybrid_index", size, times)
+        recommend.recommend_hybrid("happy")  # load + title map, once per process
+        times, result = timed(lambda: recommend.recommend_hybrid("happy"), reps * 3)
+        record(results, "hybrid_recommend_emotion", size, times, ok="error" not in result)
+        seed = f"Song {size // 3:07d}"
+        times, result = timed(lambda: recommend.recommend_hybrid("happy", seed), reps * 3)
+        record(results, "hybrid_recommend_seed", size, times, ok="error" not in result)
+
+    if not benchmarks & {"get_varied_recommendations", "scan_face"}:
+        return
+    emotion_api, cnn_kind = setup_emotion_api(model, encoder, docs)
+
+    if "get_varied_recommendations" in benchmarks:
+        X_api, valid = quiet(emotion_api.load_catalog_features)(emotion_api.StageTimer(emotion_api.SCAN_STAGE_SECONDS))
+        times, _ = timed(quiet(lambda: emotion_api.get_varied_recommendations(X_api, valid, "happy", "bench")), reps)
+        record(results, "get_varied_recommendations", size, times)
+
+    if "scan_face" in benchmarks:
+        images = synthetic.make_face_images(faces)
+        client = emotion_api.app.test_client()
+
+        def scan(i):
+            resp = client.post("/api/scan-face", json={"image": images[i % len(images)]},
+                               environ_base={"REMOTE_ADDR": f"10.0.0.{i % 250}"})
+            assert resp.status_code == 200, resp.data
+            return resp.get_json()
+
+        def cold():
+            emotion_api.recommendation_cache.invalidate()
+            emotion_api.face_cache.invalidate()
+            return scan(0)
+
+        times, body = timed(quiet(cold), reps)
+        record(results, "scan_face_cold", size, times, cnn=cnn_kind,
+               face_detected=body.get("confidence", 0) > 0)
+        counter = iter(range(10_000_000))
+        times, _ = timed(quiet(lambda: scan(next(counter))), reps * 3)
+        record(results, "scan_face_warm", size, times, cnn=cnn_kind)
+
+
+def environment():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    for package in ("numpy", "pandas", "scikit-learn", "flask", "opencv-python-headless", "tensorflow"):
+        try:
+            info[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            info[package] = None
+    try:
+        info["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True,
+        ).stdout.strip() or None
+    except OSError:
+        info["git_commit"] = None
+    return info
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {f"{r['name']}@{r['size']}": r for r in json.load(f)["results"]}
+
+    regressions = []
+    for r in results:
+        base = baseline.get(f"{r['name']}@{r['size']}")
+        if not base or not base["seconds_median"]:
+            print(f"⚠️ {r['name']} n={r['size']} has no baseline entry; save a new baseline to cover it",
+                  file=sys.stderr)
+            continue
+        ratio = r["seconds_median"] / base["seconds_median"]
+        r["baseline_seconds_median"] = base["seconds_median"]
+        r["ratio_vs_baseline"] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressions.append(r)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline recommendation/scan benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--only", nargs="+", choices=ALL_BENCHMARKS, default=ALL_BENCHMARKS)
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions (1 above 100k songs)")
+    parser.add_argument("--faces", type=int, default=4, help="synthetic face images for scan_face")
+    parser.add_argument("--json", default=None, help="write results here (default: stdout)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown vs baseline median (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", "--update-baseline", dest="save_baseline", action="store_true",
+                        help="write the results as the new baseline instead of comparing")
+    args = parser.parse_args()
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"❌ No baseline at {args.baseline}; run once with --save-baseline on this machine first",
+              file=sys.stderr)
+        sys.exit(2)
+
+    results = []
+    for size in args.sizes:
+        run_size(size, set(args.only), args.repeat, args.faces, results)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "config": {"sizes": args.sizes, "repeat": args.repeat, "threshold": args.threshold},
+        "results": results,
+    }
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline written to {args.baseline}", file=sys.stderr)
+        regressions = []
+    else:
+        regressions = compare(results, args.baseline, args.threshold)
+        report["regressions"] = [f"{r['name']}@{r['size']}" for r in regressions]
+
+    out = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(out)
+    else:
+        print(out)
+
+    for r in regressions:
+        print(f"❌ Regression: {r['name']} n={r['size']} is {r['ratio_vs_baseline']:.2f}x baseline", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Sharded similarity index vs the single lookup index
+# Builds a synthetic catalog, splits it into 2/4/... shards, starts one shard
+# worker process per shard on this machine and checks that the coordinator's
+# merged answers equal recommend_songs on the single index, then times both.
+#
+#   python backend/bench/shard_bench.py --size 200000 --shards 2 4 --queries 50
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "ml"))
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np  # noqa: E402
+import recommend    # noqa: E402
+import synthetic    # noqa: E402
+
+
+def latency_ms(fn, titles):
+    times = []
+    for title in titles:
+        start = time.perf_counter()
+        fn(title)
+        times.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(times), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded index scatter-gather benchmark")
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--n", type=int, default=10)
+    args = parser.parse_args()
+
+    df = synthetic.make_catalog(args.size, seed=1)
+    recommend.use_model_dir(tempfile.mkdtemp(prefix="shard_bench_"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        package, X_scaled = recommend.build_model_package(df, "synthetic")
+        recommend.save_model_package(package, X_scaled, build_hybrid=False)
+    rng = np.random.default_rng(0)
+    # Exact titles (anchored) so the title scan is not what gets measured
+    titles = [f"^Song {i:07d}$" for i in rng.choice(args.size, args.queries, replace=False)]
+
+    expected = {t: recommend.recommend_songs(t, args.n) for t in titles}
+    report = {"size": args.size, "queries": args.queries, "n": args.n,
+              "single_index_ms": latency_ms(lambda t: recommend.recommend_songs(t, args.n), titles),
+              "sharded": []}
+
+    for n_shards in args.shards:
+        with contextlib.redirect_stdout(io.StringIO()):
+            recommend.build_shards(df, X_scaled, n_shards)
+        coordinator = recommend.ShardCoordinator.start_local()
+        recommend._coordinator = coordinator
+        try:
+            mismatches = 0
+            for t in titles:
+                got = recommend.recommend_songs_sharded(t, args.n)
+                want = expected[t]
+                if [r["title"] for r in got["recommendations"]] != [r["title"] for r in want["recommendations"]]:
+                    mismatches += 1
+            report["sharded"].append({
+                "shards": n_shards,
+                "median_ms": latency_ms(lambda t: recommend.recommend_songs_sharded(t, args.n), titles),
+                "mismatches_vs_single": mismatches,
+            })
+        finally:
+            coordinator.close()
+            recommend._coordinator = None
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
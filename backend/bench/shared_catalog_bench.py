@@ -0,0 +1,121 @@
+# Per-worker memory: private catalog copies vs the shared catalog generation
+# Publishes a synthetic catalog with shared_catalog.publish(), then starts N
+# worker processes twice: once holding their own song dicts, feature matrix and
+# probabilities (what each emotion_api worker does today), once attaching the
+# published generation read-only. Each worker ranks the whole catalog once and
+# reports the RSS and PSS (proportional set size: shared pages split between
+# the processes mapping them) it added, from /proc/self/smaps_rollup.
+#
+#   python backend/bench/shared_catalog_bench.py --size 500000 --workers 4
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "script"))
+sys.path.insert(0, BENCH_DIR)
+
+import numpy as np     # noqa: E402
+import shared_catalog  # noqa: E402
+import synthetic       # noqa: E402
+
+
+def memory_kb():
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1].lower()] = int(parts[1])
+    return values
+
+
+class UniformScorer:
+    """Stand-in recommender: probabilities from the features, no training needed"""
+
+    def predict_proba(self, X):
+        logits = np.stack([X[:, 0] + X[:, 4], 1 - X[:, 4], X[:, 2]], axis=1)
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+
+def worker(mode, root, size, seed, hold_seconds):
+    before = memory_kb()
+    if mode == "private":
+        docs = synthetic.catalog_docs(synthetic.make_catalog(size, seed=seed))
+        X, songs = shared_catalog.song_features(docs)
+        probabilities = UniformScorer().predict_proba(X)
+        del docs
+    else:
+        view = shared_catalog.SharedCatalog(root).current()
+        X, songs, probabilities = view.features, view.songs, view.probabilities
+    scores = np.asarray(probabilities) @ np.array([1.0, 0.0, 0.0]) * (1.0 + (np.asarray(X[:, 1]) - 120) / 240)
+    top = [songs[int(i)]["title"] for i in np.argsort(-scores)[:5]]
+    after = memory_kb()
+    # Stay alive so every worker maps the catalog at the same time (PSS is split between them)
+    time.sleep(hold_seconds)
+    final = memory_kb()
+    print(json.dumps({
+        "rss_added_mb": round((after["rss"] - before["rss"]) / 1024, 1),
+        "pss_added_mb": round((final["pss"] - before["pss"]) / 1024, 1),
+        "top": top,
+    }))
+
+
+def run_workers(mode, root, args):
+    procs = [
+        subprocess.Popen([sys.executable, __file__, "--worker", mode, "--root", root,
+                          "--size", str(args.size), "--seed", str(args.seed), "--hold", str(args.hold)],
+                         stdout=subprocess.PIPE, text=True)
+        for _ in range(args.workers)
+    ]
+    reports = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+    return {
+        "per_worker_rss_mb": [r["rss_added_mb"] for r in reports],
+        "per_worker_pss_mb": [r["pss_added_mb"] for r in reports],
+        "total_pss_mb": round(sum(r["pss_added_mb"] for r in reports), 1),
+        "same_top5": all(r["top"] == reports[0]["top"] for r in reports),
+        "top5": reports[0]["top"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared catalog memory benchmark")
+    parser.add_argument("--size", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hold", type=float, default=3.0)
+    parser.add_argument("--worker", choices=["private", "shared"], help=argparse.SUPPRESS)
+    parser.add_argument("--root", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.root, args.size, args.seed, args.hold)
+        return
+
+    with tempfile.TemporaryDirectory(dir="/dev/shm" if os.path.isdir("/dev/shm") else None) as root:
+        docs = synthetic.catalog_docs(synthetic.make_catalog(args.size, seed=args.seed))
+        start = time.perf_counter()
+        shared_catalog.publish(root, docs, UniformScorer(), ["happy", "neutral", "sad"])
+        publish_s = time.perf_counter() - start
+        del docs
+        gen_dir = os.path.join(root, f"gen-{shared_catalog.current_generation(root):06d}")
+        generation_mb = sum(os.path.getsize(os.path.join(gen_dir, f)) for f in os.listdir(gen_dir)) / 1e6
+
+        results = {mode: run_workers(mode, root, args) for mode in ("private", "shared")}
+    print(json.dumps({
+        "config": vars(args),
+        "publish_seconds": round(publish_s, 2),
+        "generation_mb": round(generation_mb, 1),
+        **results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
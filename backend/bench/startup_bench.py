@@ -0,0 +1,103 @@
+# Cold-start benchmark for the Python entry points
+# Runs each entry point in a fresh interpreter with `-X importtime` and reports
+# wall-clock time plus the slowest imports, so lazy-loading regressions show up.
+#
+#   python backend/bench/startup_bench.py            # human-readable table
+#   python backend/bench/startup_bench.py --json     # machine-readable
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_DIR = os.path.join(BACKEND_DIR, "script")
+ML_DIR = os.path.join(BACKEND_DIR, "ml")
+
+# name -> (working dir, python code, extra env)
+ENTRY_POINTS = {
+    "emotion_api (import)": (SCRIPT_DIR, "import emotion_api", {"EMOTION_API_STARTUP": "manual"}),
+    "emotion_api (ready)": (SCRIPT_DIR, "import emotion_api", {"EMOTION_API_STARTUP": "eager"}),
+    "working_api (import)": (SCRIPT_DIR, "import working_api", {}),
+    "recommend (import)": (ML_DIR, "import recommend", {}),
+    "recommend (query)": (ML_DIR, "import recommend, sys; recommend.recommend_songs(sys.argv[1])", {}),
+}
+
+
+def parse_importtime(stderr):
+    """Return {module: cumulative_us} from `-X importtime` output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            _, self_us, cumulative_us, name = [p.strip() for p in line.split(":", 1)[1].split("|")]
+            modules[name.strip()] = int(cumulative_us)
+        except ValueError:
+            continue
+    return modules
+
+
+def run_entry(name, cwd, code, env_extra, query, repeat):
+    env = dict(os.environ, **env_extra)
+    args = [sys.executable, "-X", "importtime", "-c", code]
+    if "sys.argv[1]" in code:
+        args.append(query)
+
+    walls, last_modules, error = [], {}, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run(args, cwd=cwd, env=env, capture_output=True, text=True)
+        walls.append(time.perf_counter() - start)
+        last_modules = parse_importtime(proc.stderr)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+
+    # Only top-level packages (no dots) to keep the report readable
+    top = sorted(
+        ((m, us) for m, us in last_modules.items() if "." not in m),
+        key=lambda x: x[1], reverse=True,
+    )[:10]
+    return {
+        "entry_point": name,
+        "wall_seconds_min": round(min(walls), 4),
+        "wall_seconds_median": round(sorted(walls)[len(walls) // 2], 4),
+        "slowest_imports_ms": {m: round(us / 1000, 1) for m, us in top},
+        "heavy_modules_loaded": sorted(
+            m for m in ("tensorflow", "cv2", "PIL", "sklearn", "pandas", "pymongo", "joblib")
+            if m in last_modules
+        ),
+        "error": error,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup/import-time benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--query", default="Bholi", help="song title for the recommend query run")
+    parser.add_argument("--only", nargs="*", default=None, help="subset of entry point names")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = []
+    for name, (cwd, code, env_extra) in ENTRY_POINTS.items():
+        if args.only and not any(o in name for o in args.only):
+            continue
+        results.append(run_entry(name, cwd, code, env_extra, args.query, args.repeat))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'entry point':<24} {'min s':>8} {'median s':>9}  heavy modules")
+    for r in results:
+        heavy = ", ".join(r["heavy_modules_loaded"]) or "-"
+        print(f"{r['entry_point']:<24} {r['wall_seconds_min']:>8.3f} {r['wall_seconds_median']:>9.3f}  {heavy}")
+        if r["error"]:
+            print(f"   ⚠️ {r['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Synthetic data for offline benchmarks
+# Catalogs use the same feature schema as train_recommendation_model() plus the
+# fields emotion_api.py reads; face images are drawn with PIL so no dataset is needed.
+
+import base64
+from io import BytesIO
+
+import numpy as np
+
+LANGUAGES = ["nepali", "english", "hindi", "newari"]
+EMOTIONS = ["happy", "sad", "neutral"]
+
+
+def make_catalog(n, seed=0):
+    """DataFrame of `n` songs with realistic-looking audio features"""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    tempo = np.clip(rng.normal(120, 25, n), 50, 200)
+    duration = rng.uniform(120, 360, n)
+    df = pd.DataFrame({
+        "_id": [f"{i:024x}" for i in range(n)],
+        "title": [f"Song {i:07d}" for i in range(n)],
+        "artist": [f"Artist {i % 997}" for i in range(n)],
+        "album": [f"Album {i % 331}" for i in range(n)],
+        "filename": [f"song_{i:07d}.mp3" for i in range(n)],
+        "language": rng.choice(LANGUAGES, n),
+        "song_emotion": rng.choice(EMOTIONS, n),
+        "tempo": tempo,
+        "energy": rng.beta(2, 2, n),
+        "danceability": rng.beta(2.5, 2, n),
+        "acousticness": rng.beta(1.2, 2, n),
+        "instrumentalness": rng.beta(0.5, 3, n),
+        "liveness": rng.beta(1, 5, n),
+        "valence": rng.beta(2, 2, n),
+        "beats": np.round(tempo * duration / 60),
+        "rmse": rng.uniform(0.05, 0.4, n),
+    })
+    return df
+
+
+def catalog_docs(df):
+    """Mongo-style documents (list of dicts) for code that reads raw songs"""
+    return df.to_dict("records")
+
+
+def make_face_image(size=320, seed=0):
+    """A frontal cartoon face on a noisy background, as a base64 JPEG data URL"""
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    background = rng.integers(60, 200, (size, size, 3), dtype=np.uint8)
+    img = Image.fromarray(background)
+    draw = ImageDraw.Draw(img)
+    cx, cy, r = size // 2, size // 2, size // 3
+    skin = tuple(int(v) for v in rng.integers(150, 230, 3))
+    draw.ellipse([cx - r, cy - int(r * 1.25), cx + r, cy + int(r * 1.25)], fill=skin)
+    eye_y = cy - r // 3
+    for dx in (-r // 2, r // 2):
+        draw.ellipse([cx + dx - r // 6, eye_y - r // 10, cx + dx + r // 6, eye_y + r // 10], fill=(30, 30, 30))
+    draw.rectangle([cx - r // 10, cy - r // 8, cx + r // 10, cy + r // 4], fill=tuple(max(0, c - 40) for c in skin))
+    draw.arc([cx - r // 2, cy + r // 4, cx + r // 2, cy + r // 1.5], 20, 160, fill=(120, 20, 20), width=max(2, r // 15))
+
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def make_face_images(count, size=320, seed=0):
+    return [make_face_image(size, seed + i) for i in range(count)]
@@ -0,0 +1,68 @@
+import numpy as np
+import os
+
+# Exact cosine search on pre-normalized float32 rows
+# Rows are L2-normalized once at train time, so cosine similarity is a plain dot
+# product: one blocked matrix-vector (or matrix-matrix, for batches) product, with
+# argpartition on the first block and a threshold filter on the rest. Block size
+# bounds the temporary similarity buffer.
+
+COSINE_BLOCK_ELEMENTS = int(os.environ.get("COSINE_BLOCK_ELEMENTS", str(1024 * 1024)))  # 4 MB of float32
+
+def normalize_rows(X):
+    """float32 copy of X with unit-length rows (zero rows stay zero)"""
+    X = np.asarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+def _topk_rows(sims, k, offset):
+    """Per row of sims (q, b): indices (+offset) and values of the k largest"""
+    if sims.shape[1] <= k:
+        idx = np.broadcast_to(np.arange(offset, offset + sims.shape[1]), sims.shape)
+        return np.array(idx), np.array(sims)
+    part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    return part + offset, np.take_along_axis(sims, part, axis=1)
+
+def cosine_topk(unit, queries, k, block_elements=None):
+    """
+    Exact top-k by cosine similarity.
+    unit: (n, d) float32 unit rows (np.ndarray or memmap); queries: (q, d) or (d,).
+    Returns (indices, similarities), each (q, k), best first; ties keep row order.
+    """
+    single = np.ndim(queries) == 1
+    queries = normalize_rows(np.atleast_2d(queries))
+    n, q = len(unit), len(queries)
+    k = min(k, n)
+    if k == 0:
+        best_idx, best_sim = np.empty((q, 0), dtype=np.int64), np.empty((q, 0), dtype=np.float32)
+        return (best_idx[0], best_sim[0]) if single else (best_idx, best_sim)
+
+    block_rows = max(k, (block_elements or COSINE_BLOCK_ELEMENTS) // q)
+    best_idx = best_sim = None
+    for start in range(0, n, block_rows):
+        sims = queries @ np.asarray(unit[start:start + block_rows]).T  # (q, block), C-contiguous
+        if best_idx is None:
+            best_idx, best_sim = _topk_rows(sims, k, start)
+            continue
+        # Only entries at or above the current k-th best can enter the top k, so a
+        # vectorized comparison replaces most of the argpartition work.
+        floor = best_sim.min(axis=1)
+        rows, cols = np.nonzero(sims >= floor[:, None])
+        bounds = np.searchsorted(rows, np.arange(q + 1))
+        for r in range(q):
+            c = cols[bounds[r]:bounds[r + 1]]
+            if len(c) == 0:
+                continue
+            idx = np.concatenate([best_idx[r], c + start])
+            sim = np.concatenate([best_sim[r], sims[r, c]])
+            keep = np.argpartition(-sim, k - 1)[:k]
+            best_idx[r], best_sim[r] = idx[keep], sim[keep]
+
+    # Final order: similarity descending, then row index (matches a stable sort of distances)
+    order = np.lexsort((best_idx, -best_sim), axis=-1)
+    best_idx = np.take_along_axis(best_idx, order, axis=1)
+    best_sim = np.take_along_axis(best_sim, order, axis=1)
+    if single:
+        return best_idx[0], best_sim[0]
+    return best_idx, best_sim
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import sys
+import time
+
+# Typed columnar cache for the offline song datasets
+# The CSV fallback (musicDB.audio2.csv) or a mongoexport dump (JSON lines) is
+# parsed once into a Parquet file with float32 audio features; later loads read
+# only the requested columns from it. The cache is keyed on the source's SHA-256,
+# so editing or replacing the source file rebuilds it on the next load (the hash
+# is only recomputed when the file's size or mtime changed).
+#
+#   python dataset_cache.py musicDB.audio2.csv            # build / refresh the cache
+#   python dataset_cache.py musicDB.audio2.csv --report   # load time + memory vs read_csv
+#
+# pandas and pyarrow are imported inside the functions; without pyarrow the
+# loader falls back to parsing the source every time.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_CACHE_DIR = os.environ.get("DATASET_CACHE_DIR", os.path.join(BASE_DIR, "models", "dataset_cache"))
+
+# Audio features the recommenders read; stored as float32
+FLOAT_COLUMNS = [
+    "tempo", "energy", "danceability", "acousticness",
+    "instrumentalness", "liveness", "valence", "beats", "rmse"
+]
+
+def source_checksum(path, chunk_size=1 << 20):
+    """SHA-256 of the source file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_paths(source_path):
+    """(parquet, meta json) for a source file; one cache entry per source name"""
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    return (os.path.join(DATASET_CACHE_DIR, f"{name}.parquet"),
+            os.path.join(DATASET_CACHE_DIR, f"{name}.meta.json"))
+
+def read_source(source_path):
+    """Parse the raw source: CSV, or a mongoexport dump (.json / .jsonl, one document per line)"""
+    import pandas as pd
+    if source_path.endswith((".json", ".jsonl")):
+        df = pd.read_json(source_path, lines=True)
+        if "_id" in df.columns:
+            # mongoexport writes {"$oid": "..."}; keep the plain id string like load_songs_from_mongodb
+            df["_id"] = [v.get("$oid", str(v)) if isinstance(v, dict) else str(v) for v in df["_id"]]
+        return df
+    return pd.read_csv(source_path)
+
+def typed_frame(df):
+    """float32 audio features, numeric-looking text coerced (unparseable -> NaN), strings kept as str"""
+    import pandas as pd
+    df = df.copy()
+    for name in FLOAT_COLUMNS:
+        if name in df.columns:
+            df[name] = pd.to_numeric(df[name], errors="coerce").astype("float32")
+    for name in df.columns:
+        if df[name].dtype == object:
+            df[name] = df[name].map(lambda v: v if v is None or isinstance(v, str) or v != v else str(v))
+    return df
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def build_cache(source_path):
+    """Convert the source into the Parquet cache; returns the typed DataFrame"""
+    parquet_path, meta_path = cache_paths(source_path)
+    checksum = source_checksum(source_path)
+    start = time.perf_counter()
+    df = typed_frame(read_source(source_path))
+    os.makedirs(DATASET_CACHE_DIR, exist_ok=True)
+    tmp_path = parquet_path + ".tmp"
+    df.to_parquet(tmp_path, engine="pyarrow", index=False)
+    os.replace(tmp_path, parquet_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "source": os.path.abspath(source_path),
+            "sha256": checksum,
+            "size": os.path.getsize(source_path),
+            "mtime_ns": os.stat(source_path).st_mtime_ns,
+            "rows": len(df),
+            "columns": {name: str(dtype) for name, dtype in df.dtypes.items()},
+            "built_seconds": round(time.perf_counter() - start, 3),
+        }, f, indent=2)
+    print(f"🗃️ Dataset cache built: {parquet_path} ({len(df)} rows)")
+    return df
+
+def cache_is_fresh(source_path):
+    """
+    True when the cache matches the source's bytes. A source that was touched or
+    copied without changing gets its new size/mtime written back to the meta file,
+    so later loads take the no-hash path again.
+    """
+    parquet_path, meta_path = cache_paths(source_path)
+    if not (os.path.exists(parquet_path) and os.path.exists(meta_path)):
+        return False
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    stat = os.stat(source_path)
+    if meta.get("size") == stat.st_size and meta.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+    if meta.get("sha256") != source_checksum(source_path):
+        return False
+    meta.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+    return True
+
+def load_dataset(source_path, columns=None):
+    """
+    Songs DataFrame for `source_path`, served from the Parquet cache (rebuilt when
+    the source checksum changes). columns: read only these (missing ones are skipped).
+    """
+    import pandas as pd
+
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Dataset not found: {source_path}")
+    if not _has_pyarrow():
+        print("⚠️ pyarrow not installed; parsing the source without the dataset cache")
+        df = typed_frame(read_source(source_path))
+        return df[[c for c in columns if c in df.columns]] if columns else df
+
+    parquet_path, meta_path = cache_paths(source_path)
+    if not cache_is_fresh(source_path):
+        df = build_cache(source_path)
+        return df[[c for c in columns if c in df.columns]] if columns else df
+
+    if columns:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            available = json.load(f)["columns"]
+        columns = [c for c in columns if c in available]
+    return pd.read_parquet(parquet_path, engine="pyarrow", columns=columns)
+
+def load_report(source_path, columns=None, repeat=3):
+    """Load time and DataFrame memory: parsing the source (pd.read_csv) vs the Parquet cache"""
+    def timed(fn):
+        best, df = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            df = fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, df
+
+    load_dataset(source_path)  # make sure the cache exists and is fresh
+    csv_seconds, csv_df = timed(lambda: read_source(source_path))
+    cache_seconds, cache_df = timed(lambda: load_dataset(source_path))
+    cols_seconds, cols_df = timed(lambda: load_dataset(source_path, columns)) if columns else (None, None)
+
+    def memory_mb(df):
+        return round(df.memory_usage(deep=True).sum() / 1e6, 2)
+
+    report = {
+        "source": os.path.abspath(source_path),
+        "rows": len(csv_df),
+        "source_mb": round(os.path.getsize(source_path) / 1e6, 2),
+        "cache_mb": round(os.path.getsize(cache_paths(source_path)[0]) / 1e6, 2),
+        "source_parse": {"seconds": round(csv_seconds, 4), "memory_mb": memory_mb(csv_df)},
+        "cache_all_columns": {"seconds": round(cache_seconds, 4), "memory_mb": memory_mb(cache_df)},
+        "speedup": round(csv_seconds / cache_seconds, 1) if cache_seconds > 0 else None,
+    }
+    if columns:
+        report["cache_needed_columns"] = {
+            "columns": list(cols_df.columns),
+            "seconds": round(cols_seconds, 4),
+            "memory_mb": memory_mb(cols_df),
+        }
+        report["speedup_needed_columns"] = round(csv_seconds / cols_seconds, 1) if cols_seconds > 0 else None
+    return report
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python dataset_cache.py <musicDB.audio2.csv | export.jsonl> [--report]")
+    path = sys.argv[1]
+    if "--report" in sys.argv[2:]:
+        print(json.dumps(load_report(path, columns=FLOAT_COLUMNS + ["title", "filename", "language"]), indent=2))
+    else:
+        df = build_cache(path)
+        print(f"📊 {len(df)} rows, columns: {list(df.columns)}")
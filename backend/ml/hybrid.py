@@ -0,0 +1,240 @@
+import numpy as np
+import os
+import re
+import json
+import time
+from cosine import normalize_rows
+
+# Hybrid emotion + similarity engine
+# Combines the two recommenders: the feature-space neighbour model of recommend.py
+# and the emotion forest of backend/script/train_recommender.py. Everything a query
+# needs is precomputed at train time into HYBRID_INDEX_DIR:
+#
+#   vectors.npy        float32 L2-normalized scaled features, rows grouped by cluster
+#   offsets.npy        start row of each cluster (+ end), centroids.npy unit centroids
+#   order.npy          row -> original song index, rows_of.npy the inverse
+#   emotion_probs.npy  forest predict_proba per row (float32)
+#   by_<emotion>.npy   rows sorted by that emotion's probability (top HYBRID_EMOTION_POOL)
+#   meta.json          classes, features, titles/filenames/languages (original order)
+#
+# Seed queries probe the HYBRID_NPROBE nearest clusters (inverted-file search), emotion
+# queries read the presorted lists, so neither scans the whole catalog.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_DIR = os.path.join(os.path.dirname(BASE_DIR), "script")
+HYBRID_INDEX_DIR = os.environ.get("HYBRID_INDEX_DIR", os.path.join(BASE_DIR, "models", "hybrid_index"))
+EMOTION_RECOMMENDER_PATH = os.path.join(SCRIPT_DIR, "models", "song_recommender.joblib")
+EMOTION_ENCODER_PATH = os.path.join(SCRIPT_DIR, "models", "emotion_encoder.joblib")
+
+# Column order and defaults of the emotion forest (train_recommender.FEATURES, emotion_api)
+EMOTION_FEATURES = ["danceability", "tempo", "acousticness", "energy", "valence"]
+EMOTION_DEFAULTS = {"danceability": 0.5, "tempo": 120.0, "acousticness": 0.5, "energy": 0.5, "valence": 0.5}
+
+HYBRID_ALPHA = float(os.environ.get("HYBRID_ALPHA", "0.5"))           # weight of similarity vs emotion
+HYBRID_NPROBE = int(os.environ.get("HYBRID_NPROBE", "8"))             # clusters searched per seed query
+HYBRID_EMOTION_POOL = int(os.environ.get("HYBRID_EMOTION_POOL", "5000"))
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", "200"))   # neighbours re-ranked by emotion
+
+# -------------------------------------------------------------------
+# 🏗️ Build (train time)
+# -------------------------------------------------------------------
+def emotion_feature_matrix(songs_df):
+    columns = []
+    for name in EMOTION_FEATURES:
+        if name in songs_df.columns:
+            col = songs_df[name].astype(float).fillna(EMOTION_DEFAULTS[name]).to_numpy()
+        else:
+            col = np.full(len(songs_df), EMOTION_DEFAULTS[name])
+        columns.append(col)
+    return np.column_stack(columns)
+
+def build_hybrid_index(songs_df, X_scaled, forest, encoder, out_dir=None, n_clusters=None, seed=0):
+    """Cluster the unit feature vectors and precompute emotion probabilities and rankings"""
+    from sklearn.cluster import MiniBatchKMeans
+
+    out_dir = out_dir or HYBRID_INDEX_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    unit = normalize_rows(X_scaled)
+    n = len(unit)
+    n_clusters = n_clusters or int(np.clip(np.sqrt(n), 1, 4096))
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=4096, n_init=1, random_state=seed)
+    labels = kmeans.fit_predict(unit)
+
+    order = np.argsort(labels, kind="stable").astype(np.int32)
+    rows_of = np.empty(n, dtype=np.int32)
+    rows_of[order] = np.arange(n, dtype=np.int32)
+    offsets = np.zeros(n_clusters + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(labels, minlength=n_clusters))
+
+    probs = forest.predict_proba(emotion_feature_matrix(songs_df)).astype(np.float32)[order]
+    classes = [str(c) for c in encoder.classes_]
+
+    np.save(os.path.join(out_dir, "vectors.npy"), unit[order])
+    np.save(os.path.join(out_dir, "centroids.npy"), normalize_rows(kmeans.cluster_centers_))
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, "order.npy"), order)
+    np.save(os.path.join(out_dir, "rows_of.npy"), rows_of)
+    np.save(os.path.join(out_dir, "emotion_probs.npy"), probs)
+    pool = min(HYBRID_EMOTION_POOL, n)
+    for c, name in enumerate(classes):
+        top = np.argpartition(-probs[:, c], pool - 1)[:pool]
+        top = top[np.argsort(-probs[top, c], kind="stable")]
+        np.save(os.path.join(out_dir, f"by_{name}.npy"), top.astype(np.int32))
+
+    def column(name):
+        if name not in songs_df.columns:
+            return [""] * n
+        return ["" if v is None or v != v else str(v) for v in songs_df[name].tolist()]
+
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "classes": classes,
+            "n_songs": n,
+            "n_clusters": n_clusters,
+            "emotion_pool": pool,
+            "emotion_model_mtime": os.path.getmtime(EMOTION_RECOMMENDER_PATH)
+                                   if os.path.exists(EMOTION_RECOMMENDER_PATH) else None,
+            "titles": column("title"),
+            "filenames": column("filename"),
+            "languages": column("language"),
+        }, f, ensure_ascii=False)
+    print(f"🧭 Hybrid index: {n} songs, {n_clusters} clusters in {time.perf_counter() - start:.1f}s -> {out_dir}")
+
+def build_hybrid_index_from_models(songs_df, X_scaled, out_dir=None):
+    """Build with the emotion forest saved by train_recommender.py, if there is one"""
+    if not (os.path.exists(EMOTION_RECOMMENDER_PATH) and os.path.exists(EMOTION_ENCODER_PATH)):
+        print(f"⚠️ No emotion recommender at {EMOTION_RECOMMENDER_PATH}; hybrid index not built")
+        return False
+    import joblib
+    forest = joblib.load(EMOTION_RECOMMENDER_PATH)
+    encoder = joblib.load(EMOTION_ENCODER_PATH)
+    build_hybrid_index(songs_df, X_scaled, forest, encoder, out_dir)
+    return True
+
+# -------------------------------------------------------------------
+# ⚡ Query (serve time, NumPy only)
+# -------------------------------------------------------------------
+class HybridIndex:
+    def __init__(self, index_dir):
+        def load(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.classes = self.meta["classes"]
+        self.vectors = load("vectors.npy")
+        self.centroids = np.array(load("centroids.npy"))
+        self.offsets = np.array(load("offsets.npy"))
+        self.order = load("order.npy")
+        self.rows_of = load("rows_of.npy")
+        self.probs = load("emotion_probs.npy")
+        self.by_emotion = {c: load(f"by_{c}.npy") for c in self.classes}
+        self.titles = self.meta["titles"]
+        # Exact (case-insensitive) title -> first song index; regex search is the slow fallback
+        self.title_index = {}
+        for i, t in enumerate(self.titles):
+            self.title_index.setdefault(t.lower(), i)
+        if (self.meta.get("emotion_model_mtime") and os.path.exists(EMOTION_RECOMMENDER_PATH)
+                and os.path.getmtime(EMOTION_RECOMMENDER_PATH) > self.meta["emotion_model_mtime"]):
+            print("⚠️ Emotion recommender is newer than the hybrid index; rebuild with recommend.py --build-hybrid")
+
+    def find_song(self, song_title):
+        idx = self.title_index.get(song_title.lower())
+        if idx is not None:
+            return idx
+        pattern = re.compile(song_title, re.IGNORECASE)
+        return next((i for i, t in enumerate(self.titles) if pattern.search(t)), None)
+
+    def emotion_weights(self, emotion):
+        """'happy' or {'happy': 0.7, 'neutral': 0.3} -> weight per class"""
+        mix = emotion if isinstance(emotion, dict) else {emotion: 1.0}
+        unknown = [e for e in mix if e not in self.classes]
+        if unknown:
+            raise ValueError(f"Unknown emotion(s) {unknown}; expected {self.classes}")
+        return np.array([mix.get(c, 0.0) for c in self.classes], dtype=np.float32)
+
+    def seed_candidates(self, seed_row, nprobe):
+        """Rows in the nprobe clusters closest to the seed, with their cosine similarity"""
+        query = np.asarray(self.vectors[seed_row])
+        nprobe = min(nprobe, len(self.centroids))
+        clusters = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in clusters])
+        sims = np.concatenate([self.vectors[self.offsets[c]:self.offsets[c + 1]] for c in clusters]) @ query
+        keep = rows != seed_row
+        return rows[keep], sims[keep]
+
+    def _song(self, idx):
+        return {
+            "title": self.titles[idx],
+            "filename": self.meta["filenames"][idx],
+            "language": self.meta["languages"][idx],
+        }
+
+    def recommend(self, emotion, song_title=None, n_recommendations=5, alpha=None,
+                  nprobe=None, n_candidates=None):
+        """
+        emotion only: top songs by (blended) emotion probability from the presorted lists.
+        emotion + seed: nearest neighbours of the seed, re-ranked by
+            alpha * cosine similarity + (1 - alpha) * emotion probability.
+        """
+        alpha = HYBRID_ALPHA if alpha is None else alpha
+        weights = self.emotion_weights(emotion)
+        engine = {}
+
+        if song_title is None:
+            active = [c for c, w in zip(self.classes, weights) if w > 0]
+            if not active:
+                return {"error": "Emotion weights are all zero"}
+            rows = np.unique(np.concatenate([self.by_emotion[c] for c in active]))
+            emo = np.asarray(self.probs[rows]) @ weights
+            k = min(n_recommendations, len(rows))
+            top = np.argpartition(-emo, k - 1)[:k]
+            top = top[np.argsort(-emo[top], kind="stable")]
+            engine.update(mode="emotion", candidates=int(len(rows)))
+            recs = [{**self._song(int(self.order[rows[i]])),
+                     "emotion_probability": round(float(emo[i]), 4),
+                     "score": round(float(emo[i]), 4)} for i in top]
+            return {"emotion": emotion, "recommendations": recs, "engine": engine}
+
+        song_idx = self.find_song(song_title)
+        if song_idx is None:
+            return {"error": f"No song found with title: '{song_title}'"}
+        seed_row = int(self.rows_of[song_idx])
+        nprobe = nprobe or HYBRID_NPROBE
+        rows, sims = self.seed_candidates(seed_row, nprobe)
+        if len(rows) == 0:
+            return {"error": "Not enough songs in the index"}
+
+        # Nearest neighbours first, then blend with emotion on that short list
+        pool = min(max(n_candidates or HYBRID_CANDIDATES, n_recommendations), len(rows))
+        near = np.argpartition(-sims, pool - 1)[:pool]
+        rows, sims = rows[near], sims[near]
+        emo = np.asarray(self.probs[rows]) @ weights
+        score = alpha * sims + (1 - alpha) * emo
+        k = min(n_recommendations, len(rows))
+        top = np.argpartition(-score, k - 1)[:k]
+        top = top[np.argsort(-score[top], kind="stable")]
+
+        engine.update(mode="seed+emotion", alpha=alpha, clusters_probed=min(nprobe, len(self.centroids)),
+                      candidates=int(pool))
+        recs = [{**self._song(int(self.order[rows[i]])),
+                 "similarity": round(float(sims[i]), 4),
+                 "emotion_probability": round(float(emo[i]), 4),
+                 "score": round(float(score[i]), 4)} for i in top]
+        return {"emotion": emotion, "searched_song": self._song(song_idx),
+                "recommendations": recs, "engine": engine}
+
+_loaded = {"index": None, "dir": None, "mtime": None}
+
+def get_hybrid_index(index_dir=None):
+    """Process-wide HybridIndex, reloaded when meta.json changes"""
+    index_dir = index_dir or HYBRID_INDEX_DIR
+    meta_path = os.path.join(index_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    mtime = os.path.getmtime(meta_path)
+    if _loaded["index"] is None or _loaded["dir"] != index_dir or _loaded["mtime"] != mtime:
+        _loaded.update(index=HybridIndex(index_dir), dir=index_dir, mtime=mtime)
+    return _loaded["index"]
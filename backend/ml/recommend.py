@@ -1,50 +1,97 @@
-import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import NearestNeighbors
-import joblib
 import os
-from pymongo import MongoClient
+import re
 import sys
 import json
+import time
+import hybrid
+import dataset_cache
+from cosine import cosine_topk, normalize_rows
+
+# pandas, sklearn, joblib and pymongo are imported inside the functions that
+# need them: a lookup served from the precomputed artifact imports none of them.
 
 # -------------------------------------------------------------------
 # 📂 Base paths
 # -------------------------------------------------------------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Shared MongoDB layer lives with the API scripts
+sys.path.insert(0, os.path.join(os.path.dirname(BASE_DIR), "script"))
+from cache import TTLCache             # noqa: E402
+from singleflight import SingleFlight  # noqa: E402
 MODEL_PATH = os.path.join(BASE_DIR, "models", "song_recommender.joblib")
+# Lightweight lookup artifact written next to the joblib package at train time:
+# scaled features L2-normalized as float32 (cosine similarity = dot product)
+LOOKUP_FEATURES_PATH = os.path.join(BASE_DIR, "models", "song_recommender.lookup.npy")
+LOOKUP_META_PATH = os.path.join(BASE_DIR, "models", "song_recommender.lookup.json")
+LOOKUP_PARTITIONS_PATH = os.path.join(BASE_DIR, "models", "song_recommender.partitions.npy")
+# Sharded index (one folder per shard, served by shard_worker.py)
+SHARD_DIR = os.path.join(BASE_DIR, "models", "shards")
+RECOMMEND_SHARDS = int(os.environ.get("RECOMMEND_SHARDS", "0"))   # 0/1 = no shards
+SHARD_START_TIMEOUT = float(os.environ.get("SHARD_START_TIMEOUT", "30"))
+# Offline fallback dataset (read through the Parquet cache in dataset_cache.py)
+SONGS_CSV_PATH = os.environ.get("SONGS_CSV", os.path.join(BASE_DIR, "musicDB.audio2.csv"))
+# recommend_songs: identical concurrent queries share one computation (single-flight)
+# and answers are memoized for RECOMMEND_MEMO_TTL seconds (0 disables the memo)
+RECOMMEND_MEMO_TTL = float(os.environ.get("RECOMMEND_MEMO_TTL", "5"))
+RECOMMEND_MEMO_SIZE = int(os.environ.get("RECOMMEND_MEMO_SIZE", "1024"))
+
+FEATURES = [
+    "tempo", "energy", "danceability", "acousticness",
+    "instrumentalness", "liveness", "valence", "beats", "rmse"
+]
+
+# Categorical fields that get a precomputed partition (row list per value) for
+# filtered search; fields with more than MAX_FILTER_VALUES distinct values are skipped.
+FILTER_FIELDS = ["language", "song_emotion", "artist", "album"]
+MAX_FILTER_VALUES = 1024
+
+# Columns training and the lookup artifacts read from the fallback dataset
+DATASET_COLUMNS = ["_id", "title", "filename"] + FEATURES + FILTER_FIELDS
+
+def use_model_dir(model_dir):
+    """Point training and lookups at another models folder (benchmarks, experiments)"""
+    global MODEL_PATH, LOOKUP_FEATURES_PATH, LOOKUP_META_PATH, LOOKUP_PARTITIONS_PATH, SHARD_DIR
+    MODEL_PATH = os.path.join(model_dir, "song_recommender.joblib")
+    LOOKUP_FEATURES_PATH = os.path.join(model_dir, "song_recommender.lookup.npy")
+    LOOKUP_META_PATH = os.path.join(model_dir, "song_recommender.lookup.json")
+    LOOKUP_PARTITIONS_PATH = os.path.join(model_dir, "song_recommender.partitions.npy")
+    SHARD_DIR = os.path.join(model_dir, "shards")
+    hybrid.HYBRID_INDEX_DIR = os.path.join(model_dir, "hybrid_index")
 
 # -------------------------------------------------------------------
-# 🔧 MongoDB Connection (Compass / Local)
+# 🔧 MongoDB Connection (shared pooled client, MONGO_URI from env)
 # -------------------------------------------------------------------
+_mongo_checked = False
+
 def get_mongo_connection():
-    """Connect to MongoDB Compass (local MongoDB server)"""
+    """Process-wide MongoDB client; pinged only the first time"""
+    global _mongo_checked
+    import db
     try:
-        # Local MongoDB Compass connection URI
-        MONGO_URI = "mongodb://localhost:27017"
-
-        # Connect to the local MongoDB instance
-        client = MongoClient(MONGO_URI)
-        client.admin.command("ping")
-        print("✅ Connected to MongoDB Compass successfully!")
+        client = db.get_client()
+        if not _mongo_checked:
+            client.admin.command("ping")
+            _mongo_checked = True
+            print("✅ Connected to MongoDB successfully!")
         return client
     except Exception as e:
-        print(f"❌ MongoDB Compass connection failed: {e}")
+        print(f"❌ MongoDB connection failed: {e}")
         return None
 
 # -------------------------------------------------------------------
 # 🧩 Load Songs from MongoDB
 # -------------------------------------------------------------------
-def load_songs_from_mongodb(db_name="musicDB", collection_name="songs"):
+def load_songs_from_mongodb(db_name=None, collection_name="songs"):
     """Load songs data from MongoDB collection"""
+    import pandas as pd
     client = get_mongo_connection()
     if not client:
         raise Exception("Could not connect to MongoDB")
 
     try:
-        # Use your local database name (change if needed)
-        db = client[db_name]
-        collection = db[collection_name]
+        import db
+        collection = db.get_collection(collection_name, db_name)
 
         cursor = collection.find({})
         songs_df = pd.DataFrame(list(cursor))
@@ -62,28 +109,47 @@ def load_songs_from_mongodb(db_name="musicDB", collection_name="songs"):
     except Exception as e:
         print(f"❌ Error loading data from MongoDB: {e}")
         return None
-    finally:
-        client.close()
 
 # -------------------------------------------------------------------
-# 💾 Train Recommendation Model
+# 📄 Load Songs from the CSV fallback
 # -------------------------------------------------------------------
-def train_recommendation_model(use_mongodb=True):
-    """Train song recommendation model using MongoDB or CSV data"""
+def load_songs_from_csv(path=None):
+    """Fallback dataset, typed (float32 features) and limited to DATASET_COLUMNS"""
+    path = path or SONGS_CSV_PATH
+    songs_df = dataset_cache.load_dataset(path, columns=DATASET_COLUMNS)
+    print(f"✅ Loaded {len(songs_df)} songs from {path}")
+    return songs_df
 
+# -------------------------------------------------------------------
+# 💾 Train Recommendation Model
+# -------------------------------------------------------------------
+def train_recommendation_model(use_mongodb=True, shards=None):
+    """Train song recommendation model using MongoDB or CSV data (optionally split into shards)"""
     if use_mongodb:
         songs_df = load_songs_from_mongodb()
         if songs_df is None or songs_df.empty:
             print("❌ MongoDB empty or failed, using CSV fallback.")
-            songs_df = pd.read_csv("musicDB.audio2.csv")
+            songs_df = load_songs_from_csv()
     else:
-        songs_df = pd.read_csv("musicDB.audio2.csv")
+        songs_df = load_songs_from_csv()
 
-    features = [
-        "tempo", "energy", "danceability", "acousticness",
-        "instrumentalness", "liveness", "valence", "beats", "rmse"
-    ]
+    model_package, X_scaled = build_model_package(songs_df, "mongodb" if use_mongodb else "csv")
+    save_model_package(model_package, X_scaled)
+    shards = RECOMMEND_SHARDS if shards is None else shards
+    if shards > 1:
+        build_shards(songs_df, X_scaled, shards)
 
+    print("✅ Model trained and saved successfully!")
+    print(f"📊 Dataset size: {len(songs_df)} songs")
+    print(f"🎯 Features used: {model_package['features']}")
+    print(f"💾 Source: {'MongoDB' if use_mongodb else 'CSV'}")
+
+def build_model_package(songs_df, data_source):
+    """Fit scaler + neighbour index on a songs DataFrame; returns (package, X_scaled)"""
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.neighbors import NearestNeighbors
+
+    features = list(FEATURES)
     missing_features = [f for f in features if f not in songs_df.columns]
     if missing_features:
         print(f"⚠️ Missing features: {missing_features}")
@@ -103,27 +169,302 @@ def train_recommendation_model(use_mongodb=True):
         "nn": nn,
         "songs_df": songs_df,
         "features": features,
-        "data_source": "mongodb" if use_mongodb else "csv"
+        "filters": build_filter_partitions(songs_df),
+        "data_source": data_source
     }
+    return model_package, X_scaled
 
+# -------------------------------------------------------------------
+# 🗂️ Metadata partitions for filtered search
+# -------------------------------------------------------------------
+def filter_key(value):
+    """Filter values match case- and whitespace-insensitively"""
+    return str(value).strip().lower()
+
+def build_filter_partitions(songs_df):
+    """{field: {value: sorted int32 row indices}} for each categorical FILTER_FIELDS column"""
+    partitions = {}
+    for field in FILTER_FIELDS:
+        if field not in songs_df.columns:
+            continue
+        keys = songs_df[field].fillna("").map(filter_key).to_numpy()
+        values, codes = np.unique(keys, return_inverse=True)
+        if len(values) > MAX_FILTER_VALUES:
+            print(f"⚠️ '{field}' has {len(values)} values; not indexed for filtering")
+            continue
+        order = np.argsort(codes, kind="stable").astype(np.int32)
+        bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+        partitions[field] = {str(v): order[bounds[i]:bounds[i + 1]] for i, v in enumerate(values)}
+    return partitions
+
+def select_partition_rows(partitions, filters):
+    """
+    Sorted rows matching every field of `filters` ({"language": "nepali"} or
+    {"language": ["nepali", "hindi"]}); None when there is nothing to filter.
+    """
+    if not filters:
+        return None
+    rows = None
+    for field, wanted in filters.items():
+        if field not in partitions:
+            raise ValueError(f"Cannot filter on '{field}'; indexed fields: {sorted(partitions)}")
+        wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+        parts = [partitions[field][filter_key(v)] for v in wanted if filter_key(v) in partitions[field]]
+        field_rows = np.unique(np.concatenate(parts)) if len(parts) > 1 else \
+            (parts[0] if parts else np.empty(0, dtype=np.int32))
+        rows = field_rows if rows is None else np.intersect1d(rows, field_rows, assume_unique=True)
+    return rows
+
+def save_model_package(model_package, X_scaled, build_hybrid=True):
+    import joblib
     os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
     joblib.dump(model_package, MODEL_PATH)
+    export_lookup_artifact(model_package["songs_df"], X_scaled, model_package.get("filters"))
+    if build_hybrid:
+        hybrid.build_hybrid_index_from_models(model_package["songs_df"], X_scaled)
 
-    print("✅ Model trained and saved successfully!")
-    print(f"📊 Dataset size: {len(songs_df)} songs")
-    print(f"🎯 Features used: {features}")
-    print(f"💾 Source: {'MongoDB' if use_mongodb else 'CSV'}")
+# -------------------------------------------------------------------
+# ⚡ Precomputed lookup artifact (NumPy + JSON only)
+# -------------------------------------------------------------------
+def _json_value(value, default=""):
+    """Plain JSON type for a DataFrame cell (NaN -> default)"""
+    if value is None or (isinstance(value, float) and value != value):
+        return default
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+LOOKUP_FORMAT = "unit-float32"
+
+def export_lookup_artifact(songs_df, X_scaled, partitions=None):
+    """Unit-length scaled feature matrix + song metadata, loadable without pandas/sklearn"""
+    def column(name, default=""):
+        if name not in songs_df.columns:
+            return [default] * len(songs_df)
+        return [_json_value(v, default) for v in songs_df[name].tolist()]
+
+    titles = None
+    if "title" in songs_df.columns:
+        titles = [None if t is None else str(t) for t in column("title", None)]
+
+    # Partitions: one row permutation per field, grouped by value (offsets in the meta file)
+    partitions = partitions if partitions is not None else build_filter_partitions(songs_df)
+    filters = {}
+    blocks = []
+    base = 0
+    for field, by_value in partitions.items():
+        offsets = {}
+        for value, value_rows in by_value.items():
+            offsets[value] = [base, base + len(value_rows)]
+            blocks.append(np.asarray(value_rows, dtype=np.int32))
+            base += len(value_rows)
+        filters[field] = offsets
+    np.save(LOOKUP_PARTITIONS_PATH, np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int32))
+
+    np.save(LOOKUP_FEATURES_PATH, normalize_rows(X_scaled))
+    with open(LOOKUP_META_PATH, "w", encoding="utf-8") as f:
+        json.dump({
+            "format": LOOKUP_FORMAT,
+            "titles": titles,
+            "filenames": column("filename"),
+            "languages": column("language"),
+            "filters": filters,
+        }, f, ensure_ascii=False)
+    print(f"⚡ Lookup artifact saved: {LOOKUP_FEATURES_PATH}")
+
+def lookup_artifact_is_fresh():
+    return (
+        os.path.exists(LOOKUP_FEATURES_PATH)
+        and os.path.exists(LOOKUP_META_PATH)
+        and (not os.path.exists(MODEL_PATH)
+             or os.path.getmtime(LOOKUP_META_PATH) >= os.path.getmtime(MODEL_PATH))
+    )
+
+_lookup = {"key": None, "meta": None, "X": None, "partitions": None}
+
+def load_lookup():
+    """
+    (meta, unit float32 matrix), kept in memory until the artifact is rewritten.
+    Artifacts from before LOOKUP_FORMAT are normalized on load.
+    """
+    key = (LOOKUP_META_PATH, os.path.getmtime(LOOKUP_META_PATH))
+    if _lookup["key"] != key:
+        with open(LOOKUP_META_PATH, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        X = np.load(LOOKUP_FEATURES_PATH, mmap_mode="r")
+        if meta.get("format") != LOOKUP_FORMAT:
+            X = normalize_rows(X)
+        partitions = {}
+        if meta.get("filters") and os.path.exists(LOOKUP_PARTITIONS_PATH):
+            rows = np.load(LOOKUP_PARTITIONS_PATH, mmap_mode="r")
+            partitions = {
+                field: {value: rows[start:end] for value, (start, end) in offsets.items()}
+                for field, offsets in meta["filters"].items()
+            }
+        _lookup.update(key=key, meta=meta, X=X, partitions=partitions)
+    return _lookup["meta"], _lookup["X"]
+
+def lookup_partitions():
+    return _lookup["partitions"]
+
+def find_title(titles, song_title):
+    """pandas str.contains(case=False) semantics: regex search, missing titles never match"""
+    pattern = re.compile(song_title, re.IGNORECASE)
+    return next((i for i, t in enumerate(titles) if t is not None and pattern.search(t)), None)
+
+def _lookup_song(meta, i):
+    return {
+        "title": meta["titles"][i],
+        "filename": meta["filenames"][i],
+        "language": meta["languages"][i]
+    }
+
+def recommend_from_lookup(song_title, n_recommendations=5, filters=None):
+    """Same answers as the joblib path using only NumPy (exact cosine, see cosine.py)"""
+    return recommend_batch_from_lookup([song_title], n_recommendations, filters)[0]
+
+def recommend_batch_from_lookup(song_titles, n_recommendations=5, filters=None):
+    """One result dict per title; all found titles share a single blocked search"""
+    meta, X = load_lookup()
+    titles = meta["titles"]
+    if titles is None:
+        return [{"error": "The dataset has no 'title' column."} for _ in song_titles]
+    rows = select_partition_rows(lookup_partitions(), filters)
+
+    results = [None] * len(song_titles)
+    found = []
+    for q, title in enumerate(song_titles):
+        song_idx = find_title(titles, title)
+        if song_idx is None:
+            results[q] = {"error": f"No song found with title: '{title}'"}
+        else:
+            found.append((q, song_idx))
+    if not found:
+        return results
+
+    # n + 5 neighbours like the NearestNeighbors path, the song itself filtered out.
+    # With filters only the matching partition is searched.
+    seeds = [song_idx for _, song_idx in found]
+    if rows is None:
+        nearest, sims = cosine_topk(X, np.asarray(X[seeds]), n_recommendations + 5)
+    else:
+        rows = np.asarray(rows)
+        nearest, sims = cosine_topk(np.asarray(X[rows]), np.asarray(X[seeds]), n_recommendations + 1)
+        nearest = rows[nearest]
+    for (q, song_idx), idx_row, sim_row in zip(found, nearest, sims):
+        recs = [
+            {**_lookup_song(meta, int(i)), "similarity": float(s)}
+            for i, s in zip(idx_row, sim_row) if i != song_idx
+        ]
+        results[q] = {"searched_song": _lookup_song(meta, song_idx), "recommendations": recs[:n_recommendations]}
+    return results
+
+# -------------------------------------------------------------------
+# 📦 joblib package (fallback when the lookup artifact is missing or stale)
+# -------------------------------------------------------------------
+_package = {"key": None, "package": None, "unit": None}
+
+def load_model_package():
+    """The joblib package, kept in memory until it is rewritten"""
+    key = (MODEL_PATH, os.path.getmtime(MODEL_PATH))
+    if _package["key"] != key:
+        import joblib
+        _package.update(key=key, package=joblib.load(MODEL_PATH), unit=None)
+    return _package["package"]
+
+def package_unit_matrix():
+    """Unit rows of the loaded package's scaled features, computed once per package"""
+    if _package["unit"] is None:
+        import pandas as pd
+        model_package = _package["package"]
+        songs_df, features = model_package["songs_df"], model_package["features"]
+        X = songs_df[features].fillna(songs_df[features].mean())
+        _package["unit"] = normalize_rows(model_package["scaler"].transform(pd.DataFrame(X, columns=features)))
+    return _package["unit"]
+
+# -------------------------------------------------------------------
+# 🤝 Coalescing + memo in front of recommend_songs
+# -------------------------------------------------------------------
+_recommend_memo = TTLCache("recommend_songs", RECOMMEND_MEMO_SIZE, RECOMMEND_MEMO_TTL)
+_recommend_flight = SingleFlight("recommend_songs")
+
+def _artifact_version():
+    """Changes whenever the model or lookup artifact is rewritten (or the models folder moves)"""
+    path = LOOKUP_META_PATH if os.path.exists(LOOKUP_META_PATH) else MODEL_PATH
+    try:
+        return path, os.stat(path).st_mtime_ns
+    except OSError:
+        return path, None
+
+def recommend_query_key(song_title, n_recommendations=5, filters=None):
+    """
+    Queries with the same key get the same answer. Titles are regex patterns
+    matched case-insensitively, so they are lowercased unless they contain an
+    escape (where case matters, e.g. \\S vs \\s).
+    """
+    title = song_title if "\\" in song_title else song_title.lower()
+    filter_items = ()
+    if filters:
+        filter_items = tuple(sorted(
+            (field, tuple(sorted({filter_key(v) for v in ([wanted] if isinstance(wanted, str) else wanted)})))
+            for field, wanted in filters.items()
+        ))
+    return title, int(n_recommendations), filter_items, _artifact_version()
+
+def recommend_stats():
+    """
+    Memo hits, single-flight leaders/followers and the share of requests that did
+    not compute (also exported as cache_requests_total / singleflight_calls_total)
+    """
+    memo, flight = _recommend_memo.stats(), _recommend_flight.stats()
+    total = memo["hits"] + flight["leaders"] + flight["followers"]
+    return {
+        "requests": total,
+        "memo_hits": memo["hits"],
+        "computed": flight["leaders"],
+        "coalesced": flight["followers"],
+        "coalesced_ratio": round(flight["followers"] / total, 4) if total else 0.0,
+        "served_without_compute_ratio": round(1 - flight["leaders"] / total, 4) if total else 0.0,
+        "memo": memo,
+        "single_flight": flight,
+    }
 
 # -------------------------------------------------------------------
 # 🎧 Recommend Songs
 # -------------------------------------------------------------------
-def recommend_songs(song_title, n_recommendations=5):
-    """Recommend similar songs based on title"""
+def recommend_songs(song_title, n_recommendations=5, filters=None):
+    """
+    Recommend similar songs based on title.
+    filters: optional {"language": "nepali", "artist": [...]} restricting the results
+    The returned dict may be shared with concurrent callers: treat it as read-only.
+    """
+    key = recommend_query_key(song_title, n_recommendations, filters)
+    if RECOMMEND_MEMO_TTL > 0:
+        result = _recommend_memo.get(key)
+        if result is not None:
+            return result
+
+    def compute():
+        result = _recommend_songs(song_title, n_recommendations, filters)
+        # Memoized before the flight ends, so no request slips between the two
+        if RECOMMEND_MEMO_TTL > 0 and "error" not in result:
+            _recommend_memo.put(key, result)
+        return result
+
+    result, _ = _recommend_flight.do(key, compute)
+    return result
+
+def _recommend_songs(song_title, n_recommendations=5, filters=None):
     try:
+        if lookup_artifact_is_fresh():
+            return recommend_from_lookup(song_title, n_recommendations, filters)
+
+        import pandas as pd
+
         if not os.path.exists(MODEL_PATH):
             return {"error": f"Model not found at {MODEL_PATH}. Please train it first."}
 
-        model_package = joblib.load(MODEL_PATH)
+        model_package = load_model_package()
         scaler = model_package["scaler"]
         nn = model_package["nn"]
         songs_df = model_package["songs_df"]
@@ -142,9 +483,22 @@ def recommend_songs(song_title, n_recommendations=5):
         song_features_df = pd.DataFrame(song_features, columns=features)
         song_scaled = scaler.transform(song_features_df)
 
-        distances, indices = nn.kneighbors(song_scaled, n_neighbors=n_recommendations + 5)
-        similar_indices = indices[0]
-        similar_distances = distances[0]
+        if filters:
+            # Exact search over the matching partition only
+            partitions = model_package.get("filters") or build_filter_partitions(songs_df)
+            rows = select_partition_rows(partitions, filters)
+            if len(rows) == 0:
+                # Nothing matches the filter: empty list, like the lookup path
+                similar_indices, similar_distances = rows, np.empty(0)
+            else:
+                # Rows of the package's unit matrix, like recommend_batch_from_lookup
+                unit = package_unit_matrix()
+                nearest, sims = cosine_topk(unit[rows], song_scaled[0], n_recommendations + 1)
+                similar_indices, similar_distances = rows[nearest], 1 - sims
+        else:
+            distances, indices = nn.kneighbors(song_scaled, n_neighbors=n_recommendations + 5)
+            similar_indices = indices[0]
+            similar_distances = distances[0]
 
         base_song = {
             "title": songs_df.loc[song_idx, "title"],
@@ -171,13 +525,254 @@ def recommend_songs(song_title, n_recommendations=5):
     except Exception as e:
         return {"error": str(e)}
 
+def recommend_songs_batch(song_titles, n_recommendations=5, filters=None):
+    """recommend_songs for several titles; one batched search when the lookup artifact is fresh"""
+    try:
+        if lookup_artifact_is_fresh():
+            return recommend_batch_from_lookup(song_titles, n_recommendations, filters)
+    except Exception as e:
+        return [{"error": str(e)} for _ in song_titles]
+    return [recommend_songs(title, n_recommendations, filters) for title in song_titles]
+
+# -------------------------------------------------------------------
+# 🧭 Hybrid emotion + similarity
+# -------------------------------------------------------------------
+def recommend_hybrid(emotion, song_title=None, n_recommendations=5, alpha=None):
+    """
+    Songs for a detected song emotion ('happy' or a {'happy': 0.7, ...} mix), optionally
+    close to a seed song; served from the precomputed hybrid index (see hybrid.py)
+    """
+    try:
+        index = hybrid.get_hybrid_index()
+        if index is None:
+            return {"error": f"Hybrid index not found at {hybrid.HYBRID_INDEX_DIR}. Please train it first."}
+        return index.recommend(emotion, song_title, n_recommendations, alpha)
+    except Exception as e:
+        return {"error": str(e)}
+
+# -------------------------------------------------------------------
+# 🧩 Sharded index: scatter-gather over shard worker processes
+# -------------------------------------------------------------------
+def build_shards(songs_df, X_scaled, n_shards, shard_dir=None):
+    """Split the catalog into contiguous shards, each with its own unit matrix and metadata"""
+    import shutil
+    shard_dir = shard_dir or SHARD_DIR
+    if os.path.isdir(shard_dir):
+        shutil.rmtree(shard_dir)
+    os.makedirs(shard_dir)
+
+    def column(name, rows, default=""):
+        if name not in songs_df.columns:
+            return [default] * len(rows)
+        return [_json_value(v, default) for v in songs_df[name].iloc[rows].tolist()]
+
+    unit = normalize_rows(X_scaled)
+    bounds = np.linspace(0, len(unit), n_shards + 1).astype(int)
+    for i in range(n_shards):
+        rows = np.arange(bounds[i], bounds[i + 1])
+        path = os.path.join(shard_dir, f"shard-{i:03d}")
+        os.makedirs(path)
+        np.save(os.path.join(path, "unit.npy"), unit[rows])
+        np.save(os.path.join(path, "ids.npy"), rows.astype(np.int64))
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            titles = [None if t is None else str(t) for t in column("title", rows, None)]
+            json.dump({
+                "shard": i,
+                "titles": titles,
+                "filenames": column("filename", rows),
+                "languages": column("language", rows),
+            }, f, ensure_ascii=False)
+    with open(os.path.join(shard_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"n_shards": n_shards, "n_songs": len(unit), "bounds": bounds.tolist()}, f)
+    print(f"🧩 {n_shards} shards saved: {shard_dir}")
+
+class ShardUnavailable(ConnectionError):
+    """A shard worker could not be reached, or its connection dropped mid-request"""
+
+class ShardCoordinator:
+    """
+    Fans queries out to shard workers and merges their top-k lists.
+    start_local() runs one worker process per shard on this machine (unix sockets);
+    the constructor connects to workers that are already running anywhere.
+    """
+
+    def __init__(self, addresses, authkey, processes=(), socket_dir=None):
+        from multiprocessing.connection import Client
+        from concurrent.futures import ThreadPoolExecutor
+        import threading
+        import shard_worker
+
+        self.processes = list(processes)
+        self.socket_dir = socket_dir
+        self.connections = []
+        deadline = time.monotonic() + SHARD_START_TIMEOUT
+        for address in addresses:
+            while True:
+                try:
+                    self.connections.append(Client(shard_worker.parse_address(address), authkey=authkey))
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.monotonic() > deadline or any(p.poll() is not None for p in self.processes):
+                        self.close()
+                        raise ShardUnavailable(f"Shard worker at {address} did not start")
+                    time.sleep(0.05)
+        self.locks = [threading.Lock() for _ in self.connections]
+        self.pool = ThreadPoolExecutor(max_workers=len(self.connections), thread_name_prefix="shard")
+
+    @classmethod
+    def start_local(cls, shard_dir=None):
+        import subprocess
+        import secrets
+        import tempfile
+        shard_dir = shard_dir or SHARD_DIR
+        with open(os.path.join(shard_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        authkey = secrets.token_hex(16)
+        socket_dir = tempfile.mkdtemp(prefix="shards-")
+        env = {**os.environ, "SHARD_AUTHKEY": authkey}
+        addresses, processes = [], []
+        for i in range(manifest["n_shards"]):
+            address = os.path.join(socket_dir, f"shard-{i:03d}.sock")
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(BASE_DIR, "shard_worker.py"),
+                 "--shard-dir", os.path.join(shard_dir, f"shard-{i:03d}"), "--address", address],
+                cwd=BASE_DIR, env=env,
+            ))
+            addresses.append(address)
+        return cls(addresses, authkey.encode(), processes, socket_dir)
+
+    def _call(self, i, request):
+        try:
+            with self.locks[i]:
+                self.connections[i].send(request)
+                status, value = self.connections[i].recv()
+        except (EOFError, OSError) as e:   # worker died or the socket dropped
+            raise ShardUnavailable(f"Shard {i}: connection lost ({e!r})") from e
+        if status != "ok":
+            raise RuntimeError(f"Shard {i}: {value}")
+        return value
+
+    def scatter(self, request):
+        """Same request to every shard in parallel; answers in shard order"""
+        return list(self.pool.map(lambda i: self._call(i, request), range(len(self.connections))))
+
+    def find(self, song_title):
+        """(global_index, unit_vector, song) of the first matching title across shards"""
+        hits = [h for h in self.scatter(("find", song_title)) if h is not None]
+        return min(hits, key=lambda h: h[0]) if hits else None
+
+    def search(self, queries, k, skip=()):
+        """Merged top k per query: [(global_index, similarity, song), ...]"""
+        per_shard = self.scatter(("search", np.atleast_2d(queries), k, list(skip)))
+        merged = []
+        for q in range(len(per_shard[0])):
+            hits = [hit for shard in per_shard for hit in shard[q]]
+            hits.sort(key=lambda h: (-h[1], h[0]))  # same tie order as a single index
+            merged.append(hits[:k])
+        return merged
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+        for p in self.processes:
+            p.terminate()
+        for p in self.processes:
+            p.wait()
+        if self.socket_dir:
+            import shutil
+            shutil.rmtree(self.socket_dir, ignore_errors=True)
+        self.connections, self.processes = [], []
+
+_coordinator = None
+_coordinator_atexit = False
+
+def get_coordinator():
+    """SHARD_ADDRESSES (comma separated, SHARD_AUTHKEY) or local workers over SHARD_DIR"""
+    global _coordinator, _coordinator_atexit
+    if _coordinator is None:
+        import atexit
+        addresses = os.environ.get("SHARD_ADDRESSES")
+        if addresses:
+            _coordinator = ShardCoordinator(addresses.split(","), os.environ["SHARD_AUTHKEY"].encode())
+        else:
+            _coordinator = ShardCoordinator.start_local()
+        if not _coordinator_atexit:
+            atexit.register(drop_coordinator)
+            _coordinator_atexit = True
+    return _coordinator
+
+def drop_coordinator():
+    """Close the cached coordinator (and its local workers); the next call reconnects"""
+    global _coordinator
+    coordinator, _coordinator = _coordinator, None
+    if coordinator is not None:
+        coordinator.close()
+
+def _sharded_query(song_title, n_recommendations):
+    coordinator = get_coordinator()
+    found = coordinator.find(song_title)
+    if found is None:
+        return {"error": f"No song found with title: '{song_title}'"}
+    song_idx, vector, base_song = found
+    hits = coordinator.search(vector, n_recommendations, skip=[song_idx])[0]
+    recs = [{**song, "similarity": sim} for _, sim, song in hits]
+    return {"searched_song": base_song, "recommendations": recs}
+
+def recommend_songs_sharded(song_title, n_recommendations=5):
+    """
+    recommend_songs answered by the shard workers (same results as the single index).
+    A lost worker drops the coordinator and the query is retried once on a fresh
+    one; if the shards are still unreachable it is answered by the local search.
+    """
+    try:
+        for attempt in range(2):
+            try:
+                return _sharded_query(song_title, n_recommendations)
+            except ShardUnavailable as e:
+                print(f"⚠️ {e}; reconnecting to the shard workers")
+                drop_coordinator()
+        print("⚠️ Shard workers unreachable, answering from the local index")
+        return _recommend_songs(song_title, n_recommendations)
+    except Exception as e:
+        return {"error": str(e)}
+
 # -------------------------------------------------------------------
 # 🧪 Test Mode
 # -------------------------------------------------------------------
+def load_scaled_package():
+    """Existing joblib package and its scaled feature matrix (no retraining)"""
+    import pandas as pd
+    import joblib
+    model_package = joblib.load(MODEL_PATH)
+    songs_df = model_package["songs_df"]
+    features = model_package["features"]
+    X = songs_df[features].fillna(songs_df[features].mean())
+    return model_package, model_package["scaler"].transform(pd.DataFrame(X, columns=features))
+
+def export_lookup_from_model():
+    """Build the lookup artifact from an existing joblib package (no retraining)"""
+    model_package, X_scaled = load_scaled_package()
+    export_lookup_artifact(model_package["songs_df"], X_scaled)
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == "--export-lookup":
+        export_lookup_from_model()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--build-hybrid":
+        model_package, X_scaled = load_scaled_package()
+        hybrid.build_hybrid_index_from_models(model_package["songs_df"], X_scaled)
+    elif len(sys.argv) > 2 and sys.argv[1] == "--build-shards":
+        model_package, X_scaled = load_scaled_package()
+        build_shards(model_package["songs_df"], X_scaled, int(sys.argv[2]))
+    elif len(sys.argv) > 2 and sys.argv[1] == "--sharded":
+        print(json.dumps(recommend_songs_sharded(sys.argv[2], n_recommendations=5), indent=2))
+    elif len(sys.argv) > 2 and sys.argv[1] == "--hybrid":
+        seed = sys.argv[3] if len(sys.argv) > 3 else None
+        print(json.dumps(recommend_hybrid(sys.argv[2], seed, n_recommendations=5), indent=2))
+    elif len(sys.argv) > 1:
+        # python recommend.py "Bholi" language=nepali
         song_name = sys.argv[1]
-        result = recommend_songs(song_name, n_recommendations=5)
+        filters = dict(arg.split("=", 1) for arg in sys.argv[2:] if "=" in arg)
+        result = recommend_songs(song_name, n_recommendations=5, filters=filters or None)
         print(json.dumps(result, indent=2))
     else:
         print("🧪 Testing MongoDB Compass + Training Model...")
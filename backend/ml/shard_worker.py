@@ -0,0 +1,110 @@
+import numpy as np
+import os
+import re
+import sys
+import json
+import argparse
+import threading
+from multiprocessing.connection import Listener, AuthenticationError
+
+# Shard worker for the sharded similarity index
+# Serves one shard directory written by recommend.build_shards() over a local
+# socket (multiprocessing.connection: length-prefixed pickles, HMAC handshake with
+# SHARD_AUTHKEY). The coordinator in recommend.py scatters requests to every
+# worker and merges the answers.
+#
+#   SHARD_AUTHKEY=... python shard_worker.py --shard-dir models/shards/shard-000 --address /tmp/shard-0.sock
+#
+# Requests are tuples:
+#   ("ping",)                    -> {"shard": i, "songs": n}
+#   ("find", title)              -> (global_index, unit_vector, song) of the first regex match, or None
+#   ("search", queries, k, skip) -> per query: [(global_index, similarity, song), ...] best first
+
+from cosine import cosine_topk
+
+class Shard:
+    def __init__(self, shard_dir):
+        with open(os.path.join(shard_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(shard_dir, "unit.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(shard_dir, "ids.npy"))
+        self.titles = self.meta["titles"]
+
+    def song(self, local):
+        return {
+            "title": self.titles[local],
+            "filename": self.meta["filenames"][local],
+            "language": self.meta["languages"][local],
+        }
+
+    def find(self, song_title):
+        pattern = re.compile(song_title, re.IGNORECASE)
+        local = next((i for i, t in enumerate(self.titles) if t is not None and pattern.search(t)), None)
+        if local is None:
+            return None
+        return int(self.ids[local]), np.asarray(self.vectors[local]), self.song(local)
+
+    def search(self, queries, k, skip=()):
+        """Top k (+ len(skip), so skipped seeds never shrink the answer) per query"""
+        skip = set(skip)
+        nearest, sims = cosine_topk(self.vectors, queries, k + len(skip))
+        results = []
+        for idx_row, sim_row in zip(nearest, sims):
+            hits = [(int(self.ids[i]), float(s), self.song(int(i)))
+                    for i, s in zip(idx_row, sim_row) if int(self.ids[i]) not in skip]
+            results.append(hits[:k])
+        return results
+
+    def handle(self, request):
+        op = request[0]
+        if op == "ping":
+            return {"shard": self.meta["shard"], "songs": len(self.ids)}
+        if op == "find":
+            return self.find(request[1])
+        if op == "search":
+            return self.search(*request[1:])
+        raise ValueError(f"Unknown request {op!r}")
+
+def parse_address(address):
+    """'/path/to.sock' (AF_UNIX) or 'host:port' (TCP)"""
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return (host, int(port))
+    return address
+
+def serve_connection(shard, conn):
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                conn.send(("ok", shard.handle(request)))
+            except Exception as e:
+                conn.send(("error", str(e)))
+
+def serve(shard_dir, address, authkey):
+    shard = Shard(shard_dir)
+    address = parse_address(address)
+    if isinstance(address, str) and os.path.exists(address):
+        os.remove(address)
+    with Listener(address, authkey=authkey) as listener:
+        print(f"🧩 Shard {shard.meta['shard']} ({len(shard.ids)} songs) listening on {listener.address}", flush=True)
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, AuthenticationError) as e:
+                print(f"⚠️ Rejected connection: {e}", flush=True)
+                continue
+            threading.Thread(target=serve_connection, args=(shard, conn), daemon=True).start()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve one similarity-index shard")
+    parser.add_argument("--shard-dir", required=True)
+    parser.add_argument("--address", required=True, help="unix socket path or host:port")
+    args = parser.parse_args()
+    authkey = os.environ.get("SHARD_AUTHKEY")
+    if not authkey:
+        sys.exit("❌ SHARD_AUTHKEY is not set")
+    serve(args.shard_dir, args.address, authkey.encode())
@@ -0,0 +1,153 @@
+# Admission control for expensive endpoints
+# A bounded number of requests run the full pipeline; a few more may wait for a
+# slot up to a queue deadline. Past that a request is offered the degraded path
+# (bounded too), and beyond both limits it is shed so the caller can answer with
+# a fast 503 + Retry-After instead of queueing inside the server.
+
+import threading
+import time
+from contextlib import contextmanager
+from metrics import REGISTRY
+
+ADMISSION_DECISIONS = REGISTRY.counter(
+    "admission_decisions_total", "Admission outcomes by endpoint",
+    ("endpoint", "decision", "reason")
+)
+ADMISSION_QUEUE_SECONDS = REGISTRY.histogram(
+    "admission_queue_seconds", "Time spent waiting for a full-pipeline slot", ("endpoint", "decision")
+)
+ADMISSION_GAUGES = {
+    state: REGISTRY.gauge(f"admission_{state}", f"Requests currently {state.replace('_', ' ')}", ("endpoint",))
+    for state in ("in_flight", "queued", "degraded_in_flight")
+}
+
+FULL = "full"
+DEGRADED = "degraded"
+SHED = "shed"
+
+
+class Admission:
+    """One request's admission; unpacks as (decision, reason)"""
+    __slots__ = ("decision", "reason", "waited", "shed_reason")
+
+    def __init__(self, decision, reason, waited=None):
+        self.decision = decision
+        self.reason = reason
+        self.waited = waited
+        self.shed_reason = None   # set by AdmissionController.shed() on the degraded path
+
+    def __iter__(self):
+        return iter((self.decision, self.reason))
+
+
+class AdmissionController:
+    """
+    FULL and SHED are counted when acquire() decides them. A DEGRADED request may
+    still be shed by its handler (no emotion source, no song pool), so it is
+    counted once at release(), as degraded or as shed.
+    """
+
+    def __init__(self, name, max_in_flight, max_queued, queue_timeout, max_degraded):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.max_degraded = max_degraded
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.degraded_in_flight = 0
+        self.counts = {FULL: 0, DEGRADED: 0, SHED: 0}
+        self._publish()
+
+    def _publish(self):
+        """Copy the slot counters into the admission_*{endpoint=...} gauges (called under _cond)"""
+        for state, gauge in ADMISSION_GAUGES.items():
+            gauge.set(getattr(self, state), endpoint=self.name)
+
+    def _record(self, decision, reason, waited):
+        self.counts[decision] += 1
+        ADMISSION_DECISIONS.inc(endpoint=self.name, decision=decision, reason=reason)
+        if waited is not None:
+            ADMISSION_QUEUE_SECONDS.observe(waited, endpoint=self.name, decision=decision)
+
+    def _decide(self, decision, reason, waited):
+        if decision != DEGRADED:
+            self._record(decision, reason, waited)
+        self._publish()
+        return Admission(decision, reason, waited)
+
+    def _degrade_or_shed(self, reason, waited):
+        if self.degraded_in_flight < self.max_degraded:
+            self.degraded_in_flight += 1
+            return self._decide(DEGRADED, reason, waited)
+        return self._decide(SHED, "degraded_full", waited)
+
+    def acquire(self):
+        """Admission (unpacks as decision, reason); FULL / DEGRADED ones must be passed to release()"""
+        with self._cond:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return self._decide(FULL, "free_slot", None)
+            if self.queued >= self.max_queued:
+                return self._degrade_or_shed("queue_full", None)
+
+            self.queued += 1
+            self._publish()
+            start = time.monotonic()
+            deadline = start + self.queue_timeout
+            try:
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return self._degrade_or_shed("queue_timeout", time.monotonic() - start)
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+                return self._decide(FULL, "queued", time.monotonic() - start)
+            finally:
+                self.queued -= 1
+                self._publish()
+
+    def shed(self, admission, reason):
+        """A DEGRADED request that could not be served after all: free its slot now, count it as shed"""
+        with self._cond:
+            if admission.decision != DEGRADED or admission.shed_reason is not None:
+                return
+            admission.shed_reason = reason
+            self.degraded_in_flight -= 1
+            self._publish()
+
+    def release(self, admission):
+        with self._cond:
+            if admission.decision == FULL:
+                self.in_flight -= 1
+                self._cond.notify()
+            elif admission.decision == DEGRADED:
+                if admission.shed_reason is None:
+                    self.degraded_in_flight -= 1
+                    self._record(DEGRADED, admission.reason, admission.waited)
+                else:
+                    self._record(SHED, admission.shed_reason, admission.waited)
+            self._publish()
+
+    @contextmanager
+    def slot(self):
+        """with controller.slot() as admission: decision, reason = admission"""
+        admission = self.acquire()
+        try:
+            yield admission
+        finally:
+            self.release(admission)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "degraded_in_flight": self.degraded_in_flight,
+                "max_in_flight": self.max_in_flight,
+                "max_queued": self.max_queued,
+                "queue_timeout_seconds": self.queue_timeout,
+                "max_degraded": self.max_degraded,
+                "decisions": dict(self.counts),
+            }
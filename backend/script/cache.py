@@ -0,0 +1,110 @@
+# Bounded LRU cache with per-entry TTL
+# Thread-safe; hit/miss/eviction counts are exported through the metrics registry.
+
+import threading
+import time
+from collections import OrderedDict
+from metrics import REGISTRY
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "Cache lookups by cache and result", ("cache", "result")
+)
+CACHE_EVICTIONS = REGISTRY.counter(
+    "cache_evictions_total", "Entries dropped for size, TTL or invalidation", ("cache", "reason")
+)
+
+
+class TTLCache:
+    def __init__(self, name, max_entries=128, ttl_seconds=60.0):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _hit(self):
+        self.hits += 1
+        CACHE_REQUESTS.inc(cache=self.name, result="hit")
+
+    def _miss(self):
+        self.misses += 1
+        CACHE_REQUESTS.inc(cache=self.name, result="miss")
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._miss()
+                return None
+            expires_at, value = entry
+            if expires_at < now:
+                del self._entries[key]
+                CACHE_EVICTIONS.inc(cache=self.name, reason="ttl")
+                self._miss()
+                return None
+            self._entries.move_to_end(key)
+            self._hit()
+            return value
+
+    def get_nearest(self, key, distance, max_distance):
+        """Closest live entry with distance(key, k) <= max_distance (linear scan, for small caches)"""
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_dist = None, None
+            for k, (expires_at, _) in self._entries.items():
+                if expires_at < now:
+                    continue
+                d = distance(key, k)
+                if d <= max_distance and (best_dist is None or d < best_dist):
+                    best_key, best_dist = k, d
+                    if d == 0:
+                        break
+            if best_key is None:
+                self._miss()
+                return None, None
+            self._entries.move_to_end(best_key)
+            self._hit()
+            return self._entries[best_key][1], best_dist
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.inc(cache=self.name, reason="size")
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or only those whose key matches `predicate`"""
+        with self._lock:
+            if predicate is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [k for k in self._entries if predicate(k)]
+                for k in stale:
+                    del self._entries[k]
+                dropped = len(stale)
+        if dropped:
+            CACHE_EVICTIONS.inc(dropped, cache=self.name, reason="invalidate")
+        return dropped
+
+    def items(self):
+        """Live (key, value) pairs, most recently used last"""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (exp, v) in self._entries.items() if exp >= now]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,205 @@
+# Shared MongoDB access for the Python backends
+# One long-lived, pooled MongoClient per process, configured from the environment:
+#
+#   MONGO_URI                          mongodb://localhost:27017/
+#   MONGO_DB                           musicDB
+#   MONGO_MAX_POOL_SIZE                50
+#   MONGO_MIN_POOL_SIZE                0
+#   MONGO_CONNECT_TIMEOUT_MS           5000
+#   MONGO_SERVER_SELECTION_TIMEOUT_MS  5000
+#   MONGO_SOCKET_TIMEOUT_MS            (unset = no timeout)
+#   MONGO_READ_PREFERENCE              primary | primaryPreferred | secondary | secondaryPreferred | nearest
+#
+# pymongo is imported on first use so importing this module stays cheap.
+
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+SONGS_COLLECTION = "songs"
+
+# Fields each caller actually reads
+SCAN_PROJECTION = {
+    "title": 1, "artist": 1, "album": 1,
+    "danceability": 1, "tempo": 1, "acousticness": 1, "energy": 1, "valence": 1,
+}
+WORKING_SCAN_PROJECTION = {
+    "title": 1, "filename": 1, "song_emotion": 1,
+    "danceability": 1, "energy": 1, "valence": 1, "acousticness": 1,
+}
+TRAINING_FIELDS = ["danceability", "tempo", "acousticness", "energy", "valence"]
+
+Song = Dict[str, Any]
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def load_settings():
+    return {
+        "uri": os.environ.get("MONGO_URI", "mongodb://localhost:27017/"),
+        "db": os.environ.get("MONGO_DB", "musicDB"),
+        "max_pool_size": _env_int("MONGO_MAX_POOL_SIZE", 50),
+        "min_pool_size": _env_int("MONGO_MIN_POOL_SIZE", 0),
+        "connect_timeout_ms": _env_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "server_selection_timeout_ms": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "socket_timeout_ms": _env_int("MONGO_SOCKET_TIMEOUT_MS", None),
+        "read_preference": os.environ.get("MONGO_READ_PREFERENCE", "primary"),
+    }
+
+
+settings = load_settings()
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+
+def configure(**overrides):
+    """Override settings (e.g. from CLI flags) before the client is first used"""
+    global _client
+    unknown = set(overrides) - set(settings)
+    if unknown:
+        raise ValueError(f"Unknown Mongo settings: {sorted(unknown)}")
+    with _lock:
+        settings.update({k: v for k, v in overrides.items() if v is not None})
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+
+
+def client_options():
+    options = {
+        "maxPoolSize": settings["max_pool_size"],
+        "minPoolSize": settings["min_pool_size"],
+        "connectTimeoutMS": settings["connect_timeout_ms"],
+        "serverSelectionTimeoutMS": settings["server_selection_timeout_ms"],
+        "readPreference": settings["read_preference"],
+    }
+    if settings["socket_timeout_ms"] is not None:
+        options["socketTimeoutMS"] = settings["socket_timeout_ms"]
+    return options
+
+
+def get_client():
+    """The process-wide MongoClient; recreated transparently after fork()"""
+    global _client, _client_pid
+    client = _client
+    if client is not None and _client_pid == os.getpid():
+        return client
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            from pymongo import MongoClient
+            # A client inherited across fork() must not be used or closed in the child
+            _client = MongoClient(settings["uri"], **client_options())
+            _client_pid = os.getpid()
+        return _client
+
+
+def _reset_after_fork():
+    global _client, _client_pid, _lock
+    _client = None
+    _client_pid = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def close_client():
+    global _client
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+
+
+def get_db(name=None):
+    return get_client()[name or settings["db"]]
+
+
+def get_collection(name=SONGS_COLLECTION, db_name=None):
+    return get_db(db_name)[name]
+
+
+def songs():
+    return get_collection(SONGS_COLLECTION)
+
+
+def ping() -> bool:
+    try:
+        get_client().admin.command("ping")
+        return True
+    except Exception:
+        return False
+
+
+# ---------------- Query helpers ----------------
+def fetch_scan_catalog() -> List[Song]:
+    """Every song with only the fields emotion_api scores and returns"""
+    return list(songs().find({}, SCAN_PROJECTION))
+
+
+def fetch_songs_by_emotion(emotion: str, projection=WORKING_SCAN_PROJECTION, limit: int = 0) -> List[Song]:
+    return list(songs().find({"song_emotion": emotion}, projection, limit=limit))
+
+
+def fetch_any_songs(limit: int, projection=WORKING_SCAN_PROJECTION) -> List[Song]:
+    return list(songs().find({}, projection, limit=limit))
+
+
+def fetch_songs_by_ids(song_ids: Iterable[str], projection=WORKING_SCAN_PROJECTION) -> List[Song]:
+    """One $in query instead of a find_one per id; keeps the order of `song_ids`"""
+    from bson import ObjectId
+    from bson.errors import InvalidId
+    object_ids = []
+    for song_id in song_ids:
+        try:
+            object_ids.append(ObjectId(song_id))
+        except (InvalidId, TypeError):
+            continue
+    if not object_ids:
+        return []
+    by_id = {doc["_id"]: doc for doc in songs().find({"_id": {"$in": object_ids}}, projection)}
+    return [by_id[oid] for oid in object_ids if oid in by_id]
+
+
+def fetch_song_titles_by_emotion(emotion: str) -> List[str]:
+    return [s.get("title", "Unknown") for s in songs().find({"song_emotion": emotion}, {"title": 1})]
+
+
+def estimated_song_count() -> int:
+    return songs().estimated_document_count()
+
+
+def count_by_emotion(emotions: Iterable[str]) -> Dict[str, int]:
+    """Per-emotion counts in a single $group"""
+    counts = {e: 0 for e in emotions}
+    for row in songs().aggregate([{"$group": {"_id": "$song_emotion", "count": {"$sum": 1}}}]):
+        if row["_id"] in counts:
+            counts[row["_id"]] = row["count"]
+    return counts
+
+
+def sample_songs(size: int, projection=None) -> List[Song]:
+    pipeline = [{"$sample": {"size": size}}]
+    if projection:
+        pipeline.append({"$project": projection})
+    return list(songs().aggregate(pipeline))
+
+
+def catalog_fingerprint() -> Dict[str, Any]:
+    """Cheap catalog version: metadata count + newest _id"""
+    newest = songs().find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return {
+        "count": estimated_song_count(),
+        "last_id": str(newest["_id"]) if newest else None,
+    }
+
+
+def fetch_training_rows(fields: Optional[List[str]] = None) -> List[Song]:
+    fields = fields or TRAINING_FIELDS
+    return list(songs().find({}, {f: 1 for f in fields}))
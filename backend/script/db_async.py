@@ -0,0 +1,101 @@
+# Async counterpart of db.py for asyncio servers
+# Uses PyMongo's native AsyncMongoClient (pymongo >= 4.10) with the same
+# MONGO_* settings as db.py. MONGO_ASYNC_CONCURRENCY caps how many queries a
+# process keeps in flight (default: the pool size).
+
+import asyncio
+import os
+from typing import Dict, Iterable, List
+
+import db
+from db import SONGS_COLLECTION, WORKING_SCAN_PROJECTION, Song
+
+_client = None
+_client_key = None        # (pid, event loop) the client belongs to
+_semaphore = None
+
+
+def concurrency_limit():
+    value = os.environ.get("MONGO_ASYNC_CONCURRENCY")
+    return int(value) if value else db.settings["max_pool_size"]
+
+
+def get_client():
+    """One AsyncMongoClient per process and event loop"""
+    global _client, _client_key, _semaphore
+    key = (os.getpid(), asyncio.get_running_loop())
+    if _client is None or _client_key != key:
+        from pymongo import AsyncMongoClient
+        _client = AsyncMongoClient(db.settings["uri"], **db.client_options())
+        _client_key = key
+        _semaphore = asyncio.Semaphore(concurrency_limit())
+    return _client
+
+
+async def close_client():
+    global _client, _client_key
+    if _client is not None and _client_key == (os.getpid(), asyncio.get_running_loop()):
+        await _client.close()
+    _client = None
+    _client_key = None
+
+
+def songs():
+    return get_client()[db.settings["db"]][SONGS_COLLECTION]
+
+
+async def _limited(coro):
+    get_client()
+    async with _semaphore:
+        return await coro
+
+
+async def _find(query, projection, limit=0) -> List[Song]:
+    cursor = songs().find(query, projection, limit=limit)
+    return await cursor.to_list(None)
+
+
+# ---------------- Query helpers (same contracts as db.py) ----------------
+async def fetch_songs_by_emotion(emotion: str, projection=WORKING_SCAN_PROJECTION, limit: int = 0) -> List[Song]:
+    return await _limited(_find({"song_emotion": emotion}, projection, limit))
+
+
+async def fetch_any_songs(limit: int, projection=WORKING_SCAN_PROJECTION) -> List[Song]:
+    return await _limited(_find({}, projection, limit))
+
+
+async def fetch_songs_by_ids(song_ids: Iterable[str], projection=WORKING_SCAN_PROJECTION) -> List[Song]:
+    from bson import ObjectId
+    from bson.errors import InvalidId
+    object_ids = []
+    for song_id in song_ids:
+        try:
+            object_ids.append(ObjectId(song_id))
+        except (InvalidId, TypeError):
+            continue
+    if not object_ids:
+        return []
+    docs = await _limited(_find({"_id": {"$in": object_ids}}, projection))
+    by_id = {doc["_id"]: doc for doc in docs}
+    return [by_id[oid] for oid in object_ids if oid in by_id]
+
+
+async def fetch_song_titles_by_emotion(emotion: str) -> List[str]:
+    docs = await _limited(_find({"song_emotion": emotion}, {"title": 1}))
+    return [s.get("title", "Unknown") for s in docs]
+
+
+async def estimated_song_count() -> int:
+    return await _limited(songs().estimated_document_count())
+
+
+async def count_by_emotion(emotions: Iterable[str]) -> Dict[str, int]:
+    async def run():
+        cursor = await songs().aggregate([{"$group": {"_id": "$song_emotion", "count": {"$sum": 1}}}])
+        return await cursor.to_list(None)
+
+    counts = {e: 0 for e in emotions}
+    for row in await _limited(run()):
+        if row["_id"] in counts:
+            counts[row["_id"]] = row["count"]
+    return counts
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import joblib
+import numpy as np
+from emotion_scorer import GridEmotionScorer, DEFAULT_BINS, DEFAULT_SPLIT_EDGES, agreement_report, forest_fingerprint
+from train_recommender import FEATURES, MODEL_DIR
+
+# Distill the 150-tree song recommender into a quantized lookup grid
+# Reads models/song_recommender.joblib + emotion_encoder.joblib, fits the grid on the
+# catalog's feature distribution and writes models/emotion_scorer.joblib plus an
+# agreement report (models/emotion_scorer.report.json). Agreement is measured on
+# HOLDOUT_FRACTION of the songs the grid was not fitted on, and the report records
+# the fingerprint of the forest file, so emotion_api stops using the grid once
+# train_recommender.py writes a new forest.
+#
+#   python distill_emotion_scorer.py            # catalog from MongoDB
+#   python distill_emotion_scorer.py --bins 16 --split-edges 6
+
+SCORER_PATH = os.path.join(MODEL_DIR, "emotion_scorer.joblib")
+REPORT_PATH = os.path.join(MODEL_DIR, "emotion_scorer.report.json")
+FOREST_PATH = os.path.join(MODEL_DIR, "song_recommender.joblib")
+HOLDOUT_FRACTION = 0.2
+
+def catalog_features():
+    import db
+    from train_recommender import build_dataset
+    songs = db.fetch_training_rows()
+    if len(songs) == 0:
+        raise Exception("❌ No songs found in database")
+    X, _ = build_dataset(songs)
+    return X
+
+def split_holdout(X, fraction=HOLDOUT_FRACTION, seed=0):
+    """(fit rows, held-out rows) of X; at least one row on each side when X has two"""
+    X = np.asarray(X)
+    order = np.random.default_rng(seed).permutation(len(X))
+    n_holdout = min(max(int(round(len(X) * fraction)), 1), len(X) - 1) if len(X) > 1 else 0
+    return X[order[n_holdout:]], X[order[:n_holdout]]
+
+def distill(forest, encoder, X, bins=DEFAULT_BINS, split_edges=DEFAULT_SPLIT_EDGES, model_dir=MODEL_DIR,
+            forest_path=None, holdout=HOLDOUT_FRACTION):
+    """Fit the grid on most of X, report agreement on the held-out rest"""
+    forest_path = forest_path or os.path.join(model_dir, "song_recommender.joblib")
+    X_fit, X_holdout = split_holdout(X, holdout)
+    scorer = GridEmotionScorer.fit(forest, X_fit, encoder.classes_, bins, split_edges)
+    report = agreement_report(forest, scorer, X_holdout if len(X_holdout) else X_fit, encoder.classes_)
+    report["fit_songs"] = int(len(X_fit))
+    report["holdout_songs"] = int(len(X_holdout))
+    report["fit_label_agreement"] = agreement_report(forest, scorer, X_fit, encoder.classes_)["label_agreement"]
+    report["forest"] = forest_fingerprint(forest_path)
+    report["bins"] = [len(e) + 1 for e in scorer.edges]
+    report["table_bytes"] = int(scorer.table.nbytes)
+
+    joblib.dump(scorer.to_dict(), os.path.join(model_dir, "emotion_scorer.joblib"))
+    with open(os.path.join(model_dir, "emotion_scorer.report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return scorer, report
+
+def main():
+    bins = DEFAULT_BINS
+    split_edges = DEFAULT_SPLIT_EDGES
+    if "--bins" in sys.argv:
+        bins = int(sys.argv[sys.argv.index("--bins") + 1])
+    if "--split-edges" in sys.argv:
+        split_edges = int(sys.argv[sys.argv.index("--split-edges") + 1])
+
+    forest = joblib.load(FOREST_PATH)
+    encoder = joblib.load(os.path.join(MODEL_DIR, "emotion_encoder.joblib"))
+    X = catalog_features()
+    print(f"🎼 Distilling forest over {len(X)} songs ({len(FEATURES)} features, "
+          f"{bins} quantile bins + {split_edges} split edges each)")
+
+    _, report = distill(forest, encoder, X, bins, split_edges, forest_path=FOREST_PATH)
+
+    print(f"\n✅ Saved {SCORER_PATH}")
+    print(f"📊 Label agreement with forest: {report['label_agreement']:.1%} on {report['holdout_songs']} "
+          f"held-out songs ({report['fit_label_agreement']:.1%} on the {report['fit_songs']} it was fitted on)")
+    print(f"   Mean |Δp|: {report['mean_abs_prob_diff']}  (max {report['max_abs_prob_diff']})")
+    print(f"⚡ predict_proba: forest {report['forest_seconds']}s, grid {report['scorer_seconds']}s "
+          f"({report['speedup']}x)")
+    print(f"📝 Report: {REPORT_PATH}")
+
+if __name__ == "__main__":
+    main()
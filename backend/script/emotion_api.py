@@ -1,21 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from io import BytesIO
-from PIL import Image
 import numpy as np
-import tensorflow as tf
 import base64
 import json
-import cv2
 import os
-import joblib
 import random
-from pymongo import MongoClient
+import time
+import threading
 from datetime import datetime
+from metrics import REGISTRY, StageTimer, CONTENT_TYPE
+from health import HealthSnapshot
+from cache import TTLCache
+from admission import AdmissionController, FULL, DEGRADED
+from shared_catalog import SharedCatalog, SHARED_CATALOG_DIR, song_features
+import db
+import profiling
+
+# TensorFlow, OpenCV, PIL, joblib/sklearn and pymongo are heavy to import.
+# They are imported by warm_up() (or on first use), never at module import.
 
 # ---------------- Flask setup ----------------
 app = Flask(__name__)
 CORS(app)
+profiling.install(app)  # /api/admin/profile, slow-request traces
 
 # ---------------- Paths ----------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -25,38 +33,252 @@ EMOTION_MODEL_PATH = os.path.join(MODEL_DIR, "emotion_cnn.keras")
 LABELS_PATH = os.path.join(MODEL_DIR, "emotion_cnn.labels.json")
 RECOMMENDER_PATH = os.path.join(MODEL_DIR, "song_recommender.joblib")
 ENCODER_PATH = os.path.join(MODEL_DIR, "emotion_encoder.joblib")
+SCORER_PATH = os.path.join(MODEL_DIR, "emotion_scorer.joblib")   # distill_emotion_scorer.py
 CASCADE_PATH = os.path.join(BASE_DIR, "haarcascade_frontalface_default.xml")
 
-# ---------------- Load emotion CNN ----------------
-emotion_model = tf.keras.models.load_model(EMOTION_MODEL_PATH)
+# ---------------- Startup mode ----------------
+# "background": bind immediately, load models on a warm-up thread (/api/ready reports progress)
+# "eager":      load everything before the server starts, like a classic import
+# "manual":     nothing is loaded until warm_up() is called (tooling / benchmarks)
+STARTUP_MODE = os.environ.get("EMOTION_API_STARTUP", "background")
+
+# ---------------- Song scorer ----------------
+# "auto":   the distilled grid scorer when models/emotion_scorer.joblib exists and its
+#           report was made from the current song_recommender.joblib with held-out
+#           label agreement >= SCORER_MIN_AGREEMENT, else the forest
+# "grid":   require the grid scorer;  "forest": always the 150-tree RandomForest
+SONG_SCORER = os.environ.get("SONG_SCORER", "auto")
 
 with open(LABELS_PATH, "r") as f:
     emotion_labels = json.load(f)
 
-print("✅ Emotion CNN loaded")
-print(f"🎭 Face emotions: {emotion_labels}")
+emotion_model = None
+song_recommender = None    # anything with predict_proba: the forest or a GridEmotionScorer
+song_scorer_kind = None
+emotion_encoder = None
+face_cascade = None
+
+models_ready = threading.Event()
+warmup_state = {"stage": "pending", "error": None, "seconds": None}
+_warmup_lock = threading.Lock()
+
+def warm_up():
+    """Import heavy modules, load models, connect MongoDB and start background refreshers"""
+    global emotion_model, song_recommender, song_scorer_kind, emotion_encoder, face_cascade
+    with _warmup_lock:
+        if models_ready.is_set():
+            return
+        start = time.perf_counter()
+        try:
+            # ---------------- Load emotion CNN ----------------
+            warmup_state["stage"] = "emotion_cnn"
+            import tensorflow as tf
+            emotion_model = tf.keras.models.load_model(EMOTION_MODEL_PATH)
+            print("✅ Emotion CNN loaded")
+            print(f"🎭 Face emotions: {emotion_labels}")
 
-# ---------------- Load recommender ----------------
-song_recommender = joblib.load(RECOMMENDER_PATH)
-emotion_encoder = joblib.load(ENCODER_PATH)
+            # ---------------- Load recommender ----------------
+            warmup_state["stage"] = "recommender"
+            import joblib
+            emotion_encoder = joblib.load(ENCODER_PATH)
+            from emotion_scorer import GridEmotionScorer, use_grid_scorer
+            use_grid, reason = use_grid_scorer(SONG_SCORER, SCORER_PATH, forest_path=RECOMMENDER_PATH)
+            if use_grid:
+                song_recommender = GridEmotionScorer.from_dict(joblib.load(SCORER_PATH))
+                if list(song_recommender.classes_) != list(emotion_encoder.classes_):
+                    raise RuntimeError("❌ emotion_scorer.joblib classes do not match emotion_encoder.joblib")
+                song_scorer_kind = "grid"
+            else:
+                song_recommender = joblib.load(RECOMMENDER_PATH)
+                song_scorer_kind = "forest"
+            print(f"✅ Song recommender loaded ({song_scorer_kind}: {reason})")
+            print(f"🎵 Song emotions: {list(emotion_encoder.classes_)}")
+
+            # ---------------- Load face detector ----------------
+            warmup_state["stage"] = "face_detector"
+            import cv2
+            import PIL.Image  # noqa: F401  (import cost paid here, not on the first scan)
+            face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
+            if face_cascade.empty():
+                raise RuntimeError("❌ Haar Cascade not loaded")
+
+            # ---------------- MongoDB ----------------
+            warmup_state["stage"] = "mongodb"
+            db.get_client()
+            start_background_tasks()
+
+            warmup_state["stage"] = "ready"
+            warmup_state["seconds"] = round(time.perf_counter() - start, 3)
+            models_ready.set()
+            print(f"🚀 Warm-up finished in {warmup_state['seconds']}s")
+        except Exception as e:
+            warmup_state["error"] = str(e)
+            print(f"❌ Warm-up failed at {warmup_state['stage']}: {e}")
+            raise
 
-print("✅ Song recommender loaded")
-print(f"🎵 Song emotions: {list(emotion_encoder.classes_)}")
+def start_warm_up():
+    if STARTUP_MODE == "manual":
+        return
+    if STARTUP_MODE == "eager":
+        warm_up()
+    else:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
 
-# ---------------- Load face detector ----------------
-face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
-if face_cascade.empty():
-    raise RuntimeError("❌ Haar Cascade not loaded")
+def not_ready_response():
+    body = {"error": "Models are still loading", "emotion": "neutral", "songs": [], "warmup": warmup_state}
+    return body, 503
 
-# ---------------- MongoDB ----------------
-client = MongoClient("mongodb://localhost:27017/")
-db = client["musicDB"]
-songs_collection = db["songs"]
+# ---------------- Metrics ----------------
+SCAN_STAGE_SECONDS = REGISTRY.histogram(
+    "scan_stage_seconds", "Time spent in each /api/scan-face pipeline stage", ("stage",)
+)
+SCAN_REQUEST_SECONDS = REGISTRY.histogram(
+    "scan_request_seconds", "End-to-end /api/scan-face latency", ("status",)
+)
+SCAN_REQUESTS = REGISTRY.counter(
+    "scan_requests_total", "Scan requests by outcome", ("status",)
+)
 
 # Session memory to track recently shown songs
 recent_songs = {}  # {user_ip: [song_ids]}
 MAX_RECENT_SONGS = 20
 
+# ---------------- Admission control ----------------
+# SCAN_MAX_IN_FLIGHT scans run the CNN pipeline at once; up to SCAN_MAX_QUEUED more
+# wait at most SCAN_QUEUE_TIMEOUT for a slot. Past that a scan is degraded: no image
+# work, emotion from the client's "emotion_hint" or the session's last result, songs
+# from the precomputed per-emotion pool. When the degraded path is full too (or has
+# nothing to serve) the scan is shed with 503 + Retry-After.
+SCAN_MAX_IN_FLIGHT = int(os.environ.get("SCAN_MAX_IN_FLIGHT", "4"))
+SCAN_MAX_QUEUED = int(os.environ.get("SCAN_MAX_QUEUED", "8"))
+SCAN_QUEUE_TIMEOUT = float(os.environ.get("SCAN_QUEUE_TIMEOUT", "0.5"))
+SCAN_MAX_DEGRADED = int(os.environ.get("SCAN_MAX_DEGRADED", "64"))
+SCAN_RETRY_AFTER = os.environ.get("SCAN_RETRY_AFTER", "1")
+SCAN_SESSION_TTL = float(os.environ.get("SCAN_SESSION_TTL", "600"))   # how long a last result may stand in
+SONG_POOL_SIZE = int(os.environ.get("SONG_POOL_SIZE", "60"))
+SONG_POOL_REFRESH = float(os.environ.get("SONG_POOL_REFRESH", "30"))
+
+scan_admission = AdmissionController(
+    "scan_face", SCAN_MAX_IN_FLIGHT, SCAN_MAX_QUEUED, SCAN_QUEUE_TIMEOUT, SCAN_MAX_DEGRADED
+)
+SCAN_DEGRADED = REGISTRY.counter(
+    "scan_degraded_total", "Degraded scans by admission reason and emotion source", ("reason", "emotion_source")
+)
+SCAN_SHED = REGISTRY.counter(
+    "scan_shed_total", "Scans answered with 503 by admission control", ("reason",)
+)
+POOL_STAGE_SECONDS = REGISTRY.histogram(
+    "song_pool_stage_seconds", "Time spent refreshing the degraded-mode song pool", ("stage",)
+)
+
+last_results = {}  # {user_ip: (monotonic time, song_emotion, face_emotion, confidence)}
+
+# ---------------- Recommendation cache ----------------
+# Ranked candidates per (song emotion, catalog version); only the per-session
+# recency filter and randomization run on a hit.
+RECOMMENDATION_CACHE_SIZE = int(os.environ.get("RECOMMENDATION_CACHE_SIZE", "32"))
+RECOMMENDATION_CACHE_TTL = float(os.environ.get("RECOMMENDATION_CACHE_TTL", "300"))
+CATALOG_POLL_SECONDS = float(os.environ.get("CATALOG_POLL_SECONDS", "5"))
+
+recommendation_cache = TTLCache(
+    "recommendations", RECOMMENDATION_CACHE_SIZE, RECOMMENDATION_CACHE_TTL
+)
+catalog_generation = 0   # bumped by explicit invalidation / change stream
+
+catalog_snapshot = HealthSnapshot(
+    db.catalog_fingerprint, interval=CATALOG_POLL_SECONDS, name="catalog-version"
+)
+
+# ---------------- Shared catalog ----------------
+# With SHARED_CATALOG_DIR set, songs, features and recommender probabilities are
+# read from the generation published by shared_catalog.py (memory-mapped, shared
+# by every worker) instead of being fetched and scored per worker.
+shared_catalog = SharedCatalog(SHARED_CATALOG_DIR) if SHARED_CATALOG_DIR else None
+
+def shared_view():
+    """Live shared catalog generation, if one is published and matches our emotion classes"""
+    if shared_catalog is None:
+        return None
+    view = shared_catalog.current()
+    if view is not None and view.classes != [str(c) for c in emotion_encoder.classes_]:
+        print(f"⚠️ Shared catalog classes {view.classes} do not match the encoder; scoring locally")
+        return None
+    return view
+
+def catalog_version():
+    """None until the first poll succeeds, which disables caching"""
+    data, _ = catalog_snapshot.get()
+    if not data:
+        return None
+    return (data["count"], data["last_id"], catalog_generation)
+
+def invalidate_catalog(reason):
+    global catalog_generation
+    catalog_generation += 1
+    dropped = recommendation_cache.invalidate()
+    print(f"♻️  Catalog changed ({reason}), dropped {dropped} cached rankings")
+
+def watch_catalog():
+    """Invalidate on any write when MongoDB runs as a replica set (change streams)"""
+    try:
+        with db.songs().watch() as stream:
+            for _ in stream:
+                invalidate_catalog("change stream")
+    except Exception as e:
+        print(f"ℹ️  Catalog change stream unavailable, relying on polling: {e}")
+
+def collect_song_pool():
+    """Top SONG_POOL_SIZE ranked candidates per song emotion, for degraded scans"""
+    timer = StageTimer(POOL_STAGE_SECONDS)
+    pool = {}
+    for song_emotion in emotion_encoder.classes_:
+        candidates, _, _ = get_ranked_candidates(str(song_emotion), timer)
+        pool[str(song_emotion)] = candidates[:SONG_POOL_SIZE]
+    return pool
+
+song_pool = HealthSnapshot(collect_song_pool, interval=SONG_POOL_REFRESH, name="song-pool")
+
+def start_background_tasks():
+    """Called from warm_up() once MongoDB is configured"""
+    catalog_snapshot.start()
+    health_snapshot.start()
+    song_pool.start()
+    threading.Thread(target=watch_catalog, name="catalog-watch", daemon=True).start()
+
+# ---------------- Face cache ----------------
+# Near-duplicate frames (same user re-scanning within seconds) reuse the CNN output.
+# Entries are keyed by (user_ip, dHash) and only match within the same session: an
+# 8x8 dHash barely sees expression changes, so another client's face (or the same
+# face a few bits away) must not inherit a cached emotion.
+FACE_CACHE_SIZE = int(os.environ.get("FACE_CACHE_SIZE", "256"))
+FACE_CACHE_TTL = float(os.environ.get("FACE_CACHE_TTL", "30"))
+FACE_HASH_SIZE = 8                                                    # 8x8 -> 64-bit hash
+FACE_HASH_THRESHOLD = int(os.environ.get("FACE_HASH_THRESHOLD", "2"))  # max differing bits
+
+face_cache = TTLCache("face_emotions", FACE_CACHE_SIZE, FACE_CACHE_TTL)
+
+def face_hash(face_img):
+    """dHash of the face crop: sign of horizontal gradients on a tiny grayscale thumbnail"""
+    import cv2
+    gray = cv2.cvtColor(face_img, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (FACE_HASH_SIZE + 1, FACE_HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+def session_hamming(a, b):
+    """Distance between (session, hash) cache keys; keys of other sessions never match"""
+    if a[0] != b[0]:
+        return FACE_HASH_SIZE * FACE_HASH_SIZE + 1
+    return hamming(a[1], b[1])
+
+# ---------------- Group scans ----------------
+# {"image": ..., "group": true} classifies every face in frame (one batched CNN call)
+GROUP_MAX_FACES = int(os.environ.get("GROUP_MAX_FACES", "12"))
+GROUP_MIX_STEP = float(os.environ.get("GROUP_MIX_STEP", "0.05"))
+
 # ---------------- Helpers ----------------
 def decode_base64_image(b64_string):
     b64_string = b64_string.split(",")[-1]
@@ -65,73 +287,133 @@ def decode_base64_image(b64_string):
         b64_string += "=" * (4 - missing_padding)
     return base64.b64decode(b64_string)
 
-def extract_face(pil_image):
+def extract_faces(pil_image, max_faces=None):
+    """All detected faces as (crop, (x, y, w, h)), largest first"""
+    import cv2
     img = np.array(pil_image.convert("RGB"))
     gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
 
     faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-    if len(faces) == 0:
-        return None
+    faces = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)[:max_faces]
+    return [(img[y:y+h, x:x+w], (int(x), int(y), int(w), int(h))) for x, y, w, h in faces]
+
+def extract_face(pil_image):
+    faces = extract_faces(pil_image, max_faces=1)
+    return faces[0][0] if faces else None
 
-    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
-    return img[y:y+h, x:x+w]
+def preprocess_faces(face_imgs):
+    """One (N, 224, 224, 3) batch for a single CNN forward pass"""
+    import cv2
+    batch = np.empty((len(face_imgs), 224, 224, 3), dtype=np.float32)
+    for i, face_img in enumerate(face_imgs):
+        batch[i] = cv2.resize(face_img, (224, 224))
+    # mobilenet_v2.preprocess_input without importing TensorFlow: scale to [-1, 1]
+    batch /= 127.5
+    batch -= 1.0
+    return batch
 
 def preprocess_face(face_img):
-    face_img = cv2.resize(face_img, (224, 224))
-    face_img = face_img.astype(np.float32)
-    face_img = tf.keras.applications.mobilenet_v2.preprocess_input(face_img)
-    return np.expand_dims(face_img, axis=0)
+    return preprocess_faces([face_img])
+
+def classify_faces(face_imgs, timer, session):
+    """Per-face emotion probabilities; cache misses share one batched predict call"""
+    with timer.stage("face_hash"):
+        keys = [(session, face_hash(f)) for f in face_imgs]
+        rows = []
+        for key in keys:
+            preds, distance = face_cache.get_nearest(key, session_hamming, FACE_HASH_THRESHOLD)
+            if preds is not None:
+                print(f"♻️  Near-duplicate face (distance {distance}), reusing cached emotion")
+            rows.append(preds)
+
+    missing = [i for i, preds in enumerate(rows) if preds is None]
+    if missing:
+        with timer.stage("preprocess"):
+            batch = preprocess_faces([face_imgs[i] for i in missing])
+        with timer.stage("cnn_inference"):
+            batch_preds = emotion_model.predict(batch, verbose=0)
+        for i, preds in zip(missing, batch_preds):
+            rows[i] = preds
+            face_cache.put(keys[i], preds)
+    return rows
 
-def get_varied_recommendations(features, valid_songs, target_emotion=None, user_ip=None):
+def rank_candidates(features, valid_songs, target_emotion=None, timer=None, emotion_mix=None, probabilities=None):
     """
-    Get varied song recommendations with randomization
+    Expensive, session-independent part of a recommendation: score every song
+    for the target emotion and keep the candidates that can still reach the
+    top 20 after the per-session recency penalty and random factor.
+    `emotion_mix` ({song_emotion: weight}) blends several target emotions.
+    `probabilities` skips predict_proba (shared catalog scored by the publisher).
     """
-    try:
-        # Get emotion probabilities for all songs
-        probabilities = song_recommender.predict_proba(features)
-        
+    timer = timer or StageTimer(SCAN_STAGE_SECONDS)
+    # Get emotion probabilities for all songs
+    if probabilities is None:
+        with timer.stage("predict_proba"):
+            probabilities = song_recommender.predict_proba(features)
+
+    with timer.stage("ranking"):
         # Calculate scores based on target emotion
-        if target_emotion and target_emotion in emotion_encoder.classes_:
+        if emotion_mix:
+            # Group mood: weighted sum of the per-emotion probabilities
+            weights = np.array([emotion_mix.get(e, 0.0) for e in emotion_encoder.classes_])
+            scores = probabilities @ weights
+        elif target_emotion and target_emotion in emotion_encoder.classes_:
             # Specific emotion requested
             emotion_idx = list(emotion_encoder.classes_).index(target_emotion)
             scores = probabilities[:, emotion_idx]
         else:
             # For neutral: find balanced songs
             scores = 1 - np.max(probabilities, axis=1)
-        
+
+        # Higher tempo gets slight boost for variety (±20% based on tempo)
+        tempo_factor = 1.0 + (features[:, 1] - 120) / 240
+        base_scores = scores * tempo_factor
+        order = np.argsort(-base_scores, kind="stable")
+
+        # diversity = base * recency (0.5 or 1) * random (0.8..1.2). At most
+        # MAX_RECENT_SONGS are penalised, so the 20th diversity score is at
+        # least 0.8 * base of the (20 + MAX_RECENT_SONGS)th song; anything
+        # with 1.2 * base below that can never be selected.
+        cutoff_rank = 20 + MAX_RECENT_SONGS
+        if len(order) > cutoff_rank:
+            floor = base_scores[order[cutoff_rank - 1]] * 0.8 / 1.2
+            order = order[base_scores[order] >= floor]
+
+        return [
+            {
+                "song": valid_songs[i],
+                "original_score": float(scores[i]),
+                "base_score": float(base_scores[i]),
+                "song_id": str(valid_songs[i].get("_id", i)),
+            }
+            for i in order
+        ]
+
+def select_varied(candidates, user_ip=None, timer=None):
+    """
+    Cheap per-session part: recency penalty, randomization and a mix of score ranges
+    """
+    timer = timer or StageTimer(SCAN_STAGE_SECONDS)
+    with timer.stage("selection"):
         # Get recently shown songs for this user (if tracking)
-        recent_song_ids = []
+        recent_song_ids = set()
         if user_ip and user_ip in recent_songs:
-            recent_song_ids = recent_songs[user_ip]
+            recent_song_ids = set(recent_songs[user_ip])
         
         # Combine songs with their scores and other metrics for variety
         song_data = []
-        for i, (song, score) in enumerate(zip(valid_songs, scores)):
-            song_id = str(song.get("_id", i))
-            
-            # Calculate variety factors
-            danceability = float(song.get("danceability", 0.5))
-            energy = float(song.get("energy", 0.5))
-            tempo = float(song.get("tempo", 120))
-            
+        for c in candidates:
             # Penalty for recently shown songs
-            recency_penalty = 0.5 if song_id in recent_song_ids else 1.0
+            recency_penalty = 0.5 if c["song_id"] in recent_song_ids else 1.0
             
             # Add some randomness to avoid always same order
             random_factor = random.uniform(0.8, 1.2)
             
-            # Combine score with variety factors
-            # Higher tempo and energy get slight boost for variety
-            tempo_factor = 1.0 + (tempo - 120) / 240  # ±20% based on tempo
-            diversity_score = score * recency_penalty * random_factor * tempo_factor
-            
             song_data.append({
-                "song": song,
-                "original_score": score,
-                "diversity_score": diversity_score,
-                "song_id": song_id,
-                "danceability": danceability,
-                "energy": energy
+                "song": c["song"],
+                "original_score": c["original_score"],
+                "diversity_score": c["base_score"] * recency_penalty * random_factor,
+                "song_id": c["song_id"],
             })
         
         # Sort by diversity score (not just emotion score)
@@ -180,14 +462,68 @@ def get_varied_recommendations(features, valid_songs, target_emotion=None, user_
             recent_songs[user_ip] = (recent_songs[user_ip] + new_recent_ids)[-MAX_RECENT_SONGS:]
         
         return [(item["song"], item["original_score"]) for item in selected]
-        
+
+def get_varied_recommendations(features, valid_songs, target_emotion=None, user_ip=None, timer=None):
+    """
+    Get varied song recommendations with randomization
+    """
+    try:
+        candidates = rank_candidates(features, valid_songs, target_emotion, timer)
+        return select_varied(candidates, user_ip, timer)
     except Exception as e:
         print(f"⚠️ Error in varied recommendations: {e}")
         # Fallback: random selection
-        combined = list(zip(valid_songs, scores if 'scores' in locals() else [0]*len(valid_songs)))
+        combined = list(zip(valid_songs, [0] * len(valid_songs)))
         random.shuffle(combined)
         return combined[:5]
 
+def load_catalog_features(timer):
+    """Fetch every song and build the recommender feature matrix"""
+    # Fetch all songs
+    with timer.stage("mongo_fetch"):
+        all_songs = db.fetch_scan_catalog()
+    print(f"📊 Total songs in database: {len(all_songs)}")
+
+    # Prepare features (songs with unparseable values are skipped)
+    with timer.stage("feature_build"):
+        X, valid_songs = song_features(all_songs)
+    return X, valid_songs
+
+def get_ranked_candidates(song_emotion, timer, emotion_mix=None):
+    """Cached fetch -> feature build -> predict_proba -> sort; returns (candidates, total, "hit"|"miss"|"bypass")"""
+    view = shared_view()
+    version = ("shared", view.generation) if view is not None else catalog_version()
+    key = (song_emotion if emotion_mix is None else tuple(sorted(emotion_mix.items())), version)
+    if version is not None:
+        entry = recommendation_cache.get(key)
+        if entry is not None:
+            return entry["candidates"], entry["total"], "hit"
+
+    if view is not None:
+        X, valid_songs, probabilities = view.features, view.songs, view.probabilities
+    else:
+        X, valid_songs = load_catalog_features(timer)
+        probabilities = None
+    if not len(valid_songs):
+        print("❌ No songs with valid features")
+        return [], 0, "miss"
+    print(f"✅ Processing {len(valid_songs)} valid songs")
+
+    try:
+        candidates = rank_candidates(X, valid_songs, song_emotion, timer, emotion_mix, probabilities)
+    except Exception as e:
+        print(f"⚠️ Error ranking songs: {e}")
+        # Fallback: random selection, not cached
+        return [
+            {"song": song, "original_score": 0.0, "base_score": random.random(), "song_id": str(song.get("_id", i))}
+            for i, song in enumerate(valid_songs)
+        ], len(valid_songs), "bypass"
+
+    if version is None:
+        return candidates, len(valid_songs), "bypass"
+    recommendation_cache.put(key, {"candidates": candidates, "total": len(valid_songs)})
+    return candidates, len(valid_songs), "miss"
+
 def map_face_to_song_emotion(face_emotion):
     """Map face emotion to song emotion categories"""
     face_emotion_lower = face_emotion.lower()
@@ -207,113 +543,234 @@ def map_face_to_song_emotion(face_emotion):
     
     return emotion_map.get(face_emotion_lower, "neutral")
 
+def group_mood(face_preds):
+    """
+    Average the per-face CNN probabilities, then fold them onto song emotions.
+    The song mix is rounded to GROUP_MIX_STEP so similar groups share a cache entry.
+    """
+    mean = np.mean(np.stack(face_preds), axis=0)
+    face_mood = {label: float(p) for label, p in zip(emotion_labels, mean)}
+    song_mix = {}
+    for label, p in face_mood.items():
+        song_emotion = map_face_to_song_emotion(label)
+        song_mix[song_emotion] = song_mix.get(song_emotion, 0.0) + p
+    song_mix = {e: round(round(p / GROUP_MIX_STEP) * GROUP_MIX_STEP, 4) for e, p in song_mix.items()}
+    song_mix = {e: p for e, p in song_mix.items() if p > 0}
+    return face_mood, song_mix
+
 # ---------------- API ----------------
 @app.route("/api/scan-face", methods=["POST"])
 def scan_face():
-    start_time = datetime.now()
-    print(f"\n📸 New scan request at {start_time.strftime('%H:%M:%S')}")
+    start = time.perf_counter()
+    timer = StageTimer(SCAN_STAGE_SECONDS)
+    status = "ok"
+    try:
+        if not models_ready.is_set():
+            body, code = not_ready_response()
+        else:
+            with scan_admission.slot() as admission:
+                decision, reason = admission
+                if decision == FULL:
+                    body, code = _scan_face(timer)
+                elif decision == DEGRADED:
+                    body, code = _degraded_scan(timer, reason)
+                    if code == 503 and "shed" in body:
+                        scan_admission.shed(admission, body["shed"])
+                else:
+                    body, code = shed_response(reason)
+        if code == 503:
+            shed = "shed" in body
+            status = "shed" if shed else "not_ready"
+            response = jsonify(body)
+            response.headers["Retry-After"] = SCAN_RETRY_AFTER if shed else "2"
+            return response, code
+        if code >= 400:
+            status = "client_error"
+        elif not body.get("songs"):
+            status = "empty"
+        elif "degraded" in body:
+            status = "degraded"
+        return jsonify(body), code
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        SCAN_REQUEST_SECONDS.observe(time.perf_counter() - start, status=status)
+        SCAN_REQUESTS.inc(status=status)
+
+
+def shed_response(reason):
+    SCAN_SHED.inc(reason=reason)
+    return {"error": "Server busy, retry shortly", "emotion": "neutral", "songs": [], "shed": reason}, 503
+
+def degraded_emotion(data, user_ip):
+    """(song_emotion, face_emotion, confidence, source) without the CNN, or None"""
+    hint = data.get("emotion_hint") if isinstance(data, dict) else None
+    if isinstance(hint, str) and hint.strip():
+        face_emotion = hint.strip().lower()
+        if face_emotion in emotion_labels or face_emotion in ("happy", "sad", "neutral"):
+            return map_face_to_song_emotion(face_emotion), face_emotion, None, "hint"
+    last = last_results.get(user_ip)
+    if last and time.monotonic() - last[0] <= SCAN_SESSION_TTL:
+        return last[1], last[2], last[3], "session"
+    return None
+
+def _degraded_scan(timer, reason):
+    """Overload path: no image decoding or inference, songs from the precomputed pool"""
+    start = time.perf_counter()
+    user_ip = request.remote_addr
+    with timer.stage("json_parse"):
+        data = request.get_json(silent=True) or {}
+
+    emotion = degraded_emotion(data, user_ip)
+    if emotion is None:
+        return shed_response("no_emotion_source")
+    song_emotion, face_emotion, confidence, source = emotion
+    pool, _ = song_pool.get()
+    candidates = pool.get(song_emotion) if pool else None
+    if not candidates:
+        return shed_response("no_song_pool")
+
+    ranked_songs = select_varied(candidates, user_ip, timer)
+    SCAN_DEGRADED.inc(reason=reason, emotion_source=source)
+    print(f"🐢 Degraded scan ({reason}): '{song_emotion}' from {source}")
+    return {
+        "emotion": song_emotion,
+        "face_emotion": face_emotion,
+        "confidence": None if confidence is None else round(confidence, 3),
+        "songs": format_songs(ranked_songs),
+        "response_time": time.perf_counter() - start,
+        "stage_timings_ms": timer.as_ms(),
+        "selection_type": "varied",
+        "degraded": {"reason": reason, "emotion_source": source},
+    }, 200
+
+def format_songs(ranked_songs):
+    """Response entries for the top 5 (song, score) pairs"""
+    return [
+        {
+            "title": song.get("title", "Unknown Song"),
+            "artist": song.get("artist", "Unknown Artist"),
+            "album": song.get("album", ""),
+            "score": round(float(score), 3),
+            "danceability": round(float(song.get("danceability", 0)), 2),
+            "energy": round(float(song.get("energy", 0)), 2),
+            "valence": round(float(song.get("valence", 0)), 2),
+            "tempo": round(float(song.get("tempo", 0)), 1)
+        }
+        for song, score in ranked_songs[:5]
+    ]
+
+def _scan_face(timer):
+    from PIL import Image
+    start = time.perf_counter()
+    print(f"\n📸 New scan request at {datetime.now().strftime('%H:%M:%S')}")
     
     # Get user IP for session tracking
     user_ip = request.remote_addr
     
-    data = request.get_json()
+    with timer.stage("json_parse"):
+        data = request.get_json(silent=True)
     if not data or "image" not in data:
-        return jsonify({"error": "Image not provided", "emotion": "neutral", "songs": []}), 400
+        return {"error": "Image not provided", "emotion": "neutral", "songs": []}, 400
 
     try:
-        image_bytes = decode_base64_image(data["image"])
-        image = Image.open(BytesIO(image_bytes))
+        with timer.stage("base64_decode"):
+            image_bytes = decode_base64_image(data["image"])
+        with timer.stage("image_decode"):
+            image = Image.open(BytesIO(image_bytes))
+            image.load()
         print("✅ Image decoded successfully")
     except Exception as e:
         print(f"❌ Image error: {e}")
-        return jsonify({"error": f"Invalid image: {str(e)}", "emotion": "neutral", "songs": []}), 400
+        return {"error": f"Invalid image: {str(e)}", "emotion": "neutral", "songs": []}, 400
+
+    group_mode = bool(data.get("group"))
 
     # Face detection
-    face = extract_face(image)
-    if face is None:
+    with timer.stage("face_detection"):
+        faces = extract_faces(image, GROUP_MAX_FACES if group_mode else 1)
+    emotion_mix = None
+    group = None
+    if not faces:
         print("⚠️ No face detected")
         face_emotion = "neutral"
         confidence = 0.0
     else:
-        # Emotion prediction
-        face_tensor = preprocess_face(face)
-        preds = emotion_model.predict(face_tensor, verbose=0)
-        
-        emotion_idx = int(np.argmax(preds))
-        face_emotion = emotion_labels[emotion_idx]
-        confidence = float(preds[0][emotion_idx])
-        
+        # Emotion prediction (skipped for near-duplicate faces)
+        face_preds = classify_faces([crop for crop, _ in faces], timer, user_ip)
+
+        if group_mode:
+            face_mood, emotion_mix = group_mood(face_preds)
+            face_emotion = max(face_mood, key=face_mood.get)
+            confidence = face_mood[face_emotion]
+            group = {
+                "faces": len(faces),
+                "face_mood": {k: round(v, 3) for k, v in face_mood.items()},
+                "song_mood": emotion_mix,
+                "members": [
+                    {
+                        "box": box,
+                        "emotion": emotion_labels[int(np.argmax(preds))],
+                        "confidence": round(float(np.max(preds)), 3),
+                    }
+                    for (_, box), preds in zip(faces, face_preds)
+                ],
+            }
+            print(f"👥 Group of {len(faces)}: song mood {emotion_mix}")
+        else:
+            preds = face_preds[0]
+            emotion_idx = int(np.argmax(preds))
+            face_emotion = emotion_labels[emotion_idx]
+            confidence = float(preds[emotion_idx])
+
         print(f"🎭 Face emotion: {face_emotion} ({confidence:.1%} confidence)")
 
     # Map to song emotion
-    song_emotion = map_face_to_song_emotion(face_emotion)
+    if emotion_mix:
+        song_emotion = max(emotion_mix, key=emotion_mix.get)
+    else:
+        emotion_mix = None  # no faces (or an all-zero mix): fall back to the single-emotion path
+        song_emotion = map_face_to_song_emotion(face_emotion)
     print(f"🎵 Mapped to song emotion: {song_emotion}")
+    if faces:
+        last_results[user_ip] = (time.monotonic(), song_emotion, face_emotion, confidence)
 
-    # Fetch all songs
-    all_songs = list(songs_collection.find())
-    print(f"📊 Total songs in database: {len(all_songs)}")
-    
-    if not all_songs:
-        print("❌ No songs in database")
-        return jsonify({"emotion": song_emotion, "songs": []}), 200
-
-    # Prepare features
-    features = []
-    valid_songs = []
-    
-    for song in all_songs:
-        try:
-            features.append([
-                float(song.get("danceability", 0.5)),
-                float(song.get("tempo", 120.0)),
-                float(song.get("acousticness", 0.5)),
-                float(song.get("energy", 0.5)),
-                float(song.get("valence", 0.5))
-            ])
-            valid_songs.append(song)
-        except Exception as e:
-            continue  # Skip songs with missing features
-
-    if not features:
-        print("❌ No songs with valid features")
-        return jsonify({"emotion": song_emotion, "songs": []}), 200
-
-    X = np.array(features)
-    print(f"✅ Processing {len(features)} valid songs")
+    candidates, total_considered, cache_status = get_ranked_candidates(song_emotion, timer, emotion_mix)
+    if not candidates:
+        return {"emotion": song_emotion, "songs": []}, 200
 
     # Get varied song recommendations
-    ranked_songs = get_varied_recommendations(X, valid_songs, song_emotion, user_ip)
+    try:
+        ranked_songs = select_varied(candidates, user_ip, timer)
+    except Exception as e:
+        print(f"⚠️ Error in varied recommendations: {e}")
+        ranked_songs = [(c["song"], c["original_score"]) for c in random.sample(candidates, min(5, len(candidates)))]
     
     # Prepare response
-    recommended_songs = []
-    for song, score in ranked_songs[:5]:  # Get top 5
-        recommended_songs.append({
-            "title": song.get("title", "Unknown Song"),
-            "artist": song.get("artist", "Unknown Artist"),
-            "album": song.get("album", ""),
-            "score": round(float(score), 3),
-            "danceability": round(float(song.get("danceability", 0)), 2),
-            "energy": round(float(song.get("energy", 0)), 2),
-            "valence": round(float(song.get("valence", 0)), 2),
-            "tempo": round(float(song.get("tempo", 0)), 1)
-        })
+    recommended_songs = format_songs(ranked_songs)
 
     # Calculate response time
-    response_time = (datetime.now() - start_time).total_seconds()
+    response_time = time.perf_counter() - start
     
     print(f"✅ Recommended {len(recommended_songs)} varied songs for '{song_emotion}'")
     print(f"🎲 Songs: {[s['title'] for s in recommended_songs]}")
     print(f"⏱️  Response time: {response_time:.2f}s")
     
-    return jsonify({
+    body = {
         "emotion": song_emotion,
         "face_emotion": face_emotion,
         "confidence": round(confidence, 3),
         "songs": recommended_songs,
         "response_time": response_time,
-        "total_songs_considered": len(features),
+        "stage_timings_ms": timer.as_ms(),
+        "total_songs_considered": total_considered,
+        "cache": cache_status,
         "selection_type": "varied"  # Indicate varied selection
-    }), 200
+    }
+    if group_mode:
+        body["group"] = group or {"faces": 0}
+    return body, 200
 
 # ---------------- Reset recent songs ----------------
 @app.route("/api/reset-history", methods=["POST"])
@@ -325,66 +782,116 @@ def reset_history():
         return jsonify({"message": "History reset for your session"}), 200
     return jsonify({"message": "No history found"}), 200
 
+# ---------------- Cache admin ----------------
+# Admin routes outside /api/admin/* take X-Admin-Token = ADMIN_TOKEN. Without it
+# PROFILING_TOKEN is accepted; with neither set they answer 404.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "") or profiling.PROFILING_TOKEN
+
+@app.route("/api/cache/invalidate", methods=["POST"])
+def invalidate_cache():
+    """Force re-ranking after a catalog import (admin only)"""
+    if not profiling.authorized(request, ADMIN_TOKEN):
+        return jsonify({"error": "not found"}), 404
+    invalidate_catalog("manual")
+    return jsonify({"message": "Recommendation cache cleared", "stats": recommendation_cache.stats()}), 200
+
 # ---------------- Health check ----------------
+def collect_health():
+    """Runs on the refresh thread, never on a request"""
+    total_songs = db.estimated_song_count()
+    sample_songs = db.sample_songs(5, {"title": 1, "artist": 1})
+    sample_titles = [f"{s.get('title', 'Unknown')} - {s.get('artist', 'Unknown')}"
+                     for s in sample_songs]
+    return {"total_songs": total_songs, "sample_songs": sample_titles}
+
+health_snapshot = HealthSnapshot(collect_health)
+
+@app.route("/api/live", methods=["GET"])
+def live():
+    """Liveness probe: the process is up and serving, no database access"""
+    return jsonify({"status": "alive", "timestamp": datetime.now().isoformat()}), 200
+
+@app.route("/api/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 200 once models and the database client are loaded"""
+    if models_ready.is_set():
+        return jsonify({"status": "ready", "warmup": warmup_state}), 200
+    return jsonify({"status": "warming_up", "warmup": warmup_state}), 503
+
 @app.route("/api/health", methods=["GET"])
 def health():
-    """Health check endpoint"""
-    try:
-        total_songs = songs_collection.count_documents({})
-        
-        # Get some random sample songs
-        all_songs = list(songs_collection.find({}, {"title": 1, "artist": 1}))
-        if all_songs:
-            sample_songs = random.sample(all_songs, min(5, len(all_songs)))
-            sample_titles = [f"{s.get('title', 'Unknown')} - {s.get('artist', 'Unknown')}" 
-                           for s in sample_songs]
-        else:
-            sample_titles = []
-        
+    """Health check endpoint (served from the cached snapshot)"""
+    if not models_ready.is_set():
         return jsonify({
-            "status": "healthy",
+            "status": "starting",
             "timestamp": datetime.now().isoformat(),
-            "models": {
-                "face_emotions": emotion_labels,
-                "song_emotions": list(emotion_encoder.classes_),
-                "recommendation_strategy": "varied_with_randomization"
-            },
-            "database": {
-                "total_songs": total_songs,
-                "sample_songs": sample_titles,
-            },
-            "session": {
-                "active_sessions": len(recent_songs),
-                "max_recent_songs": MAX_RECENT_SONGS
-            }
-        }), 200
-    except Exception as e:
-        return jsonify({
-            "status": "unhealthy",
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }), 500
+            "warmup": warmup_state,
+        }), 503
+    database, snapshot = health_snapshot.get()
+    pool, pool_snapshot = song_pool.get()
+    healthy = health_snapshot.is_healthy()
+    body = {
+        "status": "healthy" if healthy else "unhealthy",
+        "timestamp": datetime.now().isoformat(),
+        "models": {
+            "face_emotions": emotion_labels,
+            "song_emotions": list(emotion_encoder.classes_),
+            "song_scorer": song_scorer_kind,
+            "recommendation_strategy": "varied_with_randomization"
+        },
+        "database": {
+            "total_songs": database.get("total_songs"),
+            "sample_songs": database.get("sample_songs", []),
+        },
+        "snapshot": snapshot,
+        "recommendation_cache": recommendation_cache.stats(),
+        "face_cache": {**face_cache.stats(), "hash_threshold": FACE_HASH_THRESHOLD},
+        "admission": scan_admission.stats(),
+        "shared_catalog": shared_catalog.stats() if shared_catalog else None,
+        "song_pool": {"songs": {e: len(c) for e, c in (pool or {}).items()}, "snapshot": pool_snapshot},
+        "session": {
+            "active_sessions": len(recent_songs),
+            "max_recent_songs": MAX_RECENT_SONGS
+        }
+    }
+    if not healthy:
+        body["error"] = snapshot["last_error"] or "health snapshot is stale"
+    return jsonify(body), 200 if healthy else 503
+
+# ---------------- Metrics ----------------
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
 # ---------------- Run ----------------
+start_warm_up()
+
 if __name__ == "__main__":
     print("\n" + "="*60)
     print("🎵 MOOD MUSIC RECOMMENDATION SYSTEM")
     print("="*60)
     print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"🎭 Face emotions: {emotion_labels}")
-    print(f"🎵 Song emotions: {list(emotion_encoder.classes_)}")
-    print(f"💿 Songs in database: {songs_collection.count_documents({})}")
+    print(f"🚦 Startup mode: {STARTUP_MODE} (warm-up: {warmup_state['stage']})")
     print("🎲 Recommendation strategy: VARIED WITH RANDOMIZATION")
     print("="*60)
     print("🌐 API Server: http://0.0.0.0:5000")
     print("📱 Frontend: http://192.168.18.240:5000")
     print("🔧 Endpoints:")
     print("   POST /api/scan-face    - Scan face and get varied songs")
+    print("                          {\"group\": true} blends the mood of every face")
     print("   POST /api/reset-history- Reset song history")
     print("   GET  /api/health       - System health check")
+    print("   GET  /api/live         - Liveness probe (no database)")
+    print("   GET  /api/ready        - Readiness probe (models loaded)")
+    print("   GET  /api/metrics      - Prometheus metrics")
+    print("   POST /api/cache/invalidate - Drop cached song rankings (ADMIN_TOKEN)")
+    print("   POST /api/admin/profile - Profile live traffic (PROFILING_TOKEN)")
     print("="*60 + "\n")
     
     # Seed random for reproducibility
     random.seed(datetime.now().timestamp())
     
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    # debug=True adds the reloader and debugger to every request; opt in with FLASK_DEBUG=1
+    app.run(host="0.0.0.0", port=5000, debug=os.environ.get("FLASK_DEBUG") == "1")
\ No newline at end of file
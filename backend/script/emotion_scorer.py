@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Compact song-emotion scorer: a quantized lookup grid over the five recommender
+# features (danceability, tempo, acousticness, energy, valence). Each feature is cut
+# into quantile bins plus the forest's most used split thresholds (which sit on the
+# infer_emotion rule thresholds); every grid cell stores the forest's predict_proba
+# at the cell's representative point. Scoring a catalog is five searchsorted calls and one gather,
+# instead of walking 150 trees per song.
+#
+# Built by distill_emotion_scorer.py, saved next to emotion_encoder.joblib and
+# loaded by emotion_api.py in place of the forest (same predict_proba contract).
+# Under SONG_SCORER=auto it is only used when its agreement report was made from
+# the song_recommender.joblib now on disk and shows it reproduces the forest's
+# labels on held-out songs closely enough (SCORER_MIN_AGREEMENT).
+
+DEFAULT_BINS = 8
+DEFAULT_SPLIT_EDGES = 4
+SCORER_MIN_AGREEMENT = float(os.environ.get("SCORER_MIN_AGREEMENT", "0.99"))
+
+def forest_split_edges(forest, n_features, per_feature=DEFAULT_SPLIT_EDGES, tolerance=0.005):
+    """
+    The `per_feature` split thresholds carrying the most samples across all trees.
+    Thresholds closer than `tolerance` x feature range are merged first.
+    """
+    found = [[] for _ in range(n_features)]
+    for tree in forest.estimators_:
+        t = tree.tree_
+        for f, threshold, weight in zip(t.feature, t.threshold, t.weighted_n_node_samples):
+            if f >= 0:
+                found[f].append((threshold, weight))
+
+    edges = []
+    for pairs in found:
+        if not pairs:
+            edges.append(np.empty(0))
+            continue
+        pairs.sort()
+        thresholds = np.array([p[0] for p in pairs])
+        weights = np.array([p[1] for p in pairs])
+        gap = tolerance * max(thresholds[-1] - thresholds[0], 1e-12)
+        groups = np.concatenate([[0], np.cumsum(np.diff(thresholds) > gap)])
+        mass = np.bincount(groups, weights=weights)
+        center = np.bincount(groups, weights=weights * thresholds) / mass
+        edges.append(np.sort(center[np.argsort(-mass)[:per_feature]]))
+    return edges
+
+class GridEmotionScorer:
+    def __init__(self, edges, table, classes):
+        self.edges = [np.asarray(e, dtype=np.float64) for e in edges]   # inner bin edges per feature
+        self.table = np.asarray(table, dtype=np.float32)                # (*bins, n_classes)
+        self.classes_ = np.asarray(classes)
+        self._flat = self.table.reshape(-1, self.table.shape[-1])
+        self._shape = self.table.shape[:-1]
+
+    def cells(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        idx = [np.searchsorted(e, X[:, j], side="right") for j, e in enumerate(self.edges)]
+        return np.ravel_multi_index(idx, self._shape)
+
+    def predict_proba(self, X):
+        return self._flat[self.cells(X)]
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    @classmethod
+    def fit(cls, forest, X, classes, bins=DEFAULT_BINS, split_edges=DEFAULT_SPLIT_EDGES, chunk=200_000):
+        """Quantile + split-threshold bins from X, cell values from forest.predict_proba at per-bin medians"""
+        X = np.asarray(X, dtype=np.float64)
+        splits = forest_split_edges(forest, X.shape[1], split_edges) if split_edges else [[]] * X.shape[1]
+        edges, centers = [], []
+        for j in range(X.shape[1]):
+            col = X[:, j]
+            quantiles = np.quantile(col, np.linspace(0, 1, bins + 1))[1:-1]
+            inner = np.unique(np.concatenate([quantiles, splits[j]]))
+            which = np.searchsorted(inner, col, side="right")
+            bounds = np.concatenate([[col.min()], inner, [col.max()]])
+            center = np.array([
+                np.median(col[which == b]) if np.any(which == b) else (bounds[b] + bounds[b + 1]) / 2
+                for b in range(len(inner) + 1)
+            ])
+            edges.append(inner)
+            centers.append(center)
+
+        shape = tuple(len(c) for c in centers)
+        grid = np.stack(np.meshgrid(*centers, indexing="ij"), axis=-1).reshape(-1, X.shape[1])
+        probs = np.concatenate([forest.predict_proba(grid[i:i + chunk]) for i in range(0, len(grid), chunk)])
+        return cls(edges, probs.reshape(*shape, probs.shape[1]), classes)
+
+    def to_dict(self):
+        return {"kind": "grid", "edges": self.edges, "table": self.table, "classes": list(self.classes_)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["edges"], data["table"], data["classes"])
+
+def report_path(scorer_path):
+    """emotion_scorer.joblib -> emotion_scorer.report.json (written by distill_emotion_scorer.py)"""
+    return os.path.splitext(scorer_path)[0] + ".report.json"
+
+def forest_fingerprint(forest_path, chunk_size=1 << 20):
+    """Size, mtime and SHA-256 of the forest file a grid was distilled from"""
+    digest = hashlib.sha256()
+    with open(forest_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    stat = os.stat(forest_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+
+def same_forest(recorded, forest_path):
+    """True when forest_path is the file `recorded` was taken from (hashed only if size/mtime moved)"""
+    if not recorded or not os.path.exists(forest_path):
+        return False
+    stat = os.stat(forest_path)
+    if recorded.get("size") == stat.st_size and recorded.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+    return recorded.get("sha256") == forest_fingerprint(forest_path)["sha256"]
+
+def use_grid_scorer(mode, scorer_path, min_agreement=SCORER_MIN_AGREEMENT, forest_path=None):
+    """
+    (use the grid?, reason) for SONG_SCORER=auto|grid|forest. forest_path: the
+    forest the grid stands in for (song_recommender.joblib next to the scorer).
+    """
+    if mode in ("grid", "forest"):
+        return mode == "grid", f"SONG_SCORER={mode}"
+    if not os.path.exists(scorer_path):
+        return False, "no distilled scorer"
+    try:
+        with open(report_path(scorer_path), "r", encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return False, "no agreement report next to the distilled scorer"
+    forest_path = forest_path or os.path.join(os.path.dirname(scorer_path), "song_recommender.joblib")
+    if not same_forest(report.get("forest"), forest_path):
+        return False, "distilled from a different song_recommender.joblib; rerun distill_emotion_scorer.py"
+    agreement = report.get("label_agreement")
+    if agreement is None or agreement < min_agreement:
+        return False, f"held-out label agreement {agreement} below {min_agreement}"
+    return True, f"held-out label agreement {agreement:.2%}"
+
+def agreement_report(reference, scorer, X, classes):
+    """How closely `scorer` reproduces `reference` (the forest) on X"""
+    import time
+    start = time.perf_counter()
+    ref = reference.predict_proba(X)
+    ref_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    got = scorer.predict_proba(X)
+    got_seconds = time.perf_counter() - start
+
+    ref_label, got_label = np.argmax(ref, axis=1), np.argmax(got, axis=1)
+    per_class = {}
+    for c, name in enumerate(classes):
+        mask = ref_label == c
+        per_class[str(name)] = {
+            "songs": int(mask.sum()),
+            "agreement": round(float(np.mean(got_label[mask] == c)), 4) if mask.any() else None,
+        }
+    # Ranking quality per target emotion: the forest's own probability for the scorer's
+    # top 20 vs for the forest's top 20 (ties make set overlap meaningless)
+    top20 = {}
+    k = min(20, len(X))
+    for c, name in enumerate(classes):
+        ref_top = np.argsort(-ref[:, c], kind="stable")[:k]
+        got_top = np.argsort(-got[:, c], kind="stable")[:k]
+        top20[str(name)] = {
+            "forest_top20": round(float(ref[ref_top, c].mean()), 4),
+            "scorer_top20": round(float(ref[got_top, c].mean()), 4),
+        }
+
+    return {
+        "songs": int(len(X)),
+        "label_agreement": round(float(np.mean(ref_label == got_label)), 4),
+        "mean_abs_prob_diff": round(float(np.mean(np.abs(ref - got))), 4),
+        "max_abs_prob_diff": round(float(np.max(np.abs(ref - got))), 4),
+        "per_class": per_class,
+        "top20_forest_probability": top20,
+        "forest_seconds": round(ref_seconds, 4),
+        "scorer_seconds": round(got_seconds, 4),
+        "speedup": round(ref_seconds / got_seconds, 1) if got_seconds > 0 else None,
+    }
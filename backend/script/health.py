@@ -0,0 +1,73 @@
+# Cached health data for load-balancer probes
+# A daemon thread refreshes a snapshot on an interval, so /api/health and
+# /api/test never put database work on the request path.
+
+import os
+import threading
+import time
+from datetime import datetime
+
+HEALTH_REFRESH_SECONDS = float(os.environ.get("HEALTH_REFRESH_SECONDS", "10"))
+
+
+class HealthSnapshot:
+    """Holds the last result of `collect()` and refreshes it in the background"""
+
+    def __init__(self, collect, interval=HEALTH_REFRESH_SECONDS, name="health-refresh"):
+        self._collect = collect
+        self.interval = interval
+        self._name = name
+        self._lock = threading.Lock()
+        self._data = {}
+        self._error = "not collected yet"
+        self._updated_at = None        # monotonic
+        self._updated_iso = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def refresh(self):
+        try:
+            data = self._collect()
+            error = None
+        except Exception as e:
+            data, error = None, str(e)
+        with self._lock:
+            if data is not None:
+                self._data = data
+                self._updated_at = time.monotonic()
+                self._updated_iso = datetime.now().isoformat()
+            self._error = error
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def get(self):
+        """Return (data, meta) without touching the database"""
+        with self._lock:
+            age = None if self._updated_at is None else time.monotonic() - self._updated_at
+            meta = {
+                "refreshed_at": self._updated_iso,
+                "age_seconds": None if age is None else round(age, 3),
+                "refresh_interval_seconds": self.interval,
+                "last_error": self._error,
+            }
+            return dict(self._data), meta
+
+    def is_healthy(self):
+        """Healthy while the last refresh succeeded and the data is not stale"""
+        with self._lock:
+            if self._updated_at is None or self._error is not None:
+                return False
+            return time.monotonic() - self._updated_at <= 3 * self.interval
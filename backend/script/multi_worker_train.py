@@ -0,0 +1,174 @@
+# Run train_emotion_model.py as N local data-parallel workers
+# Starts one process per worker on this machine with a TF_CONFIG describing a
+# localhost cluster (MultiWorkerMirroredStrategy), splits the CPU cores between
+# them, and waits for all of them. With several --workers values the runs are
+# repeated for each N and a scaling report compares phase-2 throughput:
+#
+#   efficiency(N) = images_per_second(N) / (N * images_per_second(1))
+#
+#   python multi_worker_train.py --workers 1 2 4 -- --pack-dir packs/faces --freeze-epochs 1 --epochs 3
+#
+# Everything after "--" is passed to train_emotion_model.py. Each run writes its
+# model (re-exported so Keras 3 / emotion_api can load it), labels, run report and
+# worker logs to <out-dir>/workers-<N>/. Adding --resume after "--" continues each
+# run from its <out-dir>/workers-<N>/emotion_cnn.state/.
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+TRAIN_SCRIPT = SCRIPT_DIR / "train_emotion_model.py"
+LAUNCH_ATTEMPTS = 3             # relaunches when a worker loses its port to another process
+POLL_SECONDS = 0.5
+BIND_ERRORS = ("Address already in use", "Failed to add port", "Could not start gRPC server")
+
+
+def free_ports(count):
+    """Ports the OS considers free right now (bound then released)"""
+    sockets, ports = [], []
+    for _ in range(count):
+        s = socket.socket()
+        s.bind(("localhost", 0))
+        sockets.append(s)
+        ports.append(s.getsockname()[1])
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def has_flag(args, name):
+    return any(a == name or a.startswith(name + "=") for a in args)
+
+
+def start_workers(workers, args, out_dir):
+    """Start every worker with a fresh localhost TF_CONFIG; returns [(process, log file)]"""
+    cluster = {"worker": [f"localhost:{p}" for p in free_ports(workers)]}
+    procs = []
+    for index in range(workers):
+        env = dict(os.environ, TF_CONFIG=json.dumps({"cluster": cluster, "task": {"type": "worker", "index": index}}))
+        log = open(out_dir / f"worker-{index}.log", "w", encoding="utf-8")
+        procs.append((subprocess.Popen([sys.executable, str(TRAIN_SCRIPT), *args], env=env, cwd=SCRIPT_DIR,
+                                       stdout=log, stderr=subprocess.STDOUT), log))
+    return procs
+
+
+def wait_workers(procs):
+    """
+    Index of the first worker that exited non-zero (the others are killed right
+    away: they would block forever in collectives waiting for it), or None.
+    """
+    failed = None
+    while failed is None and any(proc.poll() is None for proc, _ in procs):
+        failed = next((i for i, (proc, _) in enumerate(procs) if proc.poll() not in (None, 0)), None)
+        if failed is None:
+            time.sleep(POLL_SECONDS)
+    if failed is None:
+        failed = next((i for i, (proc, _) in enumerate(procs) if proc.returncode != 0), None)
+    for proc, log in procs:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        log.close()
+    return failed
+
+
+def failed_to_bind(log_path):
+    with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    return any(marker in text for marker in BIND_ERRORS)
+
+
+def run_cluster(workers, train_args, out_dir, cores):
+    """Train with `workers` local processes; returns the chief's run report"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    args = list(train_args)
+    if not has_flag(args, "--intra-op-threads"):
+        # Split the cores so N workers do not oversubscribe the machine
+        args += ["--intra-op-threads", str(max(1, cores // workers))]
+    args += [
+        "--model-path", str(out_dir / "emotion_cnn.keras"),
+        "--labels-path", str(out_dir / "emotion_cnn.labels.json"),
+        "--run-report", str(out_dir / "run_report.json"),
+    ]
+
+    start = time.perf_counter()
+    for attempt in range(1, LAUNCH_ATTEMPTS + 1):
+        procs = start_workers(workers, args, out_dir)
+        print(f"🌐 {workers} worker(s) started, logs in {out_dir}")
+        failed = wait_workers(procs)
+        if failed is None:
+            break
+        log_path = out_dir / f"worker-{failed}.log"
+        # free_ports() releases the ports before the workers bind them, so another
+        # process can take one in between; that is worth a retry with new ports
+        if attempt < LAUNCH_ATTEMPTS and failed_to_bind(log_path):
+            print(f"⚠️ Worker {failed} could not bind its port, relaunching ({attempt}/{LAUNCH_ATTEMPTS})")
+            continue
+        raise RuntimeError(f"Worker {failed} failed, see {log_path}")
+
+    with open(out_dir / "run_report.json", "r", encoding="utf-8") as f:
+        report = json.load(f)
+    report["wall_seconds"] = round(time.perf_counter() - start, 2)
+
+    # The workers save in tf_keras format; rebuild the model as Keras 3 for emotion_api
+    export = subprocess.run([sys.executable, str(TRAIN_SCRIPT), *args, "--export-weights", report["weights_path"]],
+                            cwd=SCRIPT_DIR, capture_output=True, text=True)
+    if export.returncode != 0:
+        raise RuntimeError(f"Export of {report['weights_path']} failed:\n{export.stderr[-2000:]}")
+    print(f"✅ {workers} worker(s): {report['phase2_images_per_second']} img/s (phase 2), "
+          f"{report['wall_seconds']}s wall")
+    return report
+
+
+def scaling_report(reports):
+    base = reports[0]
+    base_rate = base["phase2_images_per_second"] / base["workers"]
+    rows = []
+    for r in reports:
+        rate = r["phase2_images_per_second"]
+        rows.append({
+            "workers": r["workers"],
+            "global_batch_size": r["global_batch_size"],
+            "images_per_second": rate,
+            "speedup": round(rate / base["phase2_images_per_second"], 3) if rate else None,
+            "efficiency": round(rate / (r["workers"] * base_rate), 3) if rate else None,
+            "phase2_epoch_seconds": r["phase2_epoch_seconds"],
+            "wall_seconds": r["wall_seconds"],
+        })
+    return rows
+
+
+def main():
+    argv = sys.argv[1:]
+    train_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, train_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description="Local multi-worker training and scaling report")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2], help="worker counts to run, e.g. 1 2 4")
+    parser.add_argument("--out-dir", default="models/multi_worker")
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 1, help="CPU cores shared by the workers")
+    args = parser.parse_args(argv)
+
+    out_root = Path(args.out_dir).resolve()
+    reports = [run_cluster(n, train_args, out_root / f"workers-{n}", args.cores) for n in sorted(args.workers)]
+    if len(reports) > 1:
+        rows = scaling_report(reports)
+        print("\n📈 Scaling (phase 2 throughput, relative to the smallest run)")
+        for row in rows:
+            print(f"   {row['workers']:>2} workers: {row['images_per_second']:>8} img/s  "
+                  f"speedup {row['speedup']}  efficiency {row['efficiency']}")
+        with open(out_root / "scaling_report.json", "w", encoding="utf-8") as f:
+            json.dump({"cores": args.cores, "train_args": train_args, "runs": rows}, f, indent=2)
+        print(f"✅ Scaling report saved to: {out_root / 'scaling_report.json'}")
+
+
+if __name__ == "__main__":
+    main()
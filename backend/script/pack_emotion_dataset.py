@@ -0,0 +1,177 @@
+# Pack the face dataset into memory-mapped NumPy shards
+# Decodes + resizes every image ONCE so training epochs only read raw uint8 arrays.
+#
+# Layout written to <out_dir>:
+#   manifest.json                 class names, image size, per-split class counts, shard list
+#   train-00000.images.npy        uint8 (n, H, W, 3)
+#   train-00000.labels.npy        uint8 (n,) class index
+#   val-00000.images.npy ...
+#
+# Packing again into the same dir removes the previous shards and the tf.data
+# caches (tfcache-*) that train_emotion_model.py built from them.
+
+import argparse
+import hashlib
+import json
+import time
+from pathlib import Path
+import numpy as np
+import tensorflow as tf
+
+# ---------------- CONFIG ----------------
+IMG_SIZE = (224, 224)
+VAL_SPLIT = 0.1
+SEED = 42
+SHARD_SIZE = 4096
+MANIFEST_NAME = "manifest.json"
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif"}
+# ---------------------------------------
+
+
+def list_files(faces_dir):
+    """Same class order as image_dataset_from_directory (sorted folder names)"""
+    faces_dir = Path(faces_dir)
+    class_names = sorted(p.name for p in faces_dir.iterdir() if p.is_dir())
+    files, labels = [], []
+    for idx, name in enumerate(class_names):
+        for path in sorted((faces_dir / name).iterdir()):
+            if path.suffix.lower() in IMAGE_EXTENSIONS:
+                files.append(str(path))
+                labels.append(idx)
+    return class_names, files, np.array(labels, dtype=np.uint8)
+
+
+def decode_resize(path, img_size):
+    raw = tf.io.read_file(path)
+    img = tf.io.decode_image(raw, channels=3, expand_animations=False)
+    img = tf.image.resize(img, img_size)
+    return tf.cast(tf.clip_by_value(tf.round(img), 0, 255), tf.uint8)
+
+
+def write_split(out_dir, split, files, labels, img_size, shard_size):
+    """Decode a split in parallel with tf.data and stream it into .npy shards"""
+    ds = tf.data.Dataset.from_tensor_slices(files)
+    ds = ds.map(lambda p: decode_resize(p, img_size), num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.batch(256).prefetch(tf.data.AUTOTUNE)
+
+    shards = []
+    shard_idx, written, images_mm = -1, 0, None
+    pos = 0
+    for batch in ds:
+        batch = batch.numpy()
+        i = 0
+        while i < len(batch):
+            if images_mm is None or written == len(images_mm):
+                shard_idx += 1
+                n = min(shard_size, len(files) - pos)
+                stem = f"{split}-{shard_idx:05d}"
+                images_mm = np.lib.format.open_memmap(
+                    out_dir / f"{stem}.images.npy", mode="w+",
+                    dtype=np.uint8, shape=(n, *img_size, 3),
+                )
+                np.save(out_dir / f"{stem}.labels.npy", labels[pos:pos + n])
+                shards.append({"images": f"{stem}.images.npy", "labels": f"{stem}.labels.npy", "count": n})
+                written = 0
+            take = min(len(batch) - i, len(images_mm) - written)
+            images_mm[written:written + take] = batch[i:i + take]
+            written += take
+            pos += take
+            i += take
+            if written == len(images_mm):
+                images_mm.flush()
+    if images_mm is not None:
+        images_mm.flush()
+    return shards
+
+
+def clear_previous_pack(out_dir):
+    """Old shards and tf.data caches would otherwise be read as if they were this pack"""
+    stale = [*out_dir.glob("tfcache-*"), *out_dir.glob("train-*.npy"), *out_dir.glob("val-*.npy")]
+    for path in stale:
+        path.unlink()
+    (out_dir / MANIFEST_NAME).unlink(missing_ok=True)
+    if stale:
+        print(f"🧹 Removed {len(stale)} file(s) of the previous pack in {out_dir}")
+
+
+def pack_dataset(faces_dir, out_dir, img_size=IMG_SIZE, val_split=VAL_SPLIT,
+                 seed=SEED, shard_size=SHARD_SIZE):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    clear_previous_pack(out_dir)
+
+    start = time.perf_counter()
+    class_names, files, labels = list_files(faces_dir)
+    num_classes = len(class_names)
+    print("✅ Detected classes (order):", class_names)
+    print(f"📂 {len(files)} images found")
+
+    order = np.random.default_rng(seed).permutation(len(files))
+    n_val = int(len(files) * val_split)
+    splits = {"val": order[:n_val], "train": order[n_val:]}
+
+    manifest = {
+        "class_names": class_names,
+        "img_size": list(img_size),
+        "source": str(faces_dir),
+        "seed": seed,
+        "packed_at": time.time(),
+        "splits": {},
+    }
+    for split, idx in splits.items():
+        split_files = [files[i] for i in idx]
+        split_labels = labels[idx]
+        shards = write_split(out_dir, split, split_files, split_labels, img_size, shard_size)
+        counts = np.bincount(split_labels, minlength=num_classes)
+        manifest["splits"][split] = {
+            "count": int(len(idx)),
+            "class_counts": counts.tolist(),
+            "shards": shards,
+        }
+        print(f"✅ {split}: {len(idx)} images in {len(shards)} shard(s), class counts {counts.tolist()}")
+
+    with open(out_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"✅ Pack written to {out_dir} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def load_manifest(pack_dir):
+    with open(Path(pack_dir) / MANIFEST_NAME, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def manifest_digest(manifest):
+    """Short hash identifying one pack; every repack gets a new one (packed_at)"""
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def iter_split(pack_dir, manifest, split):
+    """Yield (uint8 image, class index) from the memory-mapped shards of a split"""
+    pack_dir = Path(pack_dir)
+    for shard in manifest["splits"][split]["shards"]:
+        images = np.load(pack_dir / shard["images"], mmap_mode="r")
+        labels = np.load(pack_dir / shard["labels"])
+        for i in range(len(labels)):
+            yield images[i], labels[i]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack face images into memory-mapped shards")
+    parser.add_argument("faces_dir", help="folder with one sub-folder per emotion")
+    parser.add_argument("out_dir", help="where to write the pack")
+    parser.add_argument("--img-size", type=int, default=IMG_SIZE[0])
+    parser.add_argument("--val-split", type=float, default=VAL_SPLIT)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    args = parser.parse_args()
+
+    pack_dataset(
+        args.faces_dir,
+        args.out_dir,
+        img_size=(args.img_size, args.img_size),
+        val_split=args.val_split,
+        seed=args.seed,
+        shard_size=args.shard_size,
+    )
@@ -0,0 +1,309 @@
+# On-demand profiling for the Flask APIs
+# Admin-only endpoints that profile live traffic without a restart or debugger:
+#
+#   POST /api/admin/profile?mode=sample&seconds=10      collapsed stacks (flamegraph.pl / speedscope)
+#   POST /api/admin/profile?mode=cprofile&seconds=10    pstats text, or ?format=prof for snakeviz
+#   GET  /api/admin/slow-requests                       recent requests over SLOW_REQUEST_MS
+#
+# The endpoints are disabled unless PROFILING_TOKEN is set; callers send it in
+# the X-Admin-Token header. Malformed seconds / interval_ms / limit / sort values
+# get a 400; interval_ms is floored at MIN_SAMPLE_MS. With SLOW_REQUEST_MS > 0 a
+# low-rate sampler watches in-flight requests and keeps the stacks of any request
+# slower than the threshold.
+
+import collections
+import cProfile
+import hmac
+import io
+import math
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))  # 0 = off
+SLOW_SAMPLE_MS = float(os.environ.get("SLOW_SAMPLE_MS", "10"))
+SLOW_TRACE_KEEP = int(os.environ.get("SLOW_TRACE_KEEP", "50"))
+MIN_SAMPLE_MS = 1.0   # floor for interval_ms / SLOW_SAMPLE_MS; 0 would spin the sampler
+SORT_KEYS = sorted(pstats.Stats.sort_arg_dict_default)   # accepted ?sort= values
+
+_session_lock = threading.Lock()  # one capture at a time per process
+
+
+# ---------------- Stack sampling ----------------
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    """Root-first 'a;b;c' stack for one frame"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def render_collapsed(counts):
+    """Brendan Gregg's folded format: one 'stack count' line per unique stack"""
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+def sample_threads(seconds, interval, include_idle=False):
+    """Sample every other thread's stack; returns (Counter of stacks, number of ticks)"""
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    counts = collections.Counter()
+    ticks = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            stack = collapse(frame)
+            # Threads parked in the server's accept loop or a sleeping refresher are noise
+            if not include_idle and _is_idle(frame):
+                continue
+            counts[f"{names.get(tid, tid)};{stack}"] += 1
+        ticks += 1
+        time.sleep(interval)
+    return counts, ticks
+
+
+_IDLE_FUNCTIONS = {"wait", "select", "accept", "sleep", "_wait_for_tstate_lock", "serve_forever", "poll"}
+
+
+def _is_idle(frame):
+    return frame.f_code.co_name in _IDLE_FUNCTIONS
+
+
+# ---------------- cProfile over live requests ----------------
+class RequestProfiles:
+    """Merges one cProfile.Profile per request into a single pstats.Stats"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = None
+        self.profiled = 0
+        self.skipped = 0
+
+    def add(self, profile):
+        with self.lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            self.profiled += 1
+
+
+_cprofile_session = None  # RequestProfiles while a cprofile capture runs
+
+
+# ---------------- Slow-request trace ----------------
+class SlowRequestTracer:
+    """Samples only threads that are serving a request; keeps stacks of slow ones"""
+
+    def __init__(self, threshold_ms, interval_ms, keep):
+        self.threshold = threshold_ms / 1000
+        self.interval = max(interval_ms, MIN_SAMPLE_MS) / 1000
+        self.active = {}  # thread id -> Counter of stacks
+        self.lock = threading.Lock()
+        self.recent = collections.deque(maxlen=keep)
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="slow-request-sampler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                tids = list(self.active)
+            if not tids:
+                continue
+            frames = sys._current_frames()
+            with self.lock:
+                for tid in tids:
+                    if tid in frames and tid in self.active:
+                        self.active[tid][collapse(frames[tid])] += 1
+
+    def begin(self):
+        with self.lock:
+            self.active[threading.get_ident()] = collections.Counter()
+
+    def end(self, elapsed, method, path, status):
+        with self.lock:
+            counts = self.active.pop(threading.get_ident(), None)
+        if counts is None or elapsed < self.threshold:
+            return
+        trace = {
+            "timestamp": datetime.now().isoformat(),
+            "method": method,
+            "path": path,
+            "status": status,
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "samples": sum(counts.values()),
+            "sample_interval_ms": self.interval * 1000,
+            "collapsed": render_collapsed(counts),
+        }
+        self.recent.append(trace)
+        top = counts.most_common(1)
+        hot = top[0][0].rsplit(";", 1)[-1] if top else "no samples"
+        print(f"🐢 Slow request {method} {path}: {trace['elapsed_ms']} ms (hottest frame: {hot})")
+
+
+slow_tracer = SlowRequestTracer(SLOW_REQUEST_MS, SLOW_SAMPLE_MS, SLOW_TRACE_KEEP) if SLOW_REQUEST_MS > 0 else None
+
+
+# ---------------- Flask wiring ----------------
+def authorized(request, token=None):
+    """X-Admin-Token matches `token` (PROFILING_TOKEN by default); an unset token denies everyone"""
+    token = PROFILING_TOKEN if token is None else token
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token)
+
+
+def profile_args(args):
+    """(options, error) for /api/admin/profile query parameters; error is a 400 message"""
+    try:
+        seconds = float(args.get("seconds", "10"))
+        interval_ms = float(args.get("interval_ms", "5"))
+        limit = int(args.get("limit", "60"))
+    except ValueError:
+        return None, "seconds and interval_ms must be numbers, limit an integer"
+    if not (math.isfinite(seconds) and seconds > 0):
+        return None, "seconds must be a positive number"
+    if not (math.isfinite(interval_ms) and interval_ms >= 0):
+        return None, "interval_ms must be a non-negative number"
+    if limit <= 0:
+        return None, "limit must be a positive integer"
+    sort = args.get("sort", "cumulative")
+    if sort not in SORT_KEYS:
+        return None, f"sort must be one of {', '.join(SORT_KEYS)}"
+    return {
+        "seconds": min(seconds, PROFILE_MAX_SECONDS),
+        "interval": max(interval_ms, MIN_SAMPLE_MS) / 1000,
+        "limit": limit,
+        "sort": sort,
+    }, None
+
+
+def install(app):
+    """Register the request hooks and /api/admin/* routes on a Flask app"""
+    from flask import Response, g, jsonify, request
+
+    if slow_tracer is not None:
+        slow_tracer.start()
+
+    @app.before_request
+    def _profile_begin():
+        g.profile_start = time.perf_counter()
+        if slow_tracer is not None:
+            slow_tracer.begin()
+        session = _cprofile_session
+        if session is not None and not request.path.startswith("/api/admin/"):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another profiler already owns this thread
+                session.skipped += 1
+                return
+            g.profile = (session, profile)
+
+    @app.teardown_request
+    def _profile_end(exc):
+        pair = g.pop("profile", None)
+        if pair is not None:
+            session, profile = pair
+            profile.disable()
+            session.add(profile)
+        if slow_tracer is not None and "profile_start" in g:
+            status = 500 if exc is not None else getattr(g, "profile_status", None)
+            slow_tracer.end(time.perf_counter() - g.profile_start, request.method, request.path, status)
+
+    @app.after_request
+    def _profile_status(response):
+        g.profile_status = response.status_code
+        return response
+
+    @app.route("/api/admin/profile", methods=["POST"])
+    def admin_profile():
+        """Profile live traffic for ?seconds= (sampler or cProfile)"""
+        global _cprofile_session
+        if not authorized(request):
+            return jsonify({"error": "not found"}), 404
+
+        mode = request.args.get("mode", "sample")
+        if mode not in ("sample", "cprofile"):
+            return jsonify({"error": "mode must be 'sample' or 'cprofile'"}), 400
+        options, error = profile_args(request.args)
+        if error:
+            return jsonify({"error": error}), 400
+        seconds = options["seconds"]
+        if not _session_lock.acquire(blocking=False):
+            return jsonify({"error": "a profile capture is already running"}), 409
+
+        try:
+            print(f"🔬 Profiling ({mode}) for {seconds}s")
+            if mode == "sample":
+                include_idle = request.args.get("idle", "0") == "1"
+                counts, ticks = sample_threads(seconds, options["interval"], include_idle)
+                response = Response(render_collapsed(counts), content_type="text/plain; charset=utf-8")
+                response.headers["X-Profile-Samples"] = str(ticks)
+                return response
+
+            session = RequestProfiles()
+            _cprofile_session = session
+            try:
+                time.sleep(seconds)
+            finally:
+                _cprofile_session = None
+            # Requests still in flight merge themselves into `session` when they finish
+            with session.lock:
+                if session.stats is None:
+                    return jsonify({"error": "no requests were served while profiling",
+                                    "skipped": session.skipped}), 200
+                if request.args.get("format") == "prof":
+                    with tempfile.NamedTemporaryFile(suffix=".prof", delete=False) as f:
+                        path = f.name
+                    try:
+                        session.stats.dump_stats(path)
+                        with open(path, "rb") as f:
+                            data = f.read()
+                    finally:
+                        os.remove(path)
+                    return Response(data, content_type="application/octet-stream", headers={
+                        "Content-Disposition": "attachment; filename=profile.prof"})
+                out = io.StringIO()
+                session.stats.stream = out
+                session.stats.sort_stats(options["sort"])
+                session.stats.print_stats(options["limit"])
+                response = Response(out.getvalue(), content_type="text/plain; charset=utf-8")
+                response.headers["X-Profile-Requests"] = str(session.profiled)
+                response.headers["X-Profile-Skipped"] = str(session.skipped)
+                return response
+        finally:
+            _session_lock.release()
+
+    @app.route("/api/admin/slow-requests", methods=["GET"])
+    def admin_slow_requests():
+        """Most recent slow-request traces (collapsed stacks per request)"""
+        if not authorized(request):
+            return jsonify({"error": "not found"}), 404
+        if slow_tracer is None:
+            return jsonify({"enabled": False, "traces": []}), 200
+        return jsonify({
+            "enabled": True,
+            "threshold_ms": SLOW_REQUEST_MS,
+            "sample_interval_ms": SLOW_SAMPLE_MS,
+            "traces": list(slow_tracer.recent),
+        }), 200
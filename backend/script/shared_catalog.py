@@ -0,0 +1,207 @@
+# Shared catalog arrays for multi-worker emotion_api deployments
+# One publisher process scores the catalog once and writes it as a generation
+# of memory-mapped files (under /dev/shm by default, so the pages live in shared
+# memory); every API worker maps the same pages read-only instead of holding its
+# own song list, feature matrix and probabilities.
+#
+#   <root>/gen-000042/features.npy       float32 (n, 5)  danceability, tempo, acousticness, energy, valence
+#   <root>/gen-000042/probabilities.npy  float32 (n, classes)  recommender predict_proba
+#   <root>/gen-000042/meta.bin           UTF-8 JSON [_id, title, artist, album] per song, concatenated
+#   <root>/gen-000042/offsets.npy        int64 (n + 1) byte offsets into meta.bin
+#   <root>/gen-000042/info.json          classes, count, catalog version
+#   <root>/CURRENT                       generation number, swapped atomically (os.replace)
+#
+# A generation is never modified after CURRENT points at it; readers switch on
+# their next request and older generations are unlinked once two newer ones
+# exist (mapped pages stay valid for readers that still hold them).
+#
+#   SHARED_CATALOG_DIR=/dev/shm/moodmusic-catalog python shared_catalog.py   # publisher
+
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_ROOT = "/dev/shm/moodmusic-catalog" if os.path.isdir("/dev/shm") else \
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "shared_catalog")
+SHARED_CATALOG_DIR = os.environ.get("SHARED_CATALOG_DIR", "")
+SHARED_CATALOG_KEEP = int(os.environ.get("SHARED_CATALOG_KEEP", "2"))   # generations left on disk
+PUBLISH_POLL_SECONDS = float(os.environ.get("CATALOG_POLL_SECONDS", "5"))
+
+FEATURE_FIELDS = ["danceability", "tempo", "acousticness", "energy", "valence"]
+FEATURE_DEFAULTS = [0.5, 120.0, 0.5, 0.5, 0.5]
+META_FIELDS = ["_id", "title", "artist", "album"]
+
+def song_features(songs, dtype=np.float64):
+    """(X, valid_songs): recommender features per song, songs with unparseable values skipped"""
+    features, valid_songs = [], []
+    for song in songs:
+        try:
+            features.append([float(song.get(f, d)) for f, d in zip(FEATURE_FIELDS, FEATURE_DEFAULTS)])
+            valid_songs.append(song)
+        except (TypeError, ValueError):
+            continue
+    X = np.array(features, dtype=dtype).reshape(-1, len(FEATURE_FIELDS))
+    return X, valid_songs
+
+def _generation_dir(root, generation):
+    return os.path.join(root, f"gen-{generation:06d}")
+
+def current_generation(root):
+    try:
+        with open(os.path.join(root, "CURRENT"), "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+def publish(root, songs, recommender, classes, version=None):
+    """Score `songs` with `recommender` and publish them as the next generation; returns it"""
+    X, valid_songs = song_features(songs, np.float32)
+    probabilities = recommender.predict_proba(X).astype(np.float32) if len(X) else \
+        np.empty((0, len(classes)), dtype=np.float32)
+
+    generation = current_generation(root) + 1
+    gen_dir = _generation_dir(root, generation)
+    shutil.rmtree(gen_dir, ignore_errors=True)   # leftover of an interrupted publish
+    os.makedirs(gen_dir)
+
+    blobs = [
+        json.dumps([None if s.get(f) is None else str(s.get(f)) for f in META_FIELDS],
+                   ensure_ascii=False).encode("utf-8")
+        for s in valid_songs
+    ]
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    with open(os.path.join(gen_dir, "meta.bin"), "wb") as f:
+        f.write(b"".join(blobs))
+    np.save(os.path.join(gen_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(gen_dir, "features.npy"), X)
+    np.save(os.path.join(gen_dir, "probabilities.npy"), probabilities)
+    with open(os.path.join(gen_dir, "info.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "generation": generation,
+            "count": len(valid_songs),
+            "classes": [str(c) for c in classes],
+            "version": version,
+            "published_at": time.time(),
+        }, f)
+
+    # Atomic swap: readers see either the old or the new generation number
+    tmp = os.path.join(root, f"CURRENT.{os.getpid()}")
+    with open(tmp, "w") as f:
+        f.write(str(generation))
+    os.replace(tmp, os.path.join(root, "CURRENT"))
+
+    for name in os.listdir(root):
+        if name.startswith("gen-") and int(name[4:]) <= generation - SHARED_CATALOG_KEEP:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    print(f"📡 Shared catalog generation {generation}: {len(valid_songs)} songs -> {gen_dir}")
+    return generation
+
+class SongRows:
+    """Read-only sequence of song dicts decoded on access from the shared metadata"""
+
+    def __init__(self, meta, offsets, features):
+        self._meta = meta
+        self._offsets = offsets
+        self._features = features
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        i = int(i)
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        values = json.loads(bytes(self._meta[start:end]).decode("utf-8"))
+        song = {f: v for f, v in zip(META_FIELDS, values) if v is not None}
+        song.update(zip(FEATURE_FIELDS, (float(v) for v in self._features[i])))
+        return song
+
+class CatalogView:
+    """Zero-copy, read-only arrays of one published generation"""
+
+    def __init__(self, gen_dir):
+        with open(os.path.join(gen_dir, "info.json"), "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        self.generation = self.info["generation"]
+        self.classes = self.info["classes"]
+        self.features = np.load(os.path.join(gen_dir, "features.npy"), mmap_mode="r")
+        self.probabilities = np.load(os.path.join(gen_dir, "probabilities.npy"), mmap_mode="r")
+        offsets = np.load(os.path.join(gen_dir, "offsets.npy"), mmap_mode="r")
+        meta = np.memmap(os.path.join(gen_dir, "meta.bin"), dtype=np.uint8, mode="r") \
+            if offsets[-1] > 0 else np.empty(0, dtype=np.uint8)
+        self.songs = SongRows(meta, offsets, self.features)
+
+class SharedCatalog:
+    """Worker side: the newest published generation, re-attached when CURRENT changes"""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._view = None
+        self._current_stat = None
+
+    def current(self):
+        """CatalogView of the live generation, or None if nothing has been published"""
+        try:
+            stat = os.stat(os.path.join(self.root, "CURRENT"))
+        except OSError:
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp == self._current_stat:
+            return self._view
+        with self._lock:
+            if stamp != self._current_stat:
+                generation = current_generation(self.root)
+                if self._view is None or self._view.generation != generation:
+                    try:
+                        self._view = CatalogView(_generation_dir(self.root, generation))
+                        print(f"📡 Attached shared catalog generation {generation} ({len(self._view.songs)} songs)")
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"⚠️ Shared catalog generation {generation} unreadable: {e}")
+                        return self._view
+                self._current_stat = stamp
+        return self._view
+
+    def stats(self):
+        view = self._view
+        if view is None:
+            return {"root": self.root, "generation": None}
+        return {"root": self.root, "generation": view.generation, "songs": len(view.songs),
+                "version": view.info.get("version")}
+
+def load_recommender():
+    """The same song scorer emotion_api would load (SONG_SCORER), plus the emotion classes"""
+    import joblib
+    model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+    encoder = joblib.load(os.path.join(model_dir, "emotion_encoder.joblib"))
+    scorer_path = os.path.join(model_dir, "emotion_scorer.joblib")
+    from emotion_scorer import GridEmotionScorer, use_grid_scorer
+    if use_grid_scorer(os.environ.get("SONG_SCORER", "auto"), scorer_path)[0]:
+        recommender = GridEmotionScorer.from_dict(joblib.load(scorer_path))
+    else:
+        recommender = joblib.load(os.path.join(model_dir, "song_recommender.joblib"))
+    return recommender, list(encoder.classes_)
+
+def run_publisher(root, poll_seconds=PUBLISH_POLL_SECONDS):
+    """Publish now, then again whenever db.catalog_fingerprint() changes"""
+    import db
+    os.makedirs(root, exist_ok=True)
+    recommender, classes = load_recommender()
+    published = None
+    while True:
+        try:
+            version = db.catalog_fingerprint()
+            if version != published:
+                publish(root, db.fetch_scan_catalog(), recommender, classes, version)
+                published = version
+        except Exception as e:
+            print(f"⚠️ Catalog publish failed: {e}")
+        time.sleep(poll_seconds)
+
+if __name__ == "__main__":
+    run_publisher(sys.argv[1] if len(sys.argv) > 1 else (SHARED_CATALOG_DIR or DEFAULT_ROOT))
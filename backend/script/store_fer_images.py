@@ -1,37 +1,191 @@
-from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import hashlib
 import gridfs
 import os
+import time
+import db
 
 # -----------------------------
-# MongoDB Connection
+# Defaults
 # -----------------------------
-client = MongoClient("mongodb://localhost:27017/")
-db = client["musicDB"]
+GRIDFS_COLLECTION = "image"            # musicDB.image.files / musicDB.image.chunks
+INLINE_COLLECTION = "image_inline"     # small images stored as plain documents
+DATASET_NAME = "FER-2013"
+
+# Images up to one GridFS chunk fit comfortably in a regular document,
+# so chunking them only costs an extra round trip and a second collection.
+INLINE_MAX_BYTES = 255 * 1024
+BATCH_SIZE = 500
+WORKERS = 8
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+# -----------------------------
+# Dataset walk
+# -----------------------------
+def list_images(dataset_path):
+    """Return (relative_path, emotion) for every image under <dataset>/<emotion>/"""
+    items = []
+    for emotion in sorted(os.listdir(dataset_path)):
+        emotion_path = os.path.join(dataset_path, emotion)
+        if not os.path.isdir(emotion_path):
+            continue
+        for img_name in sorted(os.listdir(emotion_path)):
+            if os.path.splitext(img_name)[1].lower() in IMAGE_EXTENSIONS:
+                items.append((f"{emotion}/{img_name}", emotion))
+    return items
+
+
+def read_image(dataset_path, rel_path):
+    """Read one file and hash it (runs on the worker threads)"""
+    with open(os.path.join(dataset_path, rel_path), "rb") as img:
+        data = img.read()
+    return data, hashlib.sha256(data).hexdigest()
+
+
+# -----------------------------
+# Checkpoint
+# -----------------------------
+def load_checkpoint(path):
+    """Relative paths already handled by a previous run"""
+    done = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    done.add(line)
+    return done
+
+
+def append_checkpoint(handle, rel_paths):
+    handle.write("".join(f"{p}\n" for p in rel_paths))
+    handle.flush()
+    os.fsync(handle.fileno())
 
-# GridFS with collection name "image"
-fs = gridfs.GridFS(db, collection="image")
 
 # -----------------------------
-# FER-2013 Dataset Path
+# Mongo helpers
 # -----------------------------
-dataset_path = r"C:\Users\predator\Desktop\demo_gg\image\faces"  # use raw string
+def load_stored_hashes(database):
+    """Content hashes already present in either storage layout"""
+    hashes = set()
+    for doc in database[INLINE_COLLECTION].find({}, {"sha256": 1, "_id": 0}):
+        if doc.get("sha256"):
+            hashes.add(doc["sha256"])
+    for doc in database[f"{GRIDFS_COLLECTION}.files"].find({}, {"sha256": 1, "_id": 0}):
+        if doc.get("sha256"):
+            hashes.add(doc["sha256"])
+    return hashes
+
+
+def flush_inline(collection, docs):
+    """insert_many that tolerates duplicates left behind by a crashed run"""
+    if not docs:
+        return 0
+    try:
+        result = collection.insert_many(docs, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        dupes = [err for err in e.details.get("writeErrors", []) if err.get("code") == 11000]
+        if len(dupes) != len(e.details.get("writeErrors", [])):
+            raise
+        return e.details.get("nInserted", 0)
+
 
 # -----------------------------
-# Upload Images
+# Ingestion
 # -----------------------------
-for emotion in os.listdir(dataset_path):
-    emotion_path = os.path.join(dataset_path, emotion)
+def ingest(dataset_path, workers=WORKERS, batch_size=BATCH_SIZE,
+           inline_max_bytes=INLINE_MAX_BYTES, checkpoint_path=None):
+    database = db.get_db()
+    fs = gridfs.GridFS(database, collection=GRIDFS_COLLECTION)
+    inline = database[INLINE_COLLECTION]
+    inline.create_index("sha256", unique=True)
+    database[f"{GRIDFS_COLLECTION}.files"].create_index("sha256")
+
+    if checkpoint_path is None:
+        checkpoint_path = os.path.join(dataset_path, ".store_fer_images.checkpoint")
+
+    all_items = list_images(dataset_path)
+    done = load_checkpoint(checkpoint_path)
+    pending = [item for item in all_items if item[0] not in done]
+    print(f"📂 Found {len(all_items)} images, {len(done)} already checkpointed, {len(pending)} to go")
+
+    stored_hashes = load_stored_hashes(database)
+    print(f"🔑 {len(stored_hashes)} images already stored (by content hash)")
+
+    stats = {"inline": 0, "gridfs": 0, "duplicate": 0}
+    start = time.perf_counter()
+
+    with open(checkpoint_path, "a", encoding="utf-8") as ckpt, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        for offset in range(0, len(pending), batch_size):
+            batch = pending[offset:offset + batch_size]
+            blobs = pool.map(lambda item: read_image(dataset_path, item[0]), batch)
+
+            inline_docs = []
+            for (rel_path, emotion), (data, digest) in zip(batch, blobs):
+                if digest in stored_hashes:
+                    stats["duplicate"] += 1
+                    continue
+                stored_hashes.add(digest)
+                img_name = os.path.basename(rel_path)
+
+                if len(data) <= inline_max_bytes:
+                    inline_docs.append({
+                        "filename": img_name,
+                        "emotion": emotion,
+                        "dataset": DATASET_NAME,
+                        "sha256": digest,
+                        "length": len(data),
+                        "data": data,
+                    })
+                else:
+                    fs.put(data, filename=img_name, emotion=emotion,
+                           dataset=DATASET_NAME, sha256=digest)
+                    stats["gridfs"] += 1
+
+            stats["inline"] += flush_inline(inline, inline_docs)
+            append_checkpoint(ckpt, [rel_path for rel_path, _ in batch])
+
+            processed = offset + len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"   📦 {processed}/{len(pending)} processed ({processed / max(elapsed, 1e-9):.0f} img/s)")
+
+    db.close_client()
+    elapsed = time.perf_counter() - start
+    print(f"✅ {DATASET_NAME} ingestion finished in {elapsed:.1f}s")
+    print(f"   inline documents: {stats['inline']}")
+    print(f"   GridFS files:     {stats['gridfs']}")
+    print(f"   duplicates:       {stats['duplicate']}")
+    return stats
+
 
-    if os.path.isdir(emotion_path):
-        for img_name in os.listdir(emotion_path):
-            img_path = os.path.join(emotion_path, img_name)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Store FER-2013 images in MongoDB")
+    parser.add_argument("dataset_path", help="folder containing one sub-folder per emotion")
+    parser.add_argument("--mongo-uri", default=None, help="overrides MONGO_URI")
+    parser.add_argument("--db", default=None, help="overrides MONGO_DB")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="file reader threads")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="documents per insert_many")
+    parser.add_argument("--inline-max-bytes", type=int, default=INLINE_MAX_BYTES,
+                        help="images up to this size are stored as plain documents instead of GridFS")
+    parser.add_argument("--checkpoint", default=None,
+                        help="progress file (default: <dataset>/.store_fer_images.checkpoint)")
+    return parser.parse_args()
 
-            with open(img_path, "rb") as img:
-                fs.put(
-                    img,
-                    filename=img_name,
-                    emotion=emotion,
-                    dataset="FER-2013"
-                )
 
-print("✅ FER-2013 images successfully stored in musicDB.image (GridFS)")
+if __name__ == "__main__":
+    args = parse_args()
+    db.configure(uri=args.mongo_uri, db=args.db)
+    ingest(
+        args.dataset_path,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        inline_max_bytes=args.inline_max_bytes,
+        checkpoint_path=args.checkpoint,
+    )
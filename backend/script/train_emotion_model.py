@@ -1,59 +1,185 @@
-
-
-
 # Train 3-class emotion model using MobileNetV2
 # Classes: happy, neutral, sad
-
+#
+# Every setting lives in TrainConfig. Override with a JSON file (--config)
+# and/or individual flags; flags win over the file, the file wins over defaults.
+#
+# Multi-worker (data-parallel) training: when TF_CONFIG describes a cluster, the
+# run uses tf.distribute.MultiWorkerMirroredStrategy. Each worker reads its own
+# shard of the data, batch_size is per worker, and only the chief writes the
+# labels, checkpoints, final model and run report. multi_worker_train.py starts
+# N local workers and reports scaling efficiency.
+#
+# Each phase stops early once val_loss has not improved for freeze_patience /
+# patience epochs; freeze_epochs and epochs are upper bounds. After every epoch
+# the full state (weights, optimizer, epoch, learning rate, callback counters)
+# goes to state_dir, and --resume continues an interrupted run from there.
+
+import argparse
+import contextlib
+import importlib.util
 import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, fields, asdict
 from pathlib import Path
 import numpy as np
+
+# Keras 3 cannot run model.fit under MultiWorkerMirroredStrategy; cluster runs use
+# Keras 2 (the tf_keras package), which has to be selected before TensorFlow loads.
+if os.environ.get("TF_CONFIG") and importlib.util.find_spec("tf_keras"):
+    os.environ.setdefault("TF_USE_LEGACY_KERAS", "1")
+
 import tensorflow as tf
 from tensorflow.keras import layers, models, callbacks, regularizers
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+from pack_emotion_dataset import load_manifest, iter_split, manifest_digest
+
 
 # ---------------- CONFIG ----------------
-IMG_SIZE = (224, 224)
-BATCH_SIZE = 32
+@dataclass
+class TrainConfig:
+    faces_dir: str = r"C:\Users\predator\Desktop\demo_gg\image\faces"   # happy/neutral/sad inside this folder
+    pack_dir: str = ""          # train from pack_emotion_dataset.py output instead of faces_dir
+    feature_cache: str = ""     # Phase 1 on cached backbone embeddings
+    model_path: str = "models/emotion_cnn.keras"
+    labels_path: str = "models/emotion_cnn.labels.json"
+    run_report: str = ""        # JSON summary (timings, throughput, workers) written by the chief
+    backbone_weights: str = "imagenet"  # "imagenet" | "none" (random init, for offline smoke runs)
+
+    img_size: int = 224
+    batch_size: int = 32        # per worker when training on a cluster
+    freeze_epochs: int = 20     # Phase 1 (freeze) epochs, upper bound
+    epochs: int = 150           # Phase 2 (fine-tune) epochs, upper bound
+    freeze_patience: int = 5    # Phase 1 stops after this many epochs without val_loss improvement (0 = never)
+    patience: int = 15          # same for Phase 2; longer, so ReduceLROnPlateau gets a few tries first
+    min_delta: float = 1e-3     # smallest val_loss drop that counts as an improvement
+    state_dir: str = ""         # full training state for --resume ("" = <model_path>.state/)
+    resume: bool = False        # continue the run saved in state_dir instead of starting over
+    val_split: float = 0.1
+    seed: int = 42
+    lr: float = 1e-3
+    weight_decay: float = 2e-5
+    shuffle_buffer: int = 2048
+
+    # CPU / runtime tuning (0 or -1 = let TensorFlow decide)
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    xla: bool = False
+    mixed_precision: str = "off"    # "off" | "bfloat16"
+    data_parallel_calls: int = -1   # tf.data map parallelism, -1 = AUTOTUNE
+    data_threads: int = 0           # tf.data private thread pool size, 0 = shared pool
+    prefetch: int = -1              # batches to prefetch, -1 = AUTOTUNE
+
+    @property
+    def image_shape(self):
+        return (self.img_size, self.img_size)
+
+    def parallel_calls(self):
+        return tf.data.AUTOTUNE if self.data_parallel_calls < 0 else self.data_parallel_calls
+
+    def prefetch_size(self):
+        return tf.data.AUTOTUNE if self.prefetch < 0 else self.prefetch
 
-# Phase 1 (freeze) epochs
-FREEZE_EPOCHS = 20
+# ---------------------------------------
 
-# Phase 2 (fine-tune) epochs
-EPOCHS = 150  # <-- This is Phase 2 epochs
 
-VAL_SPLIT = 0.1
-SEED = 42
-LR = 1e-3
-WEIGHT_DECAY = 2e-5
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the 3-class emotion CNN")
+    parser.add_argument("--config", default=None, help="JSON file with TrainConfig fields")
+    parser.add_argument("--export-weights", default=None,
+                        help="rebuild the model from a cluster run's .weights.npz and save it for serving")
+    for f in fields(TrainConfig):
+        flag = "--" + f.name.replace("_", "-")
+        if f.type is bool:
+            parser.add_argument(flag, dest=f.name, action=argparse.BooleanOptionalAction, default=None)
+        else:
+            parser.add_argument(flag, dest=f.name, type=f.type, default=None)
+    return parser.parse_args()
+
+
+def load_config(args):
+    values = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as fh:
+            values.update(json.load(fh))
+        unknown = set(values) - {f.name for f in fields(TrainConfig)}
+        if unknown:
+            raise ValueError(f"Unknown config keys in {args.config}: {sorted(unknown)}")
+    for f in fields(TrainConfig):
+        value = getattr(args, f.name)
+        if value is not None:
+            values[f.name] = value
+    return TrainConfig(**values)
+
+
+def cpu_supports_bf16():
+    """bfloat16 is only faster on CPUs with native bf16 (AVX512-BF16 / AMX)"""
+    try:
+        with open("/proc/cpuinfo", "r") as fh:
+            flags = fh.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def configure_runtime(cfg: TrainConfig):
+    """Must run before any TensorFlow op creates the thread pools"""
+    if cfg.intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(cfg.intra_op_threads)
+    if cfg.inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(cfg.inter_op_threads)
+    if cfg.xla:
+        tf.config.optimizer.set_jit(True)
+
+    if cfg.mixed_precision == "bfloat16":
+        if tf.config.list_physical_devices("GPU") or cpu_supports_bf16():
+            tf.keras.mixed_precision.set_global_policy("mixed_bfloat16")
+        else:
+            print("⚠️ CPU has no native bfloat16 support, staying on float32")
+            cfg.mixed_precision = "off"
+    elif cfg.mixed_precision != "off":
+        raise ValueError(f"Unsupported mixed_precision: {cfg.mixed_precision}")
 
-FACES_DIR = r"C:\Users\predator\Desktop\demo_gg\image\faces"   # happy/neutral/sad inside this folder
-MODEL_PATH = Path("models/emotion_cnn.keras")
-LABELS_PATH = Path("models/emotion_cnn.labels.json")
+    print("⚙️  Runtime:",
+          f"intra_op={tf.config.threading.get_intra_op_parallelism_threads() or 'auto'}",
+          f"inter_op={tf.config.threading.get_inter_op_parallelism_threads() or 'auto'}",
+          f"xla={cfg.xla}",
+          f"policy={tf.keras.mixed_precision.global_policy().name}",
+          f"data_parallel_calls={cfg.data_parallel_calls if cfg.data_parallel_calls >= 0 else 'auto'}",
+          f"data_threads={cfg.data_threads or 'shared'}")
 
-# ---------------------------------------
+
+def apply_data_options(ds, cfg: TrainConfig):
+    options = tf.data.Options()
+    if cfg.data_threads:
+        options.threading.private_threadpool_size = cfg.data_threads
+    return ds.with_options(options)
 
 
-def load_datasets():
+def load_datasets(cfg: TrainConfig):
     train_ds = tf.keras.utils.image_dataset_from_directory(
-        FACES_DIR,
-        validation_split=VAL_SPLIT,
+        cfg.faces_dir,
+        validation_split=cfg.val_split,
         subset="training",
-        seed=SEED,
-        image_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
+        seed=cfg.seed,
+        image_size=cfg.image_shape,
+        batch_size=cfg.batch_size,
         label_mode="categorical",
         color_mode="rgb",
         shuffle=True,
     )
 
     val_ds = tf.keras.utils.image_dataset_from_directory(
-        FACES_DIR,
-        validation_split=VAL_SPLIT,
+        cfg.faces_dir,
+        validation_split=cfg.val_split,
         subset="validation",
-        seed=SEED,
-        image_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
+        seed=cfg.seed,
+        image_size=cfg.image_shape,
+        batch_size=cfg.batch_size,
         label_mode="categorical",
         color_mode="rgb",
         shuffle=False,
@@ -62,27 +188,175 @@ def load_datasets():
     class_names = train_ds.class_names
     print("✅ Detected classes (order):", class_names)
 
-    LABELS_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with open(LABELS_PATH, "w", encoding="utf-8") as f:
-        json.dump(class_names, f, ensure_ascii=False, indent=2)
-    print("✅ Labels saved to:", LABELS_PATH)
-
-    AUTOTUNE = tf.data.AUTOTUNE
-    train_ds = train_ds.map(lambda x, y: (preprocess_input(x), y), num_parallel_calls=AUTOTUNE)
-    val_ds = val_ds.map(lambda x, y: (preprocess_input(x), y), num_parallel_calls=AUTOTUNE)
+    train_ds = train_ds.map(lambda x, y: (preprocess_input(x), y), num_parallel_calls=cfg.parallel_calls())
+    val_ds = val_ds.map(lambda x, y: (preprocess_input(x), y), num_parallel_calls=cfg.parallel_calls())
 
-    train_ds = train_ds.prefetch(AUTOTUNE)
-    val_ds = val_ds.prefetch(AUTOTUNE)
+    train_ds = apply_data_options(train_ds.prefetch(cfg.prefetch_size()), cfg)
+    val_ds = apply_data_options(val_ds.prefetch(cfg.prefetch_size()), cfg)
 
     return train_ds, val_ds, class_names
 
 
-def compute_class_weights(ds, num_classes: int):
+def save_labels(cfg: TrainConfig, class_names):
+    labels_path = Path(cfg.labels_path)
+    labels_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(labels_path, "w", encoding="utf-8") as f:
+        json.dump(class_names, f, ensure_ascii=False, indent=2)
+    print("✅ Labels saved to:", labels_path)
+
+
+def load_packed_datasets(cfg: TrainConfig):
+    """Read the pack written by pack_emotion_dataset.py (decoded + resized once)"""
+    pack_dir = Path(cfg.pack_dir)
+    manifest = load_manifest(pack_dir)
+    class_names = manifest["class_names"]
+    num_classes = len(class_names)
+    img_size = tuple(manifest["img_size"])
+    if img_size != cfg.image_shape:
+        raise ValueError(f"Pack image size {img_size} does not match img_size {cfg.image_shape}")
+    print("✅ Detected classes (order):", class_names)
+
+    class_counts = manifest["splits"]["train"]["class_counts"]
+    return (make_packed_split(cfg, pack_dir, manifest, "train", True),
+            make_packed_split(cfg, pack_dir, manifest, "val", False),
+            class_names, class_counts)
+
+
+def make_packed_split(cfg: TrainConfig, pack_dir: Path, manifest, split, training, shard=None):
+    """tf.data pipeline over one split of the pack; shard=(count, index) keeps every count-th image"""
+    num_classes = len(manifest["class_names"])
+    signature = (
+        tf.TensorSpec(shape=(*cfg.image_shape, 3), dtype=tf.uint8),
+        tf.TensorSpec(shape=(), dtype=tf.uint8),
+    )
+    ds = tf.data.Dataset.from_generator(
+        lambda: iter_split(pack_dir, manifest, split),
+        output_signature=signature,
+    )
+    # Keyed on the manifest so a repacked dataset never reads another pack's cache
+    cache_name = f"tfcache-{manifest_digest(manifest)}-{split}"
+    if shard:
+        # Shard before the cache so each worker only decodes and caches its own images
+        ds = ds.shard(*shard)
+        cache_name += f"-{shard[1]}of{shard[0]}"
+    # uint8 is 4x smaller than the preprocessed floats, so cache before mapping
+    ds = ds.cache(str(pack_dir / cache_name))
+    if training:
+        ds = ds.shuffle(cfg.shuffle_buffer, seed=cfg.seed, reshuffle_each_iteration=True)
+    ds = ds.batch(cfg.batch_size)
+    ds = ds.map(
+        lambda x, y: (preprocess_input(tf.cast(x, tf.float32)), tf.one_hot(y, num_classes)),
+        num_parallel_calls=cfg.parallel_calls(),
+    )
+    return apply_data_options(ds.prefetch(cfg.prefetch_size()), cfg)
+
+
+# ---------------- Multi-worker ----------------
+def make_strategy():
+    """MultiWorkerMirroredStrategy when TF_CONFIG describes a cluster, else None (one process)"""
+    tf_config = json.loads(os.environ.get("TF_CONFIG") or "{}")
+    if not tf_config.get("cluster"):
+        return None
+    if os.environ.get("TF_USE_LEGACY_KERAS") != "1":
+        raise RuntimeError("Multi-worker training needs the tf_keras package (pip install tf_keras)")
+    # Ring all-reduce over gRPC: the collective implementation that works on CPU-only hosts
+    options = tf.distribute.experimental.CommunicationOptions(
+        implementation=tf.distribute.experimental.CommunicationImplementation.RING
+    )
+    strategy = tf.distribute.MultiWorkerMirroredStrategy(communication_options=options)
+    resolver = strategy.cluster_resolver
+    print(f"🌐 Worker {resolver.task_type}:{resolver.task_id} of {strategy.num_replicas_in_sync} "
+          f"(chief: {is_chief(strategy)})")
+    return strategy
+
+
+def is_chief(strategy):
+    """The 'chief' task, or worker 0 when the cluster has no chief"""
+    if strategy is None:
+        return True
+    resolver = strategy.cluster_resolver
+    if resolver.task_type == "chief":
+        return True
+    return resolver.task_type == "worker" and resolver.task_id == 0 \
+        and "chief" not in resolver.cluster_spec().as_dict()
+
+
+def with_sample_weights(ds, class_weights):
+    """class_weight as per-sample weights (model.fit ignores class_weight on distributed inputs)"""
+    weights = tf.constant([class_weights[i] for i in range(len(class_weights))], dtype=tf.float32)
+    return ds.map(lambda x, y: (x, y, tf.gather(weights, tf.argmax(y, axis=-1))))
+
+
+def make_directory_split(cfg: TrainConfig, subset, training, shard):
+    """image_dataset_from_directory, sharded per worker before batching"""
+    ds = tf.keras.utils.image_dataset_from_directory(
+        cfg.faces_dir,
+        validation_split=cfg.val_split,
+        subset=subset,
+        seed=cfg.seed,
+        image_size=cfg.image_shape,
+        batch_size=None,
+        label_mode="categorical",
+        color_mode="rgb",
+        shuffle=training,
+    )
+    ds = ds.shard(*shard).batch(cfg.batch_size)
+    ds = ds.map(lambda x, y: (preprocess_input(x), y), num_parallel_calls=cfg.parallel_calls())
+    return apply_data_options(ds.prefetch(cfg.prefetch_size()), cfg)
+
+
+def distributed_inputs(cfg: TrainConfig, strategy, class_weights, num_train, num_val):
+    """
+    (train, val, fit kwargs) for model.fit on a cluster. Each worker builds its own
+    sharded, repeated pipeline (DatasetCreator), so every step consumes batch_size
+    images per worker and the epoch length is fixed by steps_per_epoch.
+    """
+    workers = strategy.num_replicas_in_sync
+    global_batch = cfg.batch_size * workers
+
+    def make(split, training):
+        def dataset_fn(context):
+            shard = (context.num_input_pipelines, context.input_pipeline_id)
+            if cfg.pack_dir:
+                pack_dir = Path(cfg.pack_dir)
+                ds = make_packed_split(cfg, pack_dir, load_manifest(pack_dir), split, training, shard)
+            else:
+                ds = make_directory_split(cfg, "training" if training else "validation", training, shard)
+            if training:
+                ds = with_sample_weights(ds, class_weights)
+            return ds.repeat()
+        return tf.keras.utils.experimental.DatasetCreator(dataset_fn)
+
+    steps = max(1, num_train // global_batch)
+    val_steps = max(1, num_val // global_batch)
+    print(f"🌐 {workers} workers x batch {cfg.batch_size} = global batch {global_batch}: "
+          f"{steps} steps/epoch, {val_steps} validation steps")
+    return make("train", True), make("val", False), {"steps_per_epoch": steps, "validation_steps": val_steps}
+
+
+def save_model(model, model_path: Path, strategy):
+    """Every worker saves (the save may run collectives); only the chief keeps its file"""
+    if is_chief(strategy):
+        model.save(model_path)
+        return
+    tmp_dir = tempfile.mkdtemp(prefix=f"worker-{strategy.cluster_resolver.task_id}-")
+    try:
+        model.save(Path(tmp_dir) / model_path.name)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def count_classes(ds, num_classes: int):
     counts = np.zeros(num_classes, dtype=np.float64)
     for _, y in ds.unbatch():
         idx = int(np.argmax(y.numpy()))
         counts[idx] += 1
+    return counts
+
 
+def class_weights_from_counts(counts):
+    counts = np.asarray(counts, dtype=np.float64)
+    num_classes = len(counts)
     total = counts.sum()
     weights = {}
     for i in range(num_classes):
@@ -96,44 +370,412 @@ def compute_class_weights(ds, num_classes: int):
     return weights
 
 
-def build_model(num_classes: int):
+class EpochTimer(callbacks.Callback):
+    """Print wall-clock time and throughput per epoch so pipelines and configs can be compared"""
+
+    def __init__(self, label, num_images=0):
+        super().__init__()
+        self.label = label
+        self.num_images = num_images
+        self.times = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self._start
+        self.times.append(elapsed)
+        rate = f" ({self.num_images / elapsed:.1f} img/s)" if self.num_images else ""
+        print(f"⏱️  [{self.label}] epoch {epoch + 1}: {elapsed:.1f}s{rate}")
+
+    def steady_epoch_seconds(self, start=0):
+        # First epoch (of the run or of a phase starting at `start`) fills the cache / retraces, so it is left out
+        times = self.times[start:]
+        steady = times[1:] or times
+        return sum(steady) / len(steady) if steady else None
+
+    def summary(self):
+        if not self.times:
+            return
+        mean = self.steady_epoch_seconds()
+        rate = f", {self.num_images / mean:.1f} img/s" if self.num_images else ""
+        print(f"⏱️  [{self.label}] first epoch {self.times[0]:.1f}s, "
+              f"mean of the rest {mean:.1f}s{rate} over {len(self.times)} epochs")
+
+
+# ---------------- Resumable state ----------------
+STATE_COUNTERS = ("wait", "best", "best_epoch", "cooldown_counter")
+
+
+def early_stopping(cfg: TrainConfig, patience: int):
+    """Plateau stop on val_loss for one phase; patience 0 keeps the fixed epoch budget"""
+    if patience <= 0:
+        return []
+    return [callbacks.EarlyStopping(monitor="val_loss", min_delta=cfg.min_delta, patience=patience, verbose=1)]
+
+
+class TrainingState(callbacks.Callback):
+    """
+    Full training state after every epoch: weights and optimizer slots (tf.train.Checkpoint)
+    plus state.json with the phase, epochs done, learning rate, the counters of the
+    checkpoint / plateau / early-stop callbacks and the wall-clock time spent so far.
+    """
+
+    def __init__(self, cfg: TrainConfig, strategy, signature):
+        super().__init__()
+        self.state_dir = Path(cfg.state_dir) if cfg.state_dir else Path(cfg.model_path).with_suffix(".state")
+        self.strategy = strategy
+        self.chief = is_chief(strategy)
+        self.saved = self._load(signature) if cfg.resume else {}
+        if not cfg.resume and self.chief and self.state_dir.exists():
+            print(f"🧹 Discarding the training state in {self.state_dir} (use --resume to continue it)")
+            shutil.rmtree(self.state_dir)
+        self.signature = signature
+        self.seconds = dict(self.saved.get("seconds", {}))         # per phase, earlier runs included
+        self.epochs_done = dict(self.saved.get("epochs", {}))
+        self.saved_seconds = dict(self.saved.get("saved_seconds", {}))
+        self.resumed_seconds = sum(self.seconds.values())
+        self.phase = None
+        self.tracked = []
+        self._pending_counters = None
+
+    def _load(self, signature):
+        path = self.state_dir / "state.json"
+        if not path.exists():
+            print(f"⚠️ No training state in {self.state_dir}, starting from scratch")
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        for key, value in signature.items():
+            if saved["signature"].get(key) != value:
+                raise ValueError(f"Training state in {self.state_dir} was saved with {key}="
+                                 f"{saved['signature'].get(key)!r}, not {value!r}; drop --resume to start over")
+        return saved
+
+    def _scope(self):
+        return self.strategy.scope() if self.strategy else contextlib.nullcontext()
+
+    def begin_phase(self, phase, model, tracked, epochs):
+        """
+        Epoch to start `phase` from (0 on a fresh run), or None when an earlier run
+        already finished it (converged, or used up `epochs`). Restores weights,
+        optimizer and learning rate if the saved state is inside this phase; call after compile.
+        """
+        self.phase, self.tracked = phase, tracked
+        saved_phase = self.saved.get("phase", 0)
+        if phase > saved_phase:
+            return 0
+        if phase < saved_phase or self.saved["converged"] or self.saved["epoch"] >= epochs:
+            if phase == saved_phase:
+                self._restore(model, weights_only=True)
+            print(f"♻️  Phase {phase} finished in an earlier run ({self.epochs_done[str(phase)]} epochs), skipping it")
+            return None
+        self._restore(model)
+        self._pending_counters = self.saved["callbacks"]
+        print(f"♻️  Resuming phase {phase} at epoch {self.saved['epoch'] + 1} "
+              f"(lr {self.saved['lr']:.2e}); {self.resumed_seconds:.1f}s of earlier training not repeated")
+        return self.saved["epoch"]
+
+    def _restore(self, model, weights_only=False):
+        path = str(self.state_dir / self.saved["checkpoint"])
+        with self._scope():
+            if weights_only:
+                tf.train.Checkpoint(model=model).restore(path).expect_partial()
+                return
+            model.optimizer.build(model.trainable_variables)
+            tf.train.Checkpoint(model=model, optimizer=model.optimizer).restore(path).assert_nontrivial_match()
+            model.optimizer.learning_rate = self.saved["lr"]
+
+    def on_train_begin(self, logs=None):
+        # Runs after the tracked callbacks reset themselves, so the restored counters stick
+        if self._pending_counters:
+            for cb in self.tracked:
+                for attr, value in self._pending_counters.get(type(cb).__name__, {}).items():
+                    setattr(cb, attr, value)
+            self._pending_counters = None
+        self._fit_start = time.perf_counter()
+        self._fit_base = self.seconds.get(str(self.phase), 0.0)
+        self._epoch_times = []
+        self._last_epoch = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self._epoch_times.append(time.perf_counter() - self._epoch_start)
+        self._last_epoch = epoch
+        self._save(epoch + 1, converged=False)
+
+    def on_train_end(self, logs=None):
+        budget = self.params.get("epochs") or 0
+        done = self._last_epoch + 1 if self._last_epoch is not None else self.saved.get("epoch", budget)
+        if done < budget:
+            # Steady epochs only: the first one fills the cache / traces the graph
+            steady = self._epoch_times[1:] or self._epoch_times
+            saved = (budget - done) * sum(steady) / len(steady) if steady else 0.0
+            self.saved_seconds[str(self.phase)] = round(saved, 1)
+            print(f"⏹️  Phase {self.phase} converged after {done}/{budget} epochs: "
+                  f"~{saved:.1f}s saved on the remaining {budget - done}")
+        self._save(done, converged=done < budget)
+
+    def _save(self, epoch, converged):
+        self.seconds[str(self.phase)] = round(self._fit_base + time.perf_counter() - self._fit_start, 2)
+        self.epochs_done[str(self.phase)] = epoch
+        name = f"ckpt-phase{self.phase}-epoch{epoch}"
+        ckpt = tf.train.Checkpoint(model=self.model, optimizer=self.model.optimizer)
+        if not self.chief:
+            # Every worker writes (reading variables may need collectives); only the chief's copy is kept
+            tmp_dir = tempfile.mkdtemp(prefix="state-")
+            try:
+                ckpt.write(os.path.join(tmp_dir, name))
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        ckpt.write(str(self.state_dir / name))
+        state = {
+            "phase": self.phase,
+            "epoch": epoch,
+            "converged": converged,   # stopped early; a larger epoch budget does not reopen it
+            "checkpoint": name,
+            "lr": float(self.model.optimizer.learning_rate.numpy()),
+            "callbacks": {
+                type(cb).__name__: {attr: _json_number(getattr(cb, attr)) for attr in STATE_COUNTERS if hasattr(cb, attr)}
+                for cb in self.tracked if any(hasattr(cb, attr) for attr in STATE_COUNTERS)
+            },
+            "epochs": self.epochs_done,
+            "seconds": self.seconds,
+            "saved_seconds": self.saved_seconds,
+            "signature": self.signature,
+        }
+        # state.json only points at a checkpoint once it is fully written
+        tmp = self.state_dir / "state.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        tmp.replace(self.state_dir / "state.json")
+        for old in self.state_dir.glob("ckpt-*"):
+            if not old.name.startswith(name + "."):
+                old.unlink()
+
+    def report(self):
+        return {
+            "epochs_run": self.epochs_done,
+            "early_stop_saved_seconds": self.saved_seconds,
+            "resumed_seconds": round(self.resumed_seconds, 2),
+            "state_dir": str(self.state_dir),
+        }
+
+
+def _json_number(value):
+    return None if value is None else (int(value) if isinstance(value, (int, np.integer)) else float(value))
+
+
+def build_model(cfg: TrainConfig, num_classes: int):
     base = MobileNetV2(
         include_top=False,
-        weights="imagenet",
-        input_shape=(*IMG_SIZE, 3),
+        weights=None if cfg.backbone_weights == "none" else cfg.backbone_weights,
+        input_shape=(*cfg.image_shape, 3),
     )
     base.trainable = False  # Phase 1 freeze
 
-    inputs = layers.Input(shape=(*IMG_SIZE, 3))
-    x = base(inputs, training=False)
-    x = layers.GlobalAveragePooling2D()(x)
-    x = layers.Dropout(0.35)(x)
-    x = layers.Dense(
-        192,
-        activation="relu",
-        kernel_regularizer=regularizers.l2(WEIGHT_DECAY),
-    )(x)
-    x = layers.Dropout(0.35)(x)
-    outputs = layers.Dense(num_classes, activation="softmax")(x)
+    # Head layers are shared between the full model and a features-only model,
+    # so training the head on cached embeddings updates the full model directly.
+    head = [
+        layers.Dropout(0.35),
+        layers.Dense(
+            192,
+            activation="relu",
+            kernel_regularizer=regularizers.l2(cfg.weight_decay),
+        ),
+        layers.Dropout(0.35),
+        # Keep the softmax in float32 under mixed precision
+        layers.Dense(num_classes, activation="softmax", dtype="float32"),
+    ]
 
-    model = models.Model(inputs, outputs)
-    return model, base
+    def apply_head(x):
+        for layer in head:
+            x = layer(x)
+        return x
 
+    inputs = layers.Input(shape=(*cfg.image_shape, 3))
+    x = base(inputs, training=False)
+    features = layers.GlobalAveragePooling2D()(x)
+    model = models.Model(inputs, apply_head(features))
+
+    feature_model = models.Model(inputs, features)
+    feat_inputs = layers.Input(shape=(features.shape[-1],))
+    head_model = models.Model(feat_inputs, apply_head(feat_inputs))
+    return model, base, feature_model, head_model
+
+
+# ---------------- Feature cache (Phase 1) ----------------
+def feature_signature(cfg: TrainConfig):
+    """What the cached embeddings depend on; a mismatch means they are stale"""
+    if cfg.pack_dir:
+        source = {"pack": manifest_digest(load_manifest(Path(cfg.pack_dir)))}
+    else:
+        images = [e for e in Path(cfg.faces_dir).rglob("*") if e.is_file()]
+        source = {
+            "faces_dir": str(Path(cfg.faces_dir).resolve()),
+            "val_split": cfg.val_split,
+            "files": len(images),
+            "newest_mtime_ns": max((e.stat().st_mtime_ns for e in images), default=0),
+        }
+    return {
+        **source,
+        "img_size": cfg.img_size,
+        "backbone_weights": cfg.backbone_weights,
+        "seed": cfg.seed,               # random init (backbone_weights=none) and the split
+        "mixed_precision": cfg.mixed_precision,
+    }
+
+
+def extract_features(feature_model, ds, cache_dir: Path, split: str, num_classes: int, signature):
+    """Run the frozen backbone once and store pooled embeddings as memory-mapped arrays"""
+    feat_path = cache_dir / f"{split}.features.npy"
+    label_path = cache_dir / f"{split}.labels.npy"
+    signature_path = cache_dir / f"{split}.signature.json"
+    if feat_path.exists() and label_path.exists():
+        cached = None
+        if signature_path.exists():
+            with open(signature_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        if cached == signature:
+            print(f"✅ Reusing cached {split} features from {feat_path}")
+            return np.load(feat_path, mmap_mode="r"), np.load(label_path)
+        print(f"♻️  Cached {split} features in {cache_dir} were built for other data or settings, rebuilding")
+        signature_path.unlink(missing_ok=True)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    chunks, label_chunks = [], []
+    # One pass keeps features and labels aligned even when the dataset reshuffles
+    for x, y in ds:
+        chunks.append(feature_model(x, training=False).numpy().astype(np.float32))
+        label_chunks.append(y.numpy())
+    labels = np.concatenate(label_chunks).astype(np.float32).reshape(-1, num_classes)
+
+    total = sum(len(c) for c in chunks)
+    tmp_path = cache_dir / f"{split}.features.tmp.npy"
+    feats = np.lib.format.open_memmap(
+        tmp_path, mode="w+", dtype=np.float32, shape=(total, chunks[0].shape[-1])
+    )
+    pos = 0
+    for c in chunks:
+        feats[pos:pos + len(c)] = c
+        pos += len(c)
+    feats.flush()
+    del feats
+    np.save(label_path, labels)
+    tmp_path.replace(feat_path)
+    # Written last: arrays without a matching signature are never reused
+    with open(signature_path, "w", encoding="utf-8") as f:
+        json.dump(signature, f, indent=2)
+
+    print(f"✅ Extracted {total} {split} embeddings in {time.perf_counter() - start:.1f}s -> {feat_path}")
+    return np.load(feat_path, mmap_mode="r"), labels
+
+
+def train_head_on_features(cfg: TrainConfig, head_model, feature_model, train_ds, val_ds,
+                           num_classes, class_weights, state: TrainingState):
+    head_model.compile(
+        optimizer=tf.keras.optimizers.Adam(cfg.lr),
+        loss="categorical_crossentropy",
+        metrics=["accuracy"],
+        jit_compile=cfg.xla,
+    )
+    plateau = callbacks.ReduceLROnPlateau(
+        monitor="val_loss",
+        factor=0.5,
+        patience=3,
+        min_lr=1e-6,
+        verbose=1,
+    )
+    stop = early_stopping(cfg, cfg.freeze_patience)
+    initial_epoch = state.begin_phase(1, head_model, [plateau, *stop], cfg.freeze_epochs)
+    if initial_epoch is None:
+        return
+
+    cache_dir = Path(cfg.feature_cache)
+    signature = feature_signature(cfg)
+    train_x, train_y = extract_features(feature_model, train_ds, cache_dir, "train", num_classes, signature)
+    val_x, val_y = extract_features(feature_model, val_ds, cache_dir, "val", num_classes, signature)
+
+    head_train = (
+        tf.data.Dataset.from_tensor_slices((np.asarray(train_x), train_y))
+        .shuffle(len(train_y), seed=cfg.seed, reshuffle_each_iteration=True)
+        .batch(cfg.batch_size)
+        .prefetch(cfg.prefetch_size())
+    )
+    head_val = tf.data.Dataset.from_tensor_slices((np.asarray(val_x), val_y)).batch(cfg.batch_size)
+
+    timer = EpochTimer("features", len(train_y))
+    head_model.fit(
+        head_train,
+        validation_data=head_val,
+        epochs=cfg.freeze_epochs,
+        initial_epoch=initial_epoch,
+        class_weight=class_weights,
+        callbacks=[plateau, *stop, timer, state],
+        verbose=1,
+    )
+    timer.summary()
 
-def main():
-    tf.random.set_seed(SEED)
 
-    train_ds, val_ds, labels = load_datasets()
+def main():
+    args = parse_args()
+    cfg = load_config(args)
+    if args.export_weights:
+        export_serving_model(cfg, Path(args.export_weights))
+        return
+    configure_runtime(cfg)
+    strategy = make_strategy()   # before any other op: collectives need a fresh context
+    chief = is_chief(strategy)
+    workers = strategy.num_replicas_in_sync if strategy else 1
+    if strategy and cfg.feature_cache:
+        raise ValueError("feature_cache is single-process only; drop it for multi-worker runs")
+    print("⚙️  Config:", json.dumps(asdict(cfg)))
+    tf.random.set_seed(cfg.seed)
+    model_path = Path(cfg.model_path)
+    scope = strategy.scope if strategy else contextlib.nullcontext   # fresh context per use
+
+    if cfg.pack_dir:
+        train_ds, val_ds, labels, class_counts = load_packed_datasets(cfg)
+        num_val = int(np.sum(load_manifest(Path(cfg.pack_dir))["splits"]["val"]["class_counts"]))
+        pipeline = "pack"
+    else:
+        train_ds, val_ds, labels = load_datasets(cfg)
+        class_counts = count_classes(train_ds, len(labels))
+        num_val = int(np.sum(count_classes(val_ds, len(labels)))) if strategy else 0
+        pipeline = "directory"
+    if chief:
+        save_labels(cfg, labels)
     num_classes = len(labels)
-    class_weights = compute_class_weights(train_ds, num_classes)
-
-    model, base = build_model(num_classes)
-
-    # Callbacks (NO EarlyStopping)
-    MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
+    class_weights = class_weights_from_counts(class_counts)
+    num_train = int(np.sum(class_counts))
+
+    fit_kwargs = {"class_weight": class_weights}
+    if strategy:
+        train_ds, val_ds, fit_kwargs = distributed_inputs(cfg, strategy, class_weights, num_train, num_val)
+        num_train = fit_kwargs["steps_per_epoch"] * cfg.batch_size * workers   # images per epoch
+    timer = EpochTimer(pipeline, num_train)
+    state = TrainingState(cfg, strategy, {
+        "labels": list(labels),
+        "img_size": cfg.img_size,
+        "feature_cache": bool(cfg.feature_cache),
+    })
+
+    with scope():
+        model, base, feature_model, head_model = build_model(cfg, num_classes)
+
+    # Callbacks shared by both phases; each phase adds its own EarlyStopping and the
+    # TrainingState (last, so it sees the other callbacks' counters after each epoch).
+    # Under a strategy ModelCheckpoint writes the chief's file and sends the other
+    # workers' copies to temporary folders.
+    model_path.parent.mkdir(parents=True, exist_ok=True)
     cb = [
         callbacks.ModelCheckpoint(
-            filepath=str(MODEL_PATH),
+            filepath=str(model_path),
             monitor="val_accuracy",
             save_best_only=True,
             verbose=1,
@@ -145,24 +787,40 @@ def main():
             min_lr=1e-6,
             verbose=1,
         ),
+        timer,
     ]
 
     # ---------------- Phase 1 ----------------
-    print("\n🚀 Phase 1: Training classifier head (backbone frozen)")
-    model.compile(
-        optimizer=tf.keras.optimizers.Adam(LR),
-        loss="categorical_crossentropy",
-        metrics=["accuracy"],
-    )
-
-    model.fit(
-        train_ds,
-        validation_data=val_ds,
-        epochs=FREEZE_EPOCHS,          # ✅ will run full 15 epochs
-        class_weight=class_weights,
-        callbacks=cb,
-        verbose=1,
-    )
+    phase1_start = time.perf_counter()
+    if cfg.feature_cache:
+        print("\n🚀 Phase 1: Training classifier head on cached backbone features")
+        train_head_on_features(cfg, head_model, feature_model, train_ds, val_ds, num_classes, class_weights, state)
+    else:
+        print("\n🚀 Phase 1: Training classifier head (backbone frozen)")
+        with scope():
+            model.compile(
+                optimizer=tf.keras.optimizers.Adam(cfg.lr),
+                loss="categorical_crossentropy",
+                metrics=["accuracy"],
+                jit_compile=cfg.xla,
+            )
+
+        stop = early_stopping(cfg, cfg.freeze_patience)
+        initial_epoch = state.begin_phase(1, model, cb + stop, cfg.freeze_epochs)
+        if initial_epoch is not None:
+            model.fit(
+                train_ds,
+                validation_data=val_ds,
+                epochs=cfg.freeze_epochs,
+                initial_epoch=initial_epoch,
+                callbacks=cb + stop + [state],
+                verbose=1 if chief else 0,
+                **fit_kwargs,
+            )
+    phase1_time = time.perf_counter() - phase1_start
+    phase1_mode = "feature cache" if cfg.feature_cache else "full backbone"
+    phase1_epoch = timer.steady_epoch_seconds()
+    print(f"⏱️  Phase 1 ({phase1_mode}): {phase1_time:.1f}s")
 
     # ---------------- Phase 2 ----------------
     print("\n🚀 Phase 2: Fine-tuning backbone (unfreeze last 34%)")
@@ -172,26 +830,88 @@ def main():
         if not isinstance(layer, layers.BatchNormalization):
             layer.trainable = True
 
-    model.compile(
-        optimizer=tf.keras.optimizers.Adam(LR * 0.1),
-        loss="categorical_crossentropy",
-        metrics=["accuracy"],
-    )
-
-    model.fit(
-        train_ds,
-        validation_data=val_ds,
-        epochs=EPOCHS,                # ✅ will run full 100 epochs (Phase 2)
-        class_weight=class_weights,
-        callbacks=cb,
-        verbose=1,
-    )
+    with scope():
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(cfg.lr * 0.1),
+            loss="categorical_crossentropy",
+            metrics=["accuracy"],
+            jit_compile=cfg.xla,
+        )
+
+    phase2_start = time.perf_counter()
+    phase1_epochs = len(timer.times)
+    stop = early_stopping(cfg, cfg.patience)
+    initial_epoch = state.begin_phase(2, model, cb + stop, cfg.epochs)
+    if initial_epoch is not None:
+        model.fit(
+            train_ds,
+            validation_data=val_ds,
+            epochs=cfg.epochs,
+            initial_epoch=initial_epoch,
+            callbacks=cb + stop + [state],
+            verbose=1 if chief else 0,
+            **fit_kwargs,
+        )
+    phase2_time = time.perf_counter() - phase2_start
+    phase2_epoch = timer.steady_epoch_seconds(phase1_epochs)
+
+    timer.summary()
+    print(f"⏱️  Phase 1 ({phase1_mode}): {phase1_time:.1f}s | Phase 2: {phase2_time:.1f}s | "
+          f"total: {phase1_time + phase2_time:.1f}s")
+    early_saved = sum(state.saved_seconds.values())
+    if early_saved or state.resumed_seconds:
+        print(f"⏱️  Wall clock saved: ~{early_saved:.1f}s by early stopping, "
+              f"{state.resumed_seconds:.1f}s by resuming")
 
     # Save final model too (best already saved by checkpoint)
-    model.save(MODEL_PATH)
+    save_model(model, model_path, strategy)
+    weights_path = model_path.with_suffix(".weights.npz")
+    if strategy:
+        # The .keras file above is in tf_keras format, which Keras 3 (emotion_api) cannot
+        # load; the raw weights let export_serving_model() rebuild it (multi_worker_train.py does).
+        # Reading them is a collective op, so every worker takes part.
+        weights = model.get_weights()
+        if chief:
+            np.savez(weights_path, *weights)
+            print("✅ Weights saved to:", weights_path)
+    if chief and cfg.run_report:
+        write_run_report(cfg, {
+            "workers": workers,
+            "batch_size_per_worker": cfg.batch_size,
+            "global_batch_size": cfg.batch_size * workers,
+            "images_per_epoch": num_train,
+            "phase1_seconds": round(phase1_time, 2),
+            "phase2_seconds": round(phase2_time, 2),
+            "phase1_epoch_seconds": phase1_epoch and round(phase1_epoch, 3),
+            "phase2_epoch_seconds": phase2_epoch and round(phase2_epoch, 3),
+            "phase2_images_per_second": phase2_epoch and round(num_train / phase2_epoch, 2),
+            "weights_path": str(weights_path) if strategy else None,
+            **state.report(),
+        })
     print("\n✅ Training complete")
-    print("✅ Model saved at:", MODEL_PATH)
-    print("✅ Labels saved at:", LABELS_PATH)
+    if chief:
+        print("✅ Model saved at:", model_path)
+        print("✅ Labels saved at:", cfg.labels_path)
+
+
+def export_serving_model(cfg: TrainConfig, weights_path: Path):
+    """Rebuild the architecture with this process's Keras, load the weights and save to model_path"""
+    with open(cfg.labels_path, "r", encoding="utf-8") as f:
+        num_classes = len(json.load(f))
+    cfg.backbone_weights = "none"   # every weight comes from the file
+    model, _, _, _ = build_model(cfg, num_classes)
+    with np.load(weights_path) as data:
+        model.set_weights([data[f"arr_{i}"] for i in range(len(data.files))])
+    model.save(cfg.model_path)
+    print("✅ Serving model saved to:", cfg.model_path)
+
+
+def write_run_report(cfg: TrainConfig, report):
+    path = Path(cfg.run_report)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**report, "config": asdict(cfg)}, f, indent=2)
+    print("✅ Run report saved to:", path)
 
 
 if __name__ == "__main__":
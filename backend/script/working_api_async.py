@@ -0,0 +1,186 @@
+# asyncio variant of working_api.py
+# Same endpoints and responses, served by Quart (Flask-compatible, ASGI) on
+# PyMongo's AsyncMongoClient, so a request waiting on MongoDB never holds up the
+# others. Within /api/working-scan the emotion query runs first; the shown-songs
+# lookup it may need follows only when fewer than 5 new songs are left. The
+# background stats refresher runs its two counts concurrently (asyncio.gather).
+#
+#   hypercorn working_api_async:app --bind 0.0.0.0:5000
+#   python working_api_async.py
+
+from quart import Quart, jsonify, request
+from quart_cors import cors
+import asyncio
+import datetime
+import os
+import random
+import time
+from working_core import EMOTIONS, choose_songs, needs_shown_songs, record_history, format_songs
+import db_async
+
+app = cors(Quart(__name__))
+
+STATS_REFRESH_SECONDS = float(os.environ.get("HEALTH_REFRESH_SECONDS", "10"))
+
+# Store session history in memory
+session_history = {}
+
+# Cached stats, refreshed by a background task (see /api/test)
+stats = {"data": {}, "refreshed_at": None, "updated": None, "last_error": "not collected yet"}
+
+
+async def refresh_stats_forever():
+    while True:
+        try:
+            total, emotions = await asyncio.gather(
+                db_async.estimated_song_count(),
+                db_async.count_by_emotion(EMOTIONS),
+            )
+            stats["data"] = {"total_songs": total, "emotions": emotions}
+            stats["refreshed_at"] = datetime.datetime.now().isoformat()
+            stats["updated"] = time.monotonic()
+            stats["last_error"] = None
+        except Exception as e:
+            stats["last_error"] = str(e)
+        await asyncio.sleep(STATS_REFRESH_SECONDS)
+
+
+@app.before_serving
+async def start_background_tasks():
+    app.add_background_task(refresh_stats_forever)
+
+
+@app.route("/api/working-scan", methods=["POST"])
+async def working_scan():
+    """Working API that returns DIFFERENT songs each time"""
+
+    try:
+        data = await request.get_json()
+        session_id = data.get("session_id", "default")
+
+        # Get random emotion
+        emotion = random.choice(EMOTIONS)
+
+        print(f"\n🎭 Session {session_id[:8]}... - Emotion: {emotion}")
+
+        shown_songs = list(session_history.get(session_id, []))
+
+        all_songs = await db_async.fetch_songs_by_emotion(emotion)
+
+        print(f"📝 Found {len(all_songs)} songs with emotion '{emotion}'")
+
+        # If we have songs with this emotion
+        if all_songs:
+            # Recently shown songs are only mixed back in when fewer than 5 new ones are
+            # left, so their documents are fetched on that branch only
+            shown_song_objects = []
+            if needs_shown_songs(all_songs, shown_songs):
+                shown_song_objects = await db_async.fetch_songs_by_ids(shown_songs[-10:])
+            selected_songs = choose_songs(all_songs, shown_songs, lambda: shown_song_objects)
+            record_history(session_history, session_id, selected_songs)
+        else:
+            # No songs with this emotion, get any songs
+            print(f"⚠️ No songs for '{emotion}', getting random songs")
+            all_random_songs = await db_async.fetch_any_songs(50)
+            selected_songs = random.sample(all_random_songs, min(5, len(all_random_songs)))
+
+        # SHUFFLE the selected songs for extra randomness
+        random.shuffle(selected_songs)
+
+        # Format songs for frontend
+        result_songs = format_songs(selected_songs, emotion)
+
+        print(f"✅ Returning {len(result_songs)} SHUFFLED songs")
+
+        return jsonify({
+            "success": True,
+            "emotion": emotion,
+            "songs": result_songs,
+            "session_id": session_id,
+            "total_songs_in_db": stats["data"].get("total_songs"),
+            "message": f"Found {len(result_songs)} songs for {emotion} mood"
+        }), 200
+
+    except Exception as e:
+        print(f"❌ API Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "emotion": "neutral",
+            "songs": []
+        }), 500
+
+
+@app.route("/api/reset-session/<session_id>", methods=["GET"])
+async def reset_session(session_id):
+    """Reset song history for a session"""
+    if session_id in session_history:
+        session_history[session_id] = []
+        return jsonify({
+            "success": True,
+            "message": f"Session {session_id[:8]}... history cleared"
+        }), 200
+    return jsonify({
+        "success": False,
+        "message": "Session not found"
+    }), 404
+
+
+@app.route("/api/get-songs/<emotion>", methods=["GET"])
+async def get_songs_by_emotion(emotion):
+    """Get all songs for an emotion (for testing)"""
+    try:
+        titles = await db_async.fetch_song_titles_by_emotion(emotion)
+        return jsonify({
+            "success": True,
+            "emotion": emotion,
+            "total_songs": len(titles),
+            "song_titles": titles[:20]
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/live", methods=["GET"])
+async def live():
+    """Liveness probe: no database access"""
+    return jsonify({"status": "alive", "timestamp": datetime.datetime.now().isoformat()}), 200
+
+
+@app.route("/api/test", methods=["GET"])
+async def test_api():
+    """Test endpoint (served from the cached stats)"""
+    age = None if stats["updated"] is None else round(time.monotonic() - stats["updated"], 3)
+    return jsonify({
+        "status": "online",
+        "timestamp": datetime.datetime.now().isoformat(),
+        "mongo_connected": stats["last_error"] is None,
+        "total_songs": stats["data"].get("total_songs", 0),
+        "active_sessions": len(session_history),
+        "emotions": stats["data"].get("emotions", {e: 0 for e in EMOTIONS}),
+        "snapshot": {
+            "refreshed_at": stats["refreshed_at"],
+            "age_seconds": age,
+            "refresh_interval_seconds": STATS_REFRESH_SECONDS,
+            "last_error": stats["last_error"],
+        },
+        "mongo_concurrency": db_async.concurrency_limit(),
+    }), 200
+
+
+if __name__ == "__main__":
+    print("\n" + "="*60)
+    print("🎵 WORKING AUDIO API (ASYNC)")
+    print("="*60)
+    print(f"🔌 Mongo concurrency: {db_async.concurrency_limit()}")
+    print("📡 Endpoints:")
+    print("   POST /api/working-scan     - Get DIFFERENT songs each time")
+    print("   GET  /api/reset-session/<id> - Reset session history")
+    print("   GET  /api/get-songs/<emo>  - Get songs by emotion")
+    print("   GET  /api/test             - Test API status")
+    print("   GET  /api/live             - Liveness probe (no database)")
+    print("="*60)
+
+    app.run(host="0.0.0.0", port=5000)
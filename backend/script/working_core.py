@@ -0,0 +1,108 @@
+# Selection and formatting shared by working_api.py and working_api_async.py
+# Pure functions: all database access stays in the API modules.
+
+import random
+
+EMOTIONS = ["happy", "sad", "neutral"]
+MAX_HISTORY = 20
+
+
+def unseen_songs(all_songs, shown_songs):
+    """Songs of `all_songs` this session has not been shown yet"""
+    return [song for song in all_songs
+            if str(song.get("_id", "")) not in shown_songs]
+
+
+def mixes_in_shown(available_songs, shown_songs):
+    """True when some, but fewer than 5, new songs are left and shown ones fill the rest"""
+    return bool(shown_songs) and 0 < len(available_songs) < 5
+
+
+def needs_shown_songs(all_songs, shown_songs):
+    """True when choose_songs will call load_shown"""
+    return mixes_in_shown(unseen_songs(all_songs, shown_songs), shown_songs)
+
+
+def choose_songs(all_songs, shown_songs, load_shown):
+    """
+    Pick up to 5 songs, preferring ones this session has not seen yet.
+    `load_shown()` returns the documents of recently shown songs and is only
+    called when there are not enough new songs (see needs_shown_songs).
+    """
+    # Filter out already shown songs
+    available_songs = unseen_songs(all_songs, shown_songs)
+    
+    print(f"📊 Available (not shown): {len(available_songs)} / Shown before: {len(shown_songs)}")
+    
+    # If we have enough new songs, use them
+    if len(available_songs) >= 5:
+        return random.sample(available_songs, min(5, len(available_songs)))
+
+    if not available_songs:
+        # No new songs, shuffle all songs
+        return random.sample(all_songs, min(5, len(all_songs)))
+
+    # Mix some new and some old songs
+    selected_songs = available_songs[:min(3, len(available_songs))]
+    # Add some previously shown songs to make 5
+    needed = 5 - len(selected_songs)
+    if mixes_in_shown(available_songs, shown_songs):
+        shown_song_objects = [song for song in load_shown() if song not in selected_songs]
+        if shown_song_objects:
+            selected_songs.extend(random.sample(shown_song_objects, 
+                                              min(needed, len(shown_song_objects))))
+    return selected_songs
+
+
+def record_history(session_history, session_id, selected_songs):
+    # Update session history
+    new_song_ids = [str(song.get("_id", "")) for song in selected_songs]
+    if session_id not in session_history:
+        session_history[session_id] = []
+    session_history[session_id].extend(new_song_ids)
+    
+    # Keep only last 20 songs per session
+    session_history[session_id] = session_history[session_id][-MAX_HISTORY:]
+
+
+def format_songs(selected_songs, emotion):
+    """Format songs for frontend"""
+    result_songs = []
+    for i, song in enumerate(selected_songs[:5]):  # Max 5 songs
+        song_id = str(song.get("_id", f"song_{i}"))
+        filename = song.get("filename", "")
+        
+        if not filename:
+            title = song.get("title", f"Song_{i}")
+            filename = f"{title.replace(' ', '_').replace('.', '_')}.mp3"
+        
+        # Adjust score based on features
+        if emotion == "happy":
+            score = (song.get("valence", 0.5) * 0.4 + 
+                    song.get("energy", 0.5) * 0.4 + 
+                    song.get("danceability", 0.5) * 0.2)
+        elif emotion == "sad":
+            score = ((1 - song.get("valence", 0.5)) * 0.5 + 
+                    (1 - song.get("energy", 0.5)) * 0.3 + 
+                    song.get("acousticness", 0.5) * 0.2)
+        else:  # neutral
+            score = 0.5 + random.uniform(-0.2, 0.2)
+        
+        # Add some random variation
+        final_score = max(0.1, min(0.99, score + random.uniform(-0.1, 0.1)))
+        
+        result_songs.append({
+            "id": song_id,
+            "title": song.get("title", f"Song {i+1}"),
+            "artist": "Artist",
+            "score": round(final_score, 3),
+            "emotion": song.get("song_emotion", emotion),
+            "filename": filename,
+            "audio_url": f"http://192.168.18.240:3000/api/audio/play/{filename}",
+            "features": {
+                "danceability": round(song.get("danceability", 0), 2),
+                "energy": round(song.get("energy", 0), 2),
+                "valence": round(song.get("valence", 0), 2),
+            }
+        })
+    return result_songs
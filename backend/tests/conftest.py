@@ -0,0 +1,13 @@
+# Unit tests for backend/ml and backend/script
+#   python -m pytest -q backend/tests
+# The modules import each other by bare name (they run as scripts from their own
+# directory), so both directories go on sys.path.
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for name in ("ml", "script"):
+    path = os.path.join(BACKEND_DIR, name)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,92 @@
+import threading
+import time
+
+from admission import DEGRADED, FULL, SHED, AdmissionController
+from metrics import REGISTRY
+
+
+def controller(name, max_in_flight=1, max_queued=0, queue_timeout=0.05, max_degraded=1):
+    return AdmissionController(name, max_in_flight, max_queued, queue_timeout, max_degraded)
+
+
+def test_full_then_degraded_then_shed():
+    ctl = controller("test_full_degraded_shed")
+    full, degraded = ctl.acquire(), ctl.acquire()
+    assert tuple(full) == (FULL, "free_slot")
+    assert tuple(degraded) == (DEGRADED, "queue_full")
+    assert tuple(ctl.acquire()) == (SHED, "degraded_full")
+    assert ctl.stats()["decisions"] == {FULL: 1, DEGRADED: 0, SHED: 1}   # degraded counted at release
+    ctl.release(degraded)
+    assert ctl.stats()["decisions"] == {FULL: 1, DEGRADED: 1, SHED: 1}
+
+
+def test_release_frees_the_slot():
+    ctl = controller("test_release")
+    ctl.release(ctl.acquire())
+    assert tuple(ctl.acquire()) == (FULL, "free_slot")
+    degraded = ctl.acquire()
+    assert tuple(degraded) == (DEGRADED, "queue_full")
+    ctl.release(degraded)
+    stats = ctl.stats()
+    assert (stats["in_flight"], stats["degraded_in_flight"]) == (1, 0)
+
+
+def test_degraded_request_shed_by_its_handler_counts_once():
+    ctl = controller("test_degraded_shed")
+    ctl.acquire()
+    degraded = ctl.acquire()
+    ctl.shed(degraded, "no_song_pool")
+    assert ctl.stats()["degraded_in_flight"] == 0     # slot freed before release
+    ctl.release(degraded)
+    stats = ctl.stats()
+    assert stats["decisions"] == {FULL: 1, DEGRADED: 0, SHED: 1}
+    assert stats["degraded_in_flight"] == 0
+    text = REGISTRY.render()
+    assert 'admission_decisions_total{endpoint="test_degraded_shed",decision="shed",reason="no_song_pool"} 1' in text
+    assert 'endpoint="test_degraded_shed",decision="degraded"' not in text
+
+
+def test_queued_request_degrades_after_timeout():
+    ctl = controller("test_queue_timeout", max_queued=1, queue_timeout=0.05)
+    ctl.acquire()
+    start = time.monotonic()
+    assert tuple(ctl.acquire()) == (DEGRADED, "queue_timeout")
+    assert time.monotonic() - start >= 0.05
+    assert ctl.stats()["queued"] == 0
+
+
+def test_queued_request_gets_the_released_slot():
+    ctl = controller("test_queue_handoff", max_queued=1, queue_timeout=5)
+    first = ctl.acquire()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(tuple(ctl.acquire())))
+    waiter.start()
+    while ctl.stats()["queued"] == 0:
+        time.sleep(0.01)
+    ctl.release(first)
+    waiter.join(5)
+    assert result == [(FULL, "queued")]
+
+
+def test_slot_releases_on_exit_and_on_error():
+    ctl = controller("test_slot")
+    with ctl.slot() as admission:
+        decision, _ = admission
+        assert decision == FULL
+        assert ctl.stats()["in_flight"] == 1
+    assert ctl.stats()["in_flight"] == 0
+    try:
+        with ctl.slot():
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    stats = ctl.stats()
+    assert (stats["in_flight"], stats["degraded_in_flight"]) == (0, 0)
+
+
+def test_gauges_are_labelled_by_endpoint():
+    ctl = controller("test_gauges")
+    ctl.acquire()
+    text = REGISTRY.render()
+    assert 'admission_in_flight{endpoint="test_gauges"} 1' in text
+    assert "admission_in_flight_test_gauges" not in text
@@ -0,0 +1,50 @@
+import time
+
+from cache import TTLCache
+
+
+def test_get_put_counts_hits_and_misses():
+    cache = TTLCache("test_get_put", max_entries=4, ttl_seconds=60)
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache("test_ttl", max_entries=4, ttl_seconds=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.items() == []
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache("test_lru", max_entries=2, ttl_seconds=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")          # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert [k for k, _ in cache.items()] == ["a", "c"]
+
+
+def test_invalidate_all_or_by_predicate():
+    cache = TTLCache("test_invalidate", max_entries=8, ttl_seconds=60)
+    for key in ("happy:1", "happy:2", "sad:1"):
+        cache.put(key, key)
+    assert cache.invalidate(lambda k: k.startswith("happy:")) == 2
+    assert [k for k, _ in cache.items()] == ["sad:1"]
+    assert cache.invalidate() == 1
+    assert cache.items() == []
+
+
+def test_get_nearest_returns_closest_within_distance():
+    cache = TTLCache("test_nearest", max_entries=8, ttl_seconds=60)
+    cache.put(10, "ten")
+    cache.put(20, "twenty")
+    distance = lambda a, b: abs(a - b)
+    assert cache.get_nearest(12, distance, 5) == ("ten", 2)
+    assert cache.get_nearest(15, distance, 4) == (None, None)
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from cosine import cosine_topk, normalize_rows
+
+
+def brute_force(X, queries, k):
+    unit = normalize_rows(X)
+    sims = normalize_rows(np.atleast_2d(queries)) @ unit.T
+    order = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+    return order, np.take_along_axis(sims, order, axis=1)
+
+
+@pytest.mark.parametrize("block_elements", [None, 64, 7])
+def test_matches_brute_force(block_elements):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 5)).astype(np.float32)
+    queries = rng.normal(size=(4, 5)).astype(np.float32)
+    idx, sims = cosine_topk(normalize_rows(X), queries, 10, block_elements=block_elements)
+    ref_idx, ref_sims = brute_force(X, queries, 10)
+    assert idx.shape == sims.shape == (4, 10)
+    np.testing.assert_array_equal(idx, ref_idx)
+    np.testing.assert_allclose(sims, ref_sims, rtol=1e-5, atol=1e-6)
+
+
+def test_single_query_and_ties_keep_row_order():
+    X = np.array([[1, 0], [0, 1], [2, 0], [1, 0], [1, 1]], dtype=np.float32)
+    idx, sims = cosine_topk(normalize_rows(X), np.array([1, 0], dtype=np.float32), 3, block_elements=2)
+    assert idx.tolist() == [0, 2, 3]
+    np.testing.assert_allclose(sims, [1, 1, 1], rtol=1e-6)
+
+
+def test_k_larger_than_catalog_and_empty_catalog():
+    X = normalize_rows(np.eye(3, dtype=np.float32))
+    idx, _ = cosine_topk(X, np.ones(3, dtype=np.float32), 10)
+    assert sorted(idx.tolist()) == [0, 1, 2]
+    idx, sims = cosine_topk(np.empty((0, 3), dtype=np.float32), np.ones((2, 3), dtype=np.float32), 5)
+    assert idx.shape == sims.shape == (2, 0)
+
+
+def test_zero_rows_stay_zero():
+    unit = normalize_rows(np.array([[0, 0], [3, 4]], dtype=np.float32))
+    np.testing.assert_allclose(unit, [[0, 0], [0.6, 0.8]])
@@ -0,0 +1,69 @@
+import json
+import os
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+import dataset_cache
+
+CSV = "title,tempo,energy,language\nBholi,120,0.5,nepali\nSathi,98.5,oops,hindi\n"
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_cache, "DATASET_CACHE_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "songs.csv"
+    path.write_text(CSV)
+    return path
+
+
+def count_builds(monkeypatch):
+    builds = []
+    build = dataset_cache.build_cache
+    monkeypatch.setattr(dataset_cache, "build_cache", lambda p: builds.append(p) or build(p))
+    return builds
+
+
+def test_typed_columns_and_column_selection(source):
+    df = dataset_cache.load_dataset(str(source))
+    assert str(df["tempo"].dtype) == "float32"
+    assert df["energy"].isna().tolist() == [False, True]      # "oops" is coerced to NaN
+    df = dataset_cache.load_dataset(str(source), ["title", "tempo", "missing"])
+    assert list(df.columns) == ["title", "tempo"]
+
+
+def test_cache_is_reused_until_the_source_changes(source, monkeypatch):
+    builds = count_builds(monkeypatch)
+    dataset_cache.load_dataset(str(source))
+    dataset_cache.load_dataset(str(source))
+    assert len(builds) == 1
+
+    source.write_text(CSV + "Naya,140,0.9,nepali\n")
+    df = dataset_cache.load_dataset(str(source))
+    assert len(builds) == 2 and len(df) == 3
+
+
+def test_touched_source_is_rehashed_once(source, monkeypatch):
+    dataset_cache.load_dataset(str(source))
+    os.utime(source, ns=(1_000_000_000, 1_000_000_000))      # same bytes, new mtime
+    builds = count_builds(monkeypatch)
+    assert dataset_cache.cache_is_fresh(str(source))
+    with open(dataset_cache.cache_paths(str(source))[1], encoding="utf-8") as f:
+        assert json.load(f)["mtime_ns"] == 1_000_000_000
+
+    def no_hashing(path, chunk_size=0):
+        raise AssertionError("source hashed again")
+    monkeypatch.setattr(dataset_cache, "source_checksum", no_hashing)
+    assert dataset_cache.cache_is_fresh(str(source))
+    dataset_cache.load_dataset(str(source))
+    assert builds == []
+
+
+def test_mongoexport_ids_are_plain_strings(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_cache, "DATASET_CACHE_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "songs.jsonl"
+    path.write_text('{"_id": {"$oid": "abc123"}, "title": "Bholi", "tempo": 120}\n')
+    df = dataset_cache.load_dataset(str(path))
+    assert df["_id"].tolist() == ["abc123"]
@@ -0,0 +1,116 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from emotion_scorer import GridEmotionScorer, agreement_report, forest_fingerprint, use_grid_scorer
+
+CLASSES = ["happy", "neutral", "sad"]
+
+
+def label(row):
+    """Simplified infer_emotion thresholds, on the five recommender features"""
+    danceability, tempo, acousticness, energy, valence = row
+    if valence >= 0.6 and energy >= 0.65 and danceability >= 0.5:
+        return 0
+    if valence <= 0.4 and energy <= 0.45 and acousticness >= 0.4:
+        return 2
+    return 1
+
+
+@pytest.fixture(scope="module")
+def forest_and_songs():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(size=(3000, 5))
+    X[:, 1] = rng.uniform(60, 200, size=len(X))   # tempo
+    y = np.array([label(row) for row in X])
+    forest = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    return forest, X
+
+
+def test_predict_proba_shape(forest_and_songs):
+    forest, X = forest_and_songs
+    scorer = GridEmotionScorer.fit(forest, X, CLASSES, bins=6)
+    probs = scorer.predict_proba(X[:50])
+    assert probs.shape == (50, len(CLASSES))
+    np.testing.assert_allclose(probs.sum(axis=1), 1.0, rtol=1e-5)
+
+
+def test_agrees_with_the_forest(forest_and_songs):
+    forest, X = forest_and_songs
+    scorer = GridEmotionScorer.fit(forest, X, CLASSES)
+    report = agreement_report(forest, scorer, X, CLASSES)
+    assert report["songs"] == len(X)
+    assert report["label_agreement"] >= 0.9
+
+
+def test_predict_returns_class_labels(forest_and_songs):
+    forest, X = forest_and_songs
+    scorer = GridEmotionScorer.fit(forest, X, CLASSES)
+    labels = scorer.predict(X[:20])
+    assert set(labels) <= set(CLASSES)
+    expected = np.array(CLASSES)[np.argmax(scorer.predict_proba(X[:20]), axis=1)]
+    np.testing.assert_array_equal(labels, expected)
+
+
+def test_round_trips_through_dict(forest_and_songs):
+    forest, X = forest_and_songs
+    scorer = GridEmotionScorer.fit(forest, X, CLASSES)
+    restored = GridEmotionScorer.from_dict(scorer.to_dict())
+    np.testing.assert_array_equal(restored.predict_proba(X[:100]), scorer.predict_proba(X[:100]))
+
+
+def test_auto_mode_requires_agreement_report(tmp_path):
+    scorer_path = tmp_path / "emotion_scorer.joblib"
+    forest_path = tmp_path / "song_recommender.joblib"
+    forest_path.write_bytes(b"forest v1")
+    recorded = forest_fingerprint(str(forest_path))
+    assert use_grid_scorer("auto", str(scorer_path))[0] is False
+    scorer_path.write_bytes(b"")
+    assert use_grid_scorer("auto", str(scorer_path))[0] is False
+    report = tmp_path / "emotion_scorer.report.json"
+    report.write_text(json.dumps({"label_agreement": 0.95, "forest": recorded}))
+    assert use_grid_scorer("auto", str(scorer_path), 0.99)[0] is False
+    report.write_text(json.dumps({"label_agreement": 0.995, "forest": recorded}))
+    assert use_grid_scorer("auto", str(scorer_path), 0.99)[0] is True
+    assert use_grid_scorer("forest", str(scorer_path))[0] is False
+    assert use_grid_scorer("grid", str(tmp_path / "missing.joblib"))[0] is True
+
+
+def test_auto_mode_rejects_a_grid_from_another_forest(tmp_path):
+    scorer_path = tmp_path / "emotion_scorer.joblib"
+    forest_path = tmp_path / "song_recommender.joblib"
+    scorer_path.write_bytes(b"")
+    forest_path.write_bytes(b"forest v1")
+    report = tmp_path / "emotion_scorer.report.json"
+
+    report.write_text(json.dumps({"label_agreement": 1.0}))    # report without a fingerprint
+    assert use_grid_scorer("auto", str(scorer_path))[0] is False
+
+    report.write_text(json.dumps({"label_agreement": 1.0, "forest": forest_fingerprint(str(forest_path))}))
+    os.utime(forest_path, ns=(1, 1))                             # copied/touched, same bytes
+    assert use_grid_scorer("auto", str(scorer_path))[0] is True
+
+    forest_path.write_bytes(b"forest v2")                        # train_recommender.py rerun
+    use_grid, reason = use_grid_scorer("auto", str(scorer_path))
+    assert use_grid is False and "song_recommender.joblib" in reason
+
+
+def test_distill_reports_held_out_agreement_and_its_forest(tmp_path, forest_and_songs):
+    joblib = pytest.importorskip("joblib")
+    from sklearn.preprocessing import LabelEncoder
+    from distill_emotion_scorer import distill, split_holdout
+
+    forest, X = forest_and_songs
+    fit, holdout = split_holdout(X, 0.2)
+    assert (len(fit), len(holdout)) == (2400, 600)
+    assert len(np.unique(np.concatenate([fit, holdout]), axis=0)) == len(X)
+
+    encoder = LabelEncoder().fit(CLASSES)
+    joblib.dump(forest, tmp_path / "song_recommender.joblib")
+    _, report = distill(forest, encoder, X, model_dir=str(tmp_path))
+    assert (report["fit_songs"], report["holdout_songs"], report["songs"]) == (2400, 600, 600)
+    assert report["forest"]["sha256"] == forest_fingerprint(str(tmp_path / "song_recommender.joblib"))["sha256"]
+    assert use_grid_scorer("auto", str(tmp_path / "emotion_scorer.joblib"), 0.5)[0] is True
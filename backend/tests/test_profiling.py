@@ -0,0 +1,52 @@
+import pytest
+
+flask = pytest.importorskip("flask")
+
+import profiling
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secret")
+    app = flask.Flask("profiling_test")
+    profiling.install(app)
+    return app.test_client()
+
+
+def profile(client, **params):
+    return client.post("/api/admin/profile", query_string=params, headers={"X-Admin-Token": "secret"})
+
+
+def test_requires_the_token(client):
+    assert client.post("/api/admin/profile").status_code == 404
+    assert client.post("/api/admin/profile", headers={"X-Admin-Token": "wrong"}).status_code == 404
+
+
+@pytest.mark.parametrize("params", [
+    {"seconds": "abc"}, {"seconds": "nan"}, {"seconds": "-1"}, {"seconds": "0"},
+    {"interval_ms": "fast"}, {"interval_ms": "-5"}, {"interval_ms": "inf"},
+    {"limit": "ten"}, {"limit": "0"},
+    {"sort": "nonsense"},
+    {"mode": "trace"},
+])
+def test_bad_parameters_are_a_400(client, params):
+    response = profile(client, **params)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_zero_interval_is_clamped(client):
+    response = profile(client, mode="sample", seconds="0.2", interval_ms="0")
+    assert response.status_code == 200
+    # One tick per MIN_SAMPLE_MS at most, instead of a busy loop
+    assert int(response.headers["X-Profile-Samples"]) <= 0.2 / (profiling.MIN_SAMPLE_MS / 1000) + 1
+
+
+def test_cprofile_accepts_valid_sort_and_limit(client):
+    response = profile(client, mode="cprofile", seconds="0.05", sort="tottime", limit="5")
+    assert response.status_code == 200
+
+
+def test_slow_tracer_interval_is_floored():
+    tracer = profiling.SlowRequestTracer(100, 0, 5)
+    assert tracer.interval == profiling.MIN_SAMPLE_MS / 1000
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+
+import hybrid
+import recommend
+from recommend import build_filter_partitions, select_partition_rows
+
+
+def catalog(n=60, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({name: rng.uniform(size=n) for name in recommend.FEATURES})
+    df["title"] = [f"Song {i}" for i in range(n)]
+    df["filename"] = [f"song_{i}.mp3" for i in range(n)]
+    df["language"] = np.where(np.arange(n) % 3 == 0, "Nepali", " hindi ")
+    df["artist"] = [f"Artist {i % 4}" for i in range(n)]
+    df.loc[5, "language"] = None
+    return df
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    """recommend pointed at a freshly trained package in tmp_path"""
+    for name in ("MODEL_PATH", "LOOKUP_FEATURES_PATH", "LOOKUP_META_PATH", "LOOKUP_PARTITIONS_PATH", "SHARD_DIR"):
+        monkeypatch.setattr(recommend, name, getattr(recommend, name))
+    monkeypatch.setattr(hybrid, "HYBRID_INDEX_DIR", hybrid.HYBRID_INDEX_DIR)
+    monkeypatch.setattr(recommend, "RECOMMEND_MEMO_TTL", 0)
+    recommend.use_model_dir(str(tmp_path))
+    package, X_scaled = recommend.build_model_package(catalog(), "test")
+    recommend.save_model_package(package, X_scaled, build_hybrid=False)
+    return tmp_path
+
+
+def test_partitions_match_case_and_whitespace_insensitively():
+    partitions = build_filter_partitions(catalog())
+    nepali = select_partition_rows(partitions, {"language": "NEPALI"})
+    assert nepali.tolist() == [i for i in range(60) if i % 3 == 0 and i != 5]
+    hindi = select_partition_rows(partitions, {"language": "Hindi"})
+    assert len(nepali) + len(hindi) == 59   # row 5 has no language
+
+
+def test_values_of_one_field_or_together_and_fields_and_together():
+    partitions = build_filter_partitions(catalog())
+    either = select_partition_rows(partitions, {"artist": ["artist 0", "Artist 1"]})
+    assert either.tolist() == [i for i in range(60) if i % 4 in (0, 1)]
+    both = select_partition_rows(partitions, {"artist": "artist 0", "language": "nepali"})
+    assert both.tolist() == [i for i in range(60) if i % 4 == 0 and i % 3 == 0]
+
+
+def test_unknown_value_is_empty_and_unknown_field_is_an_error():
+    partitions = build_filter_partitions(catalog())
+    assert select_partition_rows(partitions, None) is None
+    assert len(select_partition_rows(partitions, {"language": "klingon"})) == 0
+    with pytest.raises(ValueError):
+        select_partition_rows(partitions, {"mood": "happy"})
+
+
+def test_too_many_values_are_not_indexed(monkeypatch):
+    monkeypatch.setattr(recommend, "MAX_FILTER_VALUES", 10)
+    partitions = build_filter_partitions(catalog())
+    assert "language" in partitions and "artist" in partitions
+    df = catalog()
+    df["album"] = [f"Album {i}" for i in range(len(df))]
+    assert "album" not in build_filter_partitions(df)
+
+
+@pytest.mark.parametrize("filters", [{"language": "nepali"}, {"artist": ["Artist 1", "artist 2"]},
+                                     {"language": "klingon"}])
+def test_joblib_fallback_matches_the_lookup_artifact(model_dir, filters):
+    from_lookup = recommend._recommend_songs("Song 7", 5, filters)
+    os.remove(recommend.LOOKUP_META_PATH)
+    assert not recommend.lookup_artifact_is_fresh()
+    from_joblib = recommend._recommend_songs("Song 7", 5, filters)
+
+    assert "error" not in from_joblib
+    assert [r["title"] for r in from_joblib["recommendations"]] == \
+        [r["title"] for r in from_lookup["recommendations"]]
+    np.testing.assert_allclose([r["similarity"] for r in from_joblib["recommendations"]],
+                               [r["similarity"] for r in from_lookup["recommendations"]], atol=1e-5)
+    rows = select_partition_rows(build_filter_partitions(catalog()), filters)
+    assert {r["title"] for r in from_joblib["recommendations"]} <= {f"Song {i}" for i in rows}
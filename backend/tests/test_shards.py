@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("sklearn")
+
+import hybrid
+import recommend
+from shard_worker import Shard
+
+
+def catalog(n=90, seed=1):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({name: rng.uniform(size=n) for name in recommend.FEATURES})
+    df["title"] = [f"Track {i:03d}" for i in range(n)]
+    df["filename"] = [f"track_{i}.mp3" for i in range(n)]
+    df["language"] = "nepali"
+    return df
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    """A trained package in tmp_path split into 3 shards; coordinator dropped afterwards"""
+    for name in ("MODEL_PATH", "LOOKUP_FEATURES_PATH", "LOOKUP_META_PATH", "LOOKUP_PARTITIONS_PATH", "SHARD_DIR"):
+        monkeypatch.setattr(recommend, name, getattr(recommend, name))
+    monkeypatch.setattr(hybrid, "HYBRID_INDEX_DIR", hybrid.HYBRID_INDEX_DIR)
+    monkeypatch.setattr(recommend, "RECOMMEND_MEMO_TTL", 0)
+    monkeypatch.delenv("SHARD_ADDRESSES", raising=False)
+    recommend.use_model_dir(str(tmp_path))
+    df = catalog()
+    package, X_scaled = recommend.build_model_package(df, "test")
+    recommend.save_model_package(package, X_scaled, build_hybrid=False)
+    recommend.build_shards(df, X_scaled, 3)
+    yield tmp_path
+    recommend.drop_coordinator()
+
+
+def titles(result):
+    return [r["title"] for r in result["recommendations"]]
+
+
+def test_shard_search_skips_seeds_and_keeps_global_ids(sharded):
+    shard = Shard(str(sharded / "shards" / "shard-001"))
+    global_idx, vector, song = shard.find("track 040")
+    assert (global_idx, song["title"]) == (40, "Track 040")
+    hits = shard.search(np.atleast_2d(vector), 4, skip=[40])[0]
+    assert len(hits) == 4 and 40 not in [h[0] for h in hits]
+    assert all(30 <= h[0] < 60 for h in hits)
+    assert [h[1] for h in hits] == sorted((h[1] for h in hits), reverse=True)
+    assert shard.find("no such track") is None
+
+
+def test_sharded_answers_match_the_single_index(sharded):
+    for title in ("Track 003", "Track 045", "Track 088"):
+        assert titles(recommend.recommend_songs_sharded(title, 5)) == titles(recommend._recommend_songs(title, 5))
+
+
+def test_dead_worker_is_replaced_on_the_next_query(sharded):
+    first = recommend.get_coordinator()
+    first.processes[1].kill()
+    first.processes[1].wait()
+    result = recommend.recommend_songs_sharded("Track 010", 5)
+    assert titles(result) == titles(recommend._recommend_songs("Track 010", 5))
+    assert recommend._coordinator is not None and recommend._coordinator is not first
+    assert all(p.poll() is None for p in recommend._coordinator.processes)
+
+
+def test_unreachable_shards_fall_back_to_the_local_index(sharded, monkeypatch):
+    monkeypatch.setenv("SHARD_ADDRESSES", str(sharded / "missing.sock"))
+    monkeypatch.setenv("SHARD_AUTHKEY", "test")
+    monkeypatch.setattr(recommend, "SHARD_START_TIMEOUT", 0.1)
+    result = recommend.recommend_songs_sharded("Track 020", 5)
+    assert titles(result) == titles(recommend._recommend_songs("Track 020", 5))
+    assert recommend._coordinator is None
@@ -0,0 +1,68 @@
+import numpy as np
+
+import shared_catalog
+from shared_catalog import SharedCatalog, publish, song_features
+
+CLASSES = ["happy", "neutral", "sad"]
+
+
+class StubRecommender:
+    """predict_proba from the features alone, so the published values are checkable"""
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        scores = np.stack([X[:, 4], X[:, 3], X[:, 2]], axis=1) + 1e-3
+        return scores / scores.sum(axis=1, keepdims=True)
+
+
+def songs(n, prefix="song"):
+    return [
+        {"_id": f"{prefix}{i}", "title": f"Title {i} ✓", "artist": "Artist", "album": None,
+         "danceability": 0.1 * (i % 10), "tempo": 100 + i, "acousticness": 0.5,
+         "energy": 0.05 * i, "valence": 0.9 - 0.05 * i}
+        for i in range(n)
+    ]
+
+
+def test_publish_then_attach_round_trip(tmp_path):
+    catalog = songs(5) + [{"_id": "broken", "title": "x", "tempo": "fast"}]
+    assert publish(str(tmp_path), catalog, StubRecommender(), CLASSES, version="v1") == 1
+
+    view = SharedCatalog(str(tmp_path)).current()
+    assert view.generation == 1
+    assert view.classes == CLASSES
+    assert view.info["version"] == "v1"
+    assert len(view.songs) == 5     # the unparseable tempo is skipped
+
+    X, _ = song_features(catalog[:5], np.float32)
+    np.testing.assert_array_equal(view.features, X)
+    np.testing.assert_allclose(view.probabilities, StubRecommender().predict_proba(X), rtol=1e-6)
+    song = view.songs[2]
+    assert (song["_id"], song["title"], song["artist"]) == ("song2", "Title 2 ✓", "Artist")
+    assert "album" not in song
+    assert song["tempo"] == 102.0
+
+
+def test_second_publish_switches_generation(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_catalog, "SHARED_CATALOG_KEEP", 2)
+    root = str(tmp_path)
+    reader = SharedCatalog(root)
+    assert reader.current() is None
+
+    publish(root, songs(3), StubRecommender(), CLASSES, version="v1")
+    assert reader.current().generation == 1
+    publish(root, songs(4, "new"), StubRecommender(), CLASSES, version="v2")
+    view = reader.current()
+    assert view.generation == 2
+    assert [view.songs[i]["_id"] for i in range(len(view.songs))] == ["new0", "new1", "new2", "new3"]
+
+    publish(root, songs(1), StubRecommender(), CLASSES, version="v3")
+    assert sorted(p.name for p in tmp_path.iterdir() if p.name.startswith("gen-")) == \
+        ["gen-000002", "gen-000003"]
+
+
+def test_empty_catalog_publishes(tmp_path):
+    publish(str(tmp_path), [], StubRecommender(), CLASSES)
+    view = SharedCatalog(str(tmp_path)).current()
+    assert len(view.songs) == 0
+    assert view.probabilities.shape == (0, len(CLASSES))
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    group = SingleFlight("test_shared")
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def slow():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(group.do("key", slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(group.do("key", slow))) for _ in range(3)]
+    for t in followers:
+        t.start()
+    while group.followers < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+
+    assert len(runs) == 1
+    assert sorted(results, key=lambda r: r[1]) == [("result", False)] + [("result", True)] * 3
+    assert group.stats()["in_flight"] == 0
+
+
+def test_followers_get_the_leaders_exception():
+    group = SingleFlight("test_error")
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            group.do("key", failing)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    while group.followers < 1:
+        threading.Event().wait(0.01)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert errors == ["boom", "boom"]
+
+
+def test_sequential_calls_run_again():
+    group = SingleFlight("test_sequential")
+    calls = []
+    assert group.do("key", lambda: calls.append(1) or len(calls)) == (1, False)
+    assert group.do("key", lambda: calls.append(1) or len(calls)) == (2, False)
+    with pytest.raises(KeyError):
+        group.do("other", lambda: {}["missing"])
+    assert group.stats()["in_flight"] == 0
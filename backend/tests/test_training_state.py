@@ -0,0 +1,107 @@
+import json
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from train_emotion_model import TrainConfig, TrainingState
+
+
+class Interrupt(tf.keras.callbacks.Callback):
+    """Kills the run after `after` epochs, like a preempted job (on_train_end never runs)"""
+
+    def __init__(self, after):
+        super().__init__()
+        self.after = after
+
+    def on_epoch_end(self, epoch, logs=None):
+        if epoch + 1 == self.after:
+            raise KeyboardInterrupt
+
+
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(64, 4)).astype("float32")
+    y = tf.keras.utils.to_categorical((X[:, 0] > 0).astype(int), 2)
+    return X, y
+
+
+def compiled_model(seed):
+    tf.keras.utils.set_random_seed(seed)
+    model = tf.keras.Sequential([tf.keras.Input(shape=(4,)), tf.keras.layers.Dense(2, activation="softmax")])
+    model.compile(optimizer=tf.keras.optimizers.Adam(0.01), loss="categorical_crossentropy")
+    return model
+
+
+def plateau():
+    return tf.keras.callbacks.ReduceLROnPlateau(monitor="loss", factor=0.5, patience=1, min_delta=10.0)
+
+
+def run(cfg, signature, seed, epochs, interrupt_after=None):
+    """One training run of phase 1: (state, model, epoch it started from)"""
+    model, reduce = compiled_model(seed), plateau()
+    state = TrainingState(cfg, None, signature)
+    start = state.begin_phase(1, model, [reduce], epochs)
+    if start is not None:
+        extra = [Interrupt(interrupt_after)] if interrupt_after else []
+        X, y = data()
+        try:
+            model.fit(X, y, epochs=epochs, initial_epoch=start, batch_size=16, verbose=0,
+                      callbacks=[reduce, state] + extra)
+        except KeyboardInterrupt:
+            pass
+    return state, model, start, reduce
+
+
+def test_resume_restores_weights_optimizer_and_counters(tmp_path):
+    signature = {"img_size": 96, "seed": 1}
+    cfg = TrainConfig(model_path=str(tmp_path / "model.keras"))
+    state, first, start, _ = run(cfg, signature, seed=1, epochs=4, interrupt_after=2)
+    assert start == 0
+    saved = json.loads((state.state_dir / "state.json").read_text())
+    assert (saved["phase"], saved["epoch"], saved["converged"]) == (1, 2, False)
+    assert saved["lr"] < 0.01                                  # the plateau callback halved it
+    assert sorted(p.name.split(".")[0] for p in state.state_dir.glob("ckpt-*"))[0] == "ckpt-phase1-epoch2"
+
+    cfg.resume = True
+    model, reduce = compiled_model(seed=2), plateau()          # different initial weights
+    resumed = TrainingState(cfg, None, signature)
+    assert resumed.begin_phase(1, model, [reduce], 4) == 2
+    for got, want in zip(model.get_weights(), first.get_weights()):
+        np.testing.assert_allclose(got, want)
+    assert int(model.optimizer.iterations.numpy()) == int(first.optimizer.iterations.numpy()) == 8
+    assert float(model.optimizer.learning_rate.numpy()) == pytest.approx(saved["lr"])
+    resumed.on_train_begin()
+    counters = saved["callbacks"]["ReduceLROnPlateau"]
+    assert np.isfinite(counters["best"])
+    assert (reduce.wait, reduce.best) == (counters["wait"], pytest.approx(counters["best"]))
+
+
+def test_finished_phase_is_skipped_on_resume(tmp_path):
+    signature = {"img_size": 96}
+    cfg = TrainConfig(model_path=str(tmp_path / "model.keras"))
+    _, first, _, _ = run(cfg, signature, seed=1, epochs=2)
+    cfg.resume = True
+    state, model, start, _ = run(cfg, signature, seed=2, epochs=2)
+    assert start is None
+    for got, want in zip(model.get_weights(), first.get_weights()):
+        np.testing.assert_allclose(got, want)
+    assert state.report()["epochs_run"] == {"1": 2}
+
+
+def test_resume_rejects_a_different_signature(tmp_path):
+    cfg = TrainConfig(model_path=str(tmp_path / "model.keras"))
+    run(cfg, {"img_size": 96}, seed=1, epochs=1)
+    cfg.resume = True
+    with pytest.raises(ValueError, match="img_size"):
+        TrainingState(cfg, None, {"img_size": 128})
+
+
+def test_fresh_run_discards_the_old_state(tmp_path):
+    cfg = TrainConfig(model_path=str(tmp_path / "model.keras"))
+    state, _, _, _ = run(cfg, {"img_size": 96}, seed=1, epochs=1)
+    assert (state.state_dir / "state.json").exists()
+    fresh = TrainingState(cfg, None, {"img_size": 96})
+    assert not fresh.state_dir.exists()
+    assert fresh.begin_phase(1, compiled_model(3), [], 1) == 0
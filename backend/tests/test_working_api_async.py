@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("quart")
+
+import working_api_async as api
+
+
+def songs(ids):
+    return [{"_id": str(i), "title": f"Song {i}", "valence": 0.5, "energy": 0.5} for i in ids]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """db_async stand-in that records which queries a request issued"""
+    calls = []
+
+    async def fetch_songs_by_emotion(emotion):
+        calls.append("by_emotion")
+        return songs(range(6))
+
+    async def fetch_songs_by_ids(ids):
+        calls.append("by_ids")
+        return [s for s in songs(range(6)) if s["_id"] in ids]
+
+    monkeypatch.setattr(api.db_async, "fetch_songs_by_emotion", fetch_songs_by_emotion)
+    monkeypatch.setattr(api.db_async, "fetch_songs_by_ids", fetch_songs_by_ids)
+    monkeypatch.setattr(api, "session_history", {})
+    return calls
+
+
+def scan(session_id):
+    async def post():
+        response = await api.app.test_client().post("/api/working-scan", json={"session_id": session_id})
+        return response.status_code, await response.get_json()
+    return asyncio.run(post())
+
+
+def test_shown_songs_are_fetched_only_when_mixed_back_in(fake_db):
+    status, body = scan("session-a")
+    assert status == 200 and len(body["songs"]) == 5
+    assert fake_db == ["by_emotion"]            # 6 new songs: no shown-songs lookup
+
+    status, body = scan("session-a")            # 1 new song left, 4 shown ones fill in
+    assert status == 200 and len(body["songs"]) == 5
+    assert fake_db == ["by_emotion", "by_emotion", "by_ids"]
@@ -0,0 +1,41 @@
+import random
+
+from working_core import choose_songs, needs_shown_songs, record_history
+
+
+def catalog(n):
+    return [{"_id": str(i), "title": f"Song {i}"} for i in range(n)]
+
+
+def test_needs_shown_songs_matches_choose_songs():
+    rng = random.Random(0)
+    for _ in range(500):
+        songs = catalog(rng.randint(1, 12))
+        shown = [str(i) for i in rng.sample(range(15), rng.randint(0, 12))]
+        loads = []
+        choose_songs(songs, shown, lambda: loads.append(1) or [])
+        assert bool(loads) == needs_shown_songs(songs, shown), (len(songs), shown)
+
+
+def test_prefers_new_songs():
+    songs = catalog(10)
+    shown = [str(i) for i in range(4)]
+    selected = choose_songs(songs, shown, lambda: [])
+    assert len(selected) == 5
+    assert not {s["_id"] for s in selected} & set(shown)
+
+
+def test_mixes_shown_songs_back_in_when_few_new_ones_are_left():
+    songs = catalog(6)
+    shown = [str(i) for i in range(4)]
+    selected = choose_songs(songs, shown, lambda: songs[:4])
+    ids = [s["_id"] for s in selected]
+    assert ids[:2] == ["4", "5"]
+    assert len(ids) == 5 and set(ids[2:]) <= set(shown)
+
+
+def test_history_keeps_the_last_20_ids():
+    history = {}
+    for start in range(0, 30, 5):
+        record_history(history, "s", catalog(start + 5)[start:])
+    assert history["s"] == [str(i) for i in range(10, 30)]